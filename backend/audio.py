@@ -1,10 +1,28 @@
 import math
+import os
 
 import librosa
 import numpy as np
-import tensorflow as tf
+from dotenv import load_dotenv
 
-model = tf.keras.models.load_model("./voice_model/model3.h5")
+from backend import metrics, models
+from backend.decoder import decode_audio
+
+load_dotenv()
+
+SAMPLE_RATE = 44000
+# Длина фрагмента, на котором обучалась модель (225 кадров MFCC)
+LENGTH_CHOSEN = 115181
+N_MFCC = 40
+N_FFT = 2048
+HOP_LENGTH = 512
+WINDOW_FRAMES = 225
+# Шаг окна в оконном режиме (по умолчанию окна перекрываются наполовину)
+WINDOW_HOP = 112
+# Сколько кадров MFCC считается за один проход, чтобы не держать в памяти спектр всей записи
+MFCC_CHUNK_FRAMES = 4096
+# Чем считать голосовую модель: "numpy" (без TensorFlow) или "keras"
+VOICE_ENGINE = os.getenv("VOICE_ENGINE", "numpy")
 
 emotion_enc = {
     "Страх": 0,
@@ -23,28 +41,199 @@ def get_key_by_value(dictionary, value):
     return None
 
 
-def predict_voice(file_path: str) -> str:
+def voice_model():
+    """
+    Голосовая модель выбранного движка (см. VOICE_ENGINE). Обе реализации
+    предоставляют метод predict с интерфейсом keras.Model.predict
+
+    :raises ValueError: Если указан неизвестный движок
+    :return: Модель
+    """
+    if VOICE_ENGINE == "numpy":
+        return models.get("voice_numpy")
+    if VOICE_ENGINE == "keras":
+        return models.get("voice")
+    raise ValueError(f"Unknown VOICE_ENGINE: {VOICE_ENGINE}")
+
+
+def predict_windows(windows: np.ndarray, batch_size: int = 32) -> np.ndarray:
+    """
+    Передает окна MFCC в голосовую модель
+
+    :param windows: Массив окон (окна x WINDOW_FRAMES x N_MFCC)
+    :param batch_size: Размер батча модели
+    :return: Вероятности классов для каждого окна
+    """
+    metrics.observe_batch("voice", len(windows))
+    with metrics.stage("inference_voice"):
+        return voice_model().predict(windows, batch_size=batch_size, verbose=0)
+
+
+def fit_length(x: np.ndarray, length: int = LENGTH_CHOSEN) -> np.ndarray:
+    """
+    Приводит сигнал к длине, на которой обучалась модель:
+    обрезает длинный сигнал и дополняет медианой короткий
+
+    :param x: Аудио-сигнал
+    :param length: Нужная длина
+    :raises ValueError: Если сигнал пустой (дополнять нечем)
+    :return: Сигнал нужной длины
+    """
+    if x.shape[0] == 0:
+        raise ValueError("Audio signal is empty")
+    if x.shape[0] > length:
+        return x[:length]
+    if x.shape[0] < length:
+        return np.pad(x, math.ceil((length - x.shape[0]) / 2), mode="median")[:length]
+    return x
+
+
+def compute_mfcc(x: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Считает MFCC для всего сигнала один раз. Мел-спектр считается частями
+    по MFCC_CHUNK_FRAMES кадров, результат совпадает с librosa.feature.mfcc(y=x)
+
+    :param x: Аудио-сигнал
+    :param sr: Частота дискретизации
+    :return: Матрица MFCC (кадры x N_MFCC)
+    """
+    with metrics.stage("features"):
+        # Дополняем сигнал так же, как librosa при center=True
+        padded = np.pad(x, N_FFT // 2)
+        n_frames = 1 + x.shape[0] // HOP_LENGTH
+
+        mels = []
+        for start in range(0, n_frames, MFCC_CHUNK_FRAMES):
+            stop = min(start + MFCC_CHUNK_FRAMES, n_frames)
+            segment = padded[start * HOP_LENGTH:(stop - 1) * HOP_LENGTH + N_FFT]
+            mels.append(
+                librosa.feature.melspectrogram(
+                    y=segment, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False
+                )
+            )
+
+        log_mel = librosa.power_to_db(np.concatenate(mels, axis=1))
+        mfcc = librosa.feature.mfcc(S=log_mel, n_mfcc=N_MFCC)
+
+    return mfcc.T
+
+
+def split_windows(mfcc: np.ndarray, hop: int = WINDOW_HOP) -> tuple:
+    """
+    Нарезает MFCC всей записи на перекрывающиеся окна по WINDOW_FRAMES кадров
+    без копирования данных
+
+    :param mfcc: Матрица MFCC (кадры x N_MFCC)
+    :param hop: Шаг окна в кадрах
+    :return: Массив окон (окна x WINDOW_FRAMES x N_MFCC) и номера первых кадров окон
+    """
+    starts = list(range(0, mfcc.shape[0] - WINDOW_FRAMES + 1, hop))
+
+    # Последнее окно прижимаем к концу записи, чтобы не терять хвост
+    if starts[-1] != mfcc.shape[0] - WINDOW_FRAMES:
+        starts.append(mfcc.shape[0] - WINDOW_FRAMES)
+
+    windows = np.lib.stride_tricks.sliding_window_view(mfcc, WINDOW_FRAMES, axis=0)
+
+    return windows[starts].transpose(0, 2, 1), np.array(starts)
+
+
+def signal_windows(x: np.ndarray, hop: int = WINDOW_HOP) -> tuple:
+    """
+    Окна MFCC для всей записи (см. split_windows). Запись короче одного окна
+    дополняется до LENGTH_CHOSEN, как раньше
+
+    :param x: Аудио-сигнал с частотой SAMPLE_RATE
+    :param hop: Шаг окна в кадрах MFCC
+    :return: Массив окон, номера первых кадров окон и длина сигнала в отсчетах
+    """
+    if x.shape[0] < LENGTH_CHOSEN:
+        x = fit_length(x)
+
+    windows, starts = split_windows(compute_mfcc(x, SAMPLE_RATE), hop)
+    return windows, starts, x.shape[0]
+
+
+def summarize_windows(predict: np.ndarray, starts: np.ndarray, n_samples: int, offset: float = 0) -> dict:
+    """
+    Собирает тайм-лайн по предсказаниям модели для окон записи
+
+    :param predict: Вероятности классов для каждого окна
+    :param starts: Номера первых кадров окон
+    :param n_samples: Длина сигнала в отсчетах
+    :param offset: Время начала сигнала в записи, в секундах
+    :return: Словарь с итоговой эмоцией ("emotion") и списком сегментов ("segments")
+        вида {"start", "end", "emotion", "probabilities"}, время в секундах от начала записи
+    """
+    seconds_per_frame = HOP_LENGTH / SAMPLE_RATE
+    segments = [
+        {
+            "start": round(float(offset + start * seconds_per_frame), 3),
+            "end": round(float(offset + min((start + WINDOW_FRAMES) * seconds_per_frame, n_samples / SAMPLE_RATE)), 3),
+            "emotion": get_key_by_value(emotion_enc, probabilities.argmax()),
+            "probabilities": probabilities.tolist(),
+        }
+        for start, probabilities in zip(starts, predict)
+    ]
+
+    return {
+        "emotion": get_key_by_value(emotion_enc, predict.mean(axis=0).argmax()),
+        "segments": segments,
+    }
+
+
+def predict_voice_timeline(
+    file_path: str,
+    hop: int = WINDOW_HOP,
+    batch_size: int = 256,
+    offset: float | None = None,
+    duration: float | None = None,
+) -> dict:
+    """
+    Оценивает эмоции по всей длине записи: MFCC считается один раз,
+    нарезается на перекрывающиеся окна, и все окна передаются в модель
+    одним вызовом
+
+    :param file_path: Путь к аудио-файлу
+    :param hop: Шаг окна в кадрах MFCC
+    :param batch_size: Размер батча модели
+    :param offset: С какой секунды оценивать запись (None - с начала)
+    :param duration: Сколько секунд оценивать (None - до конца)
+    :return: Словарь с итоговой эмоцией и сегментами (см. summarize_windows).
+        Для файла без звука - {"emotion": None, "segments": []}
+    """
+    x = decode_audio(file_path, SAMPLE_RATE, offset, duration)
+    if x.shape[0] == 0:
+        # Нет аудио-дорожки: оценивать нечего
+        return {"emotion": None, "segments": []}
+
+    windows, starts, n_samples = signal_windows(x, hop)
+    predict = predict_windows(windows, batch_size)
+
+    return summarize_windows(predict, starts, n_samples, offset or 0)
+
+
+def predict_voice(file_path: str, windowed: bool = False) -> str | None:
     """
     Загружает аудио-файл и передает его в модель
 
     :param file_path: Путь к аудио-файлу
-    :return: Ответ от модели
+    :param windowed: Оценивать всю запись по окнам (см. predict_voice_timeline),
+        иначе оценивается только первый фрагмент длиной LENGTH_CHOSEN
+    :return: Ответ от модели (None для файла без звука)
     """
-    x, sr = librosa.load(file_path, sr=44000)
-    length_chosen = 115181
+    if windowed:
+        return predict_voice_timeline(file_path)["emotion"]
 
-    if x.shape[0] > length_chosen:
-        new = x[:length_chosen]
-    elif x.shape[0] < length_chosen:
-        new = np.pad(x, math.ceil((length_chosen - x.shape[0]) / 2), mode="median")
-    else:
-        new = x
+    # Модели нужен только первый фрагмент, поэтому остальное не декодируем
+    x = decode_audio(file_path, SAMPLE_RATE, duration=LENGTH_CHOSEN / SAMPLE_RATE)
+    if x.shape[0] == 0:
+        return None
 
-    mfcc = librosa.feature.mfcc(y=new, sr=44000, n_mfcc=40)
-    mfcc = mfcc.T
+    mfcc = compute_mfcc(fit_length(x), SAMPLE_RATE)
 
-    mfcc = mfcc.reshape(1, 225, 40)
-    predict = model.predict(mfcc)
+    mfcc = mfcc.reshape(1, WINDOW_FRAMES, N_MFCC)
+    predict = predict_windows(mfcc)
 
     answer = predict.argmax()
 
@@ -0,0 +1,81 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.audio import predict_voice, predict_voice_timeline
+from backend.timeline import Timeline
+from backend.video import EMOTIONS, video_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def analyze_voice_track(file_path: str, windowed: bool) -> dict:
+    """
+    Оценивает эмоцию по аудио-дорожке файла
+
+    :param file_path: Путь к аудио- или видео-файлу
+    :param windowed: Оценивать всю дорожку по окнам (см. predict_voice_timeline)
+    :return: Словарь {"emotion": итоговая эмоция, "segments": сегменты или None}
+    """
+    if windowed:
+        return predict_voice_timeline(file_path)
+
+    return {"emotion": predict_voice(file_path), "segments": None}
+
+
+def merge_timelines(video_timeline: Timeline, segments: list) -> list:
+    """
+    Сводит вероятности эмоций по лицу и эмоции по голосу на общий тайм-лайн по секундам
+
+    :param video_timeline: Результат анализа видео (см. video_pipeline)
+    :param segments: Сегменты аудио-дорожки (см. predict_voice_timeline)
+    :return: Список {"second", "video": {эмоция: вероятность} или None, "voice": эмоция или None}
+    """
+    seconds, per_second = video_timeline.per_second()
+
+    # Для каждой секунды берем сегмент голоса, центр которого ближе всего к середине секунды
+    voice = [None] * len(per_second)
+    if segments:
+        centers = np.array([(segment["start"] + segment["end"]) / 2 for segment in segments])
+        nearest = np.abs(centers[None, :] - (seconds + 0.5)[:, None]).argmin(axis=1)
+        voice = [segments[i]["emotion"] for i in nearest]
+
+    return [
+        {
+            "second": int(second),
+            "video": None if np.isnan(values).all() else dict(zip(EMOTIONS, values.astype(float).round(6).tolist())),
+            "voice": voice[i],
+        }
+        for i, (second, values) in enumerate(zip(seconds, per_second))
+    ]
+
+
+def av_pipeline(file_path: str, doGraph: bool, voice_windowed: bool = False, **video_kwargs) -> tuple:
+    """
+    Пайплайн для видео с проверкой по аудио-дорожке: анализ лица и голоса
+    выполняется одновременно, поэтому общее время близко к более долгому из них
+
+    :param file_path: Путь к видео-файлу
+    :param doGraph: Делать ли график
+    :param voice_windowed: Оценивать всю аудио-дорожку по окнам
+    :param video_kwargs: Параметры video_pipeline
+    :return: tuple: Путь к gif, путь к графику, результат анализа видео,
+        результат анализа голоса (см. analyze_voice_track) и общий тайм-лайн
+        (см. merge_timelines, None без оконной оценки голоса)
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Аудио-дорожка декодируется отдельным процессом ffmpeg, пока идет анализ кадров
+        # Контекст копируется, чтобы замеры стадий голоса попали в замеры запроса
+        voice_future = executor.submit(
+            contextvars.copy_context().run, analyze_voice_track, file_path, voice_windowed
+        )
+        gif_path, fig_path, video_timeline = video_pipeline(file_path, doGraph, **video_kwargs)
+        voice = voice_future.result()
+
+    merged = None
+    if voice["segments"] is not None:
+        merged = merge_timelines(video_timeline, voice["segments"])
+
+    return gif_path, fig_path, video_timeline, voice, merged
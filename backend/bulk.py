@@ -0,0 +1,263 @@
+import gzip
+import logging
+import os
+import posixpath
+import shutil
+import tarfile
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from backend.audio import (
+    LENGTH_CHOSEN,
+    N_MFCC,
+    SAMPLE_RATE,
+    WINDOW_FRAMES,
+    compute_mfcc,
+    emotion_enc,
+    fit_length,
+    get_key_by_value,
+    predict_windows,
+    signal_windows,
+    summarize_windows,
+)
+from backend import system
+from backend.decoder import decode_audio
+from backend.system import secure_filename
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Сколько окон MFCC разных файлов собирается в один вызов модели
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 512))
+# Сколько файлов декодируется параллельно
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", os.cpu_count() or 1))
+
+# Сколько файлов можно распаковать из одного архива
+BULK_MAX_MEMBERS = int(os.getenv("BULK_MAX_MEMBERS", 1000))
+# Сколько МБ можно распаковать из одного архива
+BULK_MAX_EXTRACT_MB = int(os.getenv("BULK_MAX_EXTRACT_MB", 2048))
+# Во сколько раз распакованные файлы могут быть больше архива (защита от zip-бомб)
+BULK_MAX_RATIO = int(os.getenv("BULK_MAX_RATIO", 100))
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+# Описания архивов от libmagic
+ARCHIVE_MIMES = {"Zip archive", "POSIX tar archive", "gzip compressed data"}
+# Сколько байт файла архива распаковывается за раз
+EXTRACT_CHUNK_SIZE = 2**16
+
+
+def is_archive(filename: str) -> bool:
+    """
+    Проверяет, является ли файл архивом по расширению
+
+    :param filename: Имя файла
+    :return: Булевое значение (True/False)
+    """
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class ArchiveError(ValueError):
+    """
+    Архив нельзя распаковать: он поврежден или превышает ограничения распаковки
+    """
+
+
+def allowed_mime(file_mt: str) -> bool:
+    """
+    Проверяет MIME-тип файла пакетной загрузки: разрешены аудио, видео и архивы
+
+    :param file_mt: Описание типа от libmagic
+    :return: Булевое значение (True/False)
+    """
+    return system.allowed_mime(file_mt) or any(archive_type in file_mt for archive_type in ARCHIVE_MIMES)
+
+
+def allowed_extension(filename: str) -> bool:
+    """
+    Проверяет расширение файла пакетной загрузки: разрешены аудио, видео и архивы
+
+    :param filename: Имя файла
+    :return: Булевое значение (True/False)
+    """
+    return system.allowed_extension(filename) or is_archive(filename)
+
+
+def extract_archive(archive_path: str, target_dir: str) -> list:
+    """
+    Распаковывает из zip/tar архива файлы с разрешенными расширениями.
+    Файлы кладутся в target_dir без вложенных каталогов, под именами,
+    очищенными secure_filename. Распаковка идет частями и прерывается, если
+    файлов больше BULK_MAX_MEMBERS, распакованный объем больше
+    BULK_MAX_EXTRACT_MB или больше размера архива в BULK_MAX_RATIO раз
+
+    :param archive_path: Путь к архиву
+    :param target_dir: Директория для распаковки
+    :raises ArchiveError: Если архив поврежден или превышены ограничения
+    :return: Список пар (путь к распакованному файлу, путь файла внутри архива)
+    """
+    budget = min(BULK_MAX_EXTRACT_MB * 2**20, BULK_MAX_RATIO * os.path.getsize(archive_path))
+    extracted = []
+    total = 0
+
+    def target_path(name: str) -> str | None:
+        filename = secure_filename(os.path.basename(name))
+        if not system.allowed_extension(filename):
+            return None
+        if len(extracted) >= BULK_MAX_MEMBERS:
+            raise ArchiveError(f"Archive has more than {BULK_MAX_MEMBERS} files")
+        # Одинаковые имена из разных каталогов архива не должны перезаписывать друг друга
+        return os.path.join(target_dir, f"{len(extracted)}_{filename}")
+
+    class BudgetReader:
+        # Размеры из заголовков архива не проверяются: считаем реально распакованные байты
+        def __init__(self, source):
+            self.source = source
+
+        def read(self, size: int = -1) -> bytes:
+            nonlocal total
+            chunk = self.source.read(size)
+            total += len(chunk)
+            if total > budget:
+                raise ArchiveError(f"Archive unpacks to more than {budget} bytes")
+            return chunk
+
+    def copy(source, path: str, name: str) -> None:
+        with open(path, "wb") as target:
+            shutil.copyfileobj(BudgetReader(source), target, EXTRACT_CHUNK_SIZE)
+        extracted.append((path, posixpath.normpath(name).lstrip("/")))
+
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as archive:
+                for member in archive.infolist():
+                    path = None if member.is_dir() else target_path(member.filename)
+                    if path is None:
+                        continue
+                    with archive.open(member) as source:
+                        copy(source, path, member.filename)
+        else:
+            with tarfile.open(archive_path) as archive:
+                for member in archive:
+                    path = target_path(member.name) if member.isfile() else None
+                    if path is None:
+                        continue
+                    with archive.extractfile(member) as source:
+                        copy(source, path, member.name)
+    except (zipfile.BadZipFile, tarfile.TarError, gzip.BadGzipFile, EOFError, zlib.error) as e:
+        raise ArchiveError(f"Archive is corrupted: {e}") from e
+
+    logger.info(f"{len(extracted)} files ({total} bytes) extracted from {archive_path}")
+    return extracted
+
+
+def prepare_clip(file_path: str, windowed: bool) -> tuple:
+    """
+    Декодирует файл и готовит окна MFCC для модели
+
+    :param file_path: Путь к аудио- или видео-файлу
+    :param windowed: Оценивать всю запись по окнам, иначе - только первый фрагмент
+    :return: Массив окон, номера первых кадров окон и длина сигнала в отсчетах
+    """
+    if windowed:
+        return signal_windows(decode_audio(file_path, SAMPLE_RATE))
+
+    x = decode_audio(file_path, SAMPLE_RATE, duration=LENGTH_CHOSEN / SAMPLE_RATE)
+    mfcc = compute_mfcc(fit_length(x), SAMPLE_RATE)
+    return mfcc.reshape(1, WINDOW_FRAMES, N_MFCC), np.zeros(1, dtype=int), LENGTH_CHOSEN
+
+
+def _prepare(file_path: str, windowed: bool) -> tuple:
+    try:
+        return file_path, prepare_clip(file_path, windowed), None
+    except Exception as e:
+        logger.error(f"Failed to prepare {file_path}: {e}")
+        return file_path, None, str(e)
+
+
+def _classify(pending: list, windowed: bool, batch_size: int):
+    """
+    Классифицирует окна всех накопленных файлов одним вызовом модели. Модель
+    обрабатывает их батчами не больше batch_size, чтобы длинная запись не
+    раздувала рабочую память модели
+
+    :param pending: Список (путь, окна, начала окон, длина сигнала)
+    :param windowed: Оценивались ли записи по окнам
+    :param batch_size: Размер батча модели
+    :return: Генератор пар (путь, результат)
+    """
+    windows = np.concatenate([clip[1] for clip in pending])
+    predict = predict_windows(windows, batch_size=batch_size)
+
+    position = 0
+    for file_path, clip_windows, starts, n_samples in pending:
+        clip_predict = predict[position:position + len(clip_windows)]
+        position += len(clip_windows)
+
+        if windowed:
+            yield file_path, summarize_windows(clip_predict, starts, n_samples)
+        else:
+            yield file_path, {"emotion": get_key_by_value(emotion_enc, clip_predict[0].argmax()), "segments": None}
+
+
+def predict_voice_bulk(
+    file_paths: list,
+    windowed: bool = False,
+    batch_size: int = BULK_BATCH_SIZE,
+    workers: int = BULK_WORKERS,
+):
+    """
+    Оценивает эмоции по голосу для множества файлов: файлы декодируются
+    параллельно, а окна разных файлов собираются в общие батчи модели.
+    Результаты возвращаются по мере готовности, в порядке файлов
+
+    :param file_paths: Список путей к аудио- или видео-файлам
+    :param windowed: Оценивать каждую запись целиком по окнам
+    :param batch_size: Сколько окон собирать в один вызов модели
+    :param workers: Сколько файлов декодировать параллельно
+    :return: Генератор пар (путь, результат). Результат - {"emotion", "segments"}
+        или {"error"}, если файл не удалось обработать
+    """
+    pending = []
+    pending_windows = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Декодируем не больше нескольких файлов наперед, чтобы память не росла,
+        # если модель работает медленнее декодирования
+        in_flight = deque()
+        paths = iter(file_paths)
+
+        def refill():
+            while len(in_flight) < workers * 2:
+                file_path = next(paths, None)
+                if file_path is None:
+                    return
+                in_flight.append(executor.submit(_prepare, file_path, windowed))
+
+        refill()
+        while in_flight:
+            file_path, clip, error = in_flight.popleft().result()
+            refill()
+
+            if error is not None:
+                # Ошибочный файл отдаем после уже накопленных, чтобы сохранить порядок
+                if pending:
+                    yield from _classify(pending, windowed, batch_size)
+                    pending, pending_windows = [], 0
+                yield file_path, {"error": error}
+                continue
+
+            pending.append((file_path, *clip))
+            pending_windows += len(clip[0])
+
+            if pending_windows >= batch_size:
+                yield from _classify(pending, windowed, batch_size)
+                pending, pending_windows = [], 0
+
+        if pending:
+            yield from _classify(pending, windowed, batch_size)
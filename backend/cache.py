@@ -0,0 +1,279 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache")
+# Максимальный размер кэша в байтах
+CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE_MB", 2048)) * 2**20
+# Версия моделей: при обновлении моделей старые результаты перестают совпадать по ключу
+MODEL_VERSION = os.getenv("MODEL_VERSION", "model3.h5+vit-face-expression")
+
+RESULT_FILE = "result.json"
+# Файл с текущим размером кэша в байтах, чтобы запись не обходила весь кэш
+SIZE_FILE = ".size"
+# До какой доли CACHE_SIZE кэш очищается при переполнении, чтобы следующие записи не обходили его снова
+EVICT_TARGET = 0.9
+HASH_CHUNK_SIZE = 2**20
+
+_counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Считает sha256 содержимого файла, читая его частями
+
+    :param file_path: Путь к файлу
+    :return: Хэш в шестнадцатеричном виде
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def make_key(content_hash: str, **params) -> str:
+    """
+    Собирает ключ кэша из хэша содержимого, версии моделей и параметров пайплайна
+
+    :param content_hash: Хэш содержимого файла
+    :param params: Параметры пайплайна, влияющие на результат
+    :return: Ключ кэша
+    """
+    payload = json.dumps(
+        {"content": content_hash, "models": MODEL_VERSION, "params": params},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def file_key(file_path: str, **params) -> str:
+    """
+    Ключ кэша для файла (см. make_key)
+
+    :param file_path: Путь к файлу
+    :param params: Параметры пайплайна, влияющие на результат
+    :return: Ключ кэша
+    """
+    return make_key(hash_file(file_path), **params)
+
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(CACHE_DIR, key)
+
+
+def _dir_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def _load(key: str) -> dict | None:
+    entry_dir = _entry_dir(key)
+    try:
+        with open(os.path.join(entry_dir, RESULT_FILE), encoding="utf-8") as file:
+            entry = json.load(file)
+        # Время изменения каталога используется как время последнего обращения для LRU
+        os.utime(entry_dir)
+    except (OSError, ValueError):
+        return None
+
+    entry["artifacts"] = {
+        name: None if artifact is None else os.path.join(entry_dir, artifact)
+        for name, artifact in entry["artifacts"].items()
+    }
+    return entry
+
+
+def get(key: str, count: bool = True) -> dict | None:
+    """
+    Ищет результат в кэше
+
+    :param key: Ключ кэша
+    :param count: Учитывать промах в счетчиках (попадание учитывается всегда)
+    :return: Словарь {"result": результат, "artifacts": {имя: путь}} или None
+    """
+    entry = _load(key)
+    if entry is not None or count:
+        _count("misses" if entry is None else "hits")
+    return entry
+
+
+def put(key: str, result: dict, artifacts: dict | None = None) -> dict:
+    """
+    Сохраняет результат и файлы-артефакты в кэш. Запись выполняется во временный
+    каталог и атомарно переименовывается, поэтому параллельные записи одного
+    ключа не портят друг друга. Новая запись не вытесняется сразу, даже если
+    она больше CACHE_SIZE: ее файлы остаются до следующей записи в кэш
+
+    :param key: Ключ кэша
+    :param result: Результат (сериализуемый в JSON)
+    :param artifacts: Файлы-артефакты {имя: путь или None}
+    :return: Сохраненная запись в формате get()
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    tmp_dir = os.path.join(CACHE_DIR, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+
+    stored = {}
+    for name, path in (artifacts or {}).items():
+        if path is None:
+            stored[name] = None
+            continue
+        stored[name] = f"{name}{os.path.splitext(path)[1]}"
+        shutil.copyfile(path, os.path.join(tmp_dir, stored[name]))
+
+    with open(os.path.join(tmp_dir, RESULT_FILE), "w", encoding="utf-8") as file:
+        json.dump({"result": result, "artifacts": stored}, file, ensure_ascii=False)
+
+    try:
+        os.rename(tmp_dir, _entry_dir(key))
+        _count("writes")
+    except OSError:
+        # Этот же результат уже записан другим процессом
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    else:
+        _account(key, _dir_size(_entry_dir(key)), CACHE_SIZE)
+
+    entry = _load(key)
+    if entry is None:
+        # Запись уже удалена другим процессом. Исходные файлы удаляются вместе
+        # с рабочим каталогом запроса, поэтому ссылки на них не отдаются
+        return {"result": result, "artifacts": {name: None for name in artifacts or {}}}
+    return entry
+
+
+def remove(key: str) -> None:
+    """
+    Удаляет запись из кэша (например, если ее файлы уже частично вытеснены)
+
+    :param key: Ключ кэша
+    """
+    if not os.path.isdir(_entry_dir(key)):
+        return
+    with _locked():
+        size = _dir_size(_entry_dir(key))
+        shutil.rmtree(_entry_dir(key), ignore_errors=True)
+        total = _read_size()
+        if total is not None:
+            _write_size(max(0, total - size))
+
+
+def get_or_compute(key: str, compute) -> dict:
+    """
+    Возвращает результат из кэша или вычисляет и сохраняет его
+
+    :param key: Ключ кэша
+    :param compute: Функция без аргументов, возвращающая (результат, артефакты)
+    :return: Запись в формате get()
+    """
+    entry = get(key)
+    if entry is not None:
+        return entry
+
+    result, artifacts = compute()
+    return put(key, result, artifacts)
+
+
+@contextlib.contextmanager
+def _locked():
+    # Блокировка между процессами: записи в кэш делают и API, и рабочие процессы задач
+    with open(os.path.join(CACHE_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _read_size() -> int | None:
+    try:
+        with open(os.path.join(CACHE_DIR, SIZE_FILE)) as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_size(size: int) -> None:
+    tmp_path = os.path.join(CACHE_DIR, f"{SIZE_FILE}.tmp")
+    with open(tmp_path, "w") as file:
+        file.write(str(size))
+    os.replace(tmp_path, os.path.join(CACHE_DIR, SIZE_FILE))
+
+
+def _evict_locked(max_size: int, keep: str | None = None) -> None:
+    # Удаляет давно не использованные записи (кроме keep), пока размер больше max_size
+    # Полный обход кэша: размер пересчитывается, а счетчик в SIZE_FILE исправляется
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.is_dir() and not entry.name.startswith("."):
+            entries.append((entry.stat().st_mtime, _dir_size(entry.path), entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    keep_path = None if keep is None else _entry_dir(keep)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        if path == keep_path:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        _count("evictions")
+        logger.info(f"Cache entry {os.path.basename(path)} evicted")
+
+    _write_size(total)
+
+
+def _account(key: str, size: int, max_size: int) -> None:
+    """
+    Добавляет размер новой записи к размеру кэша. Кэш обходится целиком,
+    только если размер превысил max_size (или еще не известен), и тогда
+    очищается до EVICT_TARGET от max_size
+
+    :param key: Ключ новой записи: она не вытесняется, пока ее результат отдается
+    :param size: Размер новой записи в байтах
+    :param max_size: Максимальный размер кэша в байтах
+    """
+    with _locked():
+        total = _read_size()
+        if total is None or total + size > max_size:
+            _evict_locked(int(max_size * EVICT_TARGET), keep=key)
+        else:
+            _write_size(total + size)
+
+
+def evict(max_size: int = CACHE_SIZE) -> None:
+    """
+    Удаляет давно не использованные записи, пока размер кэша больше max_size
+
+    :param max_size: Максимальный размер кэша в байтах
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with _locked():
+        _evict_locked(max_size)
+
+
+def stats() -> dict:
+    """
+    Счетчики кэша текущего процесса
+
+    :return: Словарь {"hits", "misses", "writes", "evictions"}
+    """
+    with _counters_lock:
+        return dict(_counters)
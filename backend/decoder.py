@@ -0,0 +1,66 @@
+import logging
+import os
+import shutil
+import subprocess
+
+import numpy as np
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def get_ffmpeg() -> str:
+    """
+    Путь к ffmpeg: FFMPEG_BINARY, ffmpeg из PATH или бинарник imageio-ffmpeg,
+    который устанавливается вместе с moviepy
+
+    :return: Путь к исполняемому файлу ffmpeg
+    """
+    binary = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+
+    import imageio_ffmpeg
+
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def decode_audio(
+    file_path: str,
+    sr: int,
+    offset: float | None = None,
+    duration: float | None = None,
+) -> np.ndarray:
+    """
+    Декодирует аудио-дорожку любого поддерживаемого ffmpeg контейнера сразу
+    в моно float32 с нужной частотой дискретизации, без промежуточных файлов
+
+    :param file_path: Путь к аудио- или видео-файлу
+    :param sr: Частота дискретизации результата
+    :param offset: С какой секунды читать (None - с начала)
+    :param duration: Сколько секунд читать (None - до конца)
+    :raises RuntimeError: Если ffmpeg не смог декодировать файл
+    :return: Сигнал (np.ndarray, float32). Для файла без аудио-дорожки - пустой массив
+    """
+    command = [get_ffmpeg(), "-nostdin", "-v", "error"]
+    if offset:
+        # -ss перед -i: ffmpeg перематывает файл, а не декодирует его с начала
+        command += ["-ss", str(offset)]
+    command += ["-i", file_path]
+    if duration is not None:
+        command += ["-t", str(duration)]
+    command += ["-vn", "-ac", "1", "-ar", str(sr), "-f", "f32le", "-"]
+
+    with metrics.stage("decode_audio"):
+        process = subprocess.run(command, capture_output=True)
+    if process.returncode != 0:
+        message = process.stderr.decode(errors="replace").strip()
+        if "does not contain any stream" in message:
+            # Видео без звука: с -vn ffmpeg нечего выводить
+            logger.info(f"{file_path} has no audio track")
+            return np.zeros(0, dtype=np.float32)
+        logger.error(f"ffmpeg failed to decode {file_path}: {message}")
+        raise RuntimeError(f"ffmpeg failed to decode {file_path}: {message}")
+
+    return np.frombuffer(process.stdout, dtype=np.float32)
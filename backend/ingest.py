@@ -0,0 +1,288 @@
+import hashlib
+import logging
+import os
+
+from dotenv import load_dotenv
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import NEED_DATA, Data, Epilogue, Field, File, MultipartDecoder
+
+from backend import metrics, system
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт тела запроса читается за раз
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 2**16))
+# Сколько первых байт файла передается libmagic для определения типа
+SNIFF_SIZE = 8192
+# Максимальный размер текстовых полей формы
+MAX_FORM_MEMORY_SIZE = 2**20
+
+
+class UploadRejectedError(ValueError):
+    """
+    Загрузка отклонена до приема всего файла
+    """
+
+    def __init__(self, message: str, status: int = 415):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_mime(head: bytes) -> str:
+    """
+    Тип файла по его первым байтам
+
+    :param head: Начало файла (см. SNIFF_SIZE)
+    :return: Описание типа от libmagic
+    """
+    with metrics.stage("mime_check"):
+        return system.magic_handle().from_buffer(head)
+
+
+class _FileSink:
+    """
+    Пишет файл из тела запроса на диск, по пути считая sha256. Первые
+    SNIFF_SIZE байт держит в памяти, пока по ним не будет проверен тип файла
+    """
+
+    def __init__(self, path: str, allowed=system.allowed_mime):
+        self.path = path
+        self.allowed = allowed
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.mime = None
+        self.file = None
+
+    def write(self, data: bytes, final: bool) -> None:
+        self.digest.update(data)
+        self.size += len(data)
+
+        if self.file is None:
+            self.head += data
+            if len(self.head) < SNIFF_SIZE and not final:
+                return
+            self.mime = sniff_mime(self.head[:SNIFF_SIZE])
+            if not self.allowed(self.mime):
+                raise UploadRejectedError(f"File data type is not allowed: {self.mime}")
+            self.file = open(self.path, "wb")
+            data, self.head = self.head, b""
+
+        self.file.write(data)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+    def discard(self) -> None:
+        self.close()
+        if self.file is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def receive(
+    stream,
+    content_type: str,
+    upload_dir: str,
+    field: str = "file",
+    on_file=None,
+) -> dict:
+    """
+    Принимает multipart/form-data из потока тела запроса частями. Тип файла
+    проверяется по первым байтам, поэтому неподходящий файл отклоняется до
+    приема остального тела, а sha256 считается во время записи на диск
+
+    :param stream: Поток тела запроса (request.stream)
+    :param content_type: Заголовок Content-Type запроса
+    :param upload_dir: Каталог для файла
+    :param field: Имя поля формы с файлом
+    :param on_file: Функция (поля формы, имя файла), вызываемая перед приемом файла.
+        Если она вернула не None, файл не принимается, а значение возвращается в "skipped"
+    :raises UploadRejectedError: Если запрос не multipart, нет файла, у файла
+        неподходящее расширение или тип
+    :return: Словарь {"form": MultiDict полей, "filename", "path", "mime",
+        "content_hash", "size", "skipped"}
+    """
+    mimetype, options = parse_options_header(content_type)
+    if mimetype != "multipart/form-data" or "boundary" not in options:
+        raise UploadRejectedError("Request must be multipart/form-data", status=400)
+
+    decoder = MultipartDecoder(options["boundary"].encode(), MAX_FORM_MEMORY_SIZE)
+    form = MultiDict()
+    upload = {
+        "form": form,
+        "filename": None,
+        "path": None,
+        "mime": None,
+        "content_hash": None,
+        "size": 0,
+        "skipped": None,
+    }
+
+    # Текущая часть формы, накопленное значение поля и признак, что часть - принимаемый файл
+    part, value, writing = None, [], False
+    sink, eof = None, False
+
+    try:
+        while True:
+            event = decoder.next_event()
+
+            if event is NEED_DATA:
+                if eof:
+                    raise UploadRejectedError("Request body is incomplete", status=400)
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                eof = not chunk
+                decoder.receive_data(chunk or None)
+                continue
+
+            if isinstance(event, Epilogue):
+                break
+
+            if isinstance(event, Field):
+                part, value, writing = event, [], False
+
+            elif isinstance(event, File):
+                part, writing = event, False
+                if event.name != field or sink is not None:
+                    continue
+
+                filename = system.secure_filename(event.filename)
+                if not system.allowed_extension(filename):
+                    raise UploadRejectedError(f"File extension is not allowed: {event.filename!r}")
+                upload["filename"] = filename
+
+                if on_file is not None:
+                    upload["skipped"] = on_file(form, filename)
+                    if upload["skipped"] is not None:
+                        # Результат уже известен: остаток тела не читаем
+                        return upload
+
+                upload["path"] = os.path.join(upload_dir, filename)
+                sink, writing = _FileSink(upload["path"]), True
+
+            elif isinstance(event, Data):
+                if writing:
+                    sink.write(event.data, not event.more_data)
+                elif isinstance(part, Field):
+                    value.append(event.data)
+                    if not event.more_data:
+                        form.add(part.name, b"".join(value).decode(errors="replace"))
+
+        if sink is None:
+            raise UploadRejectedError(f"Request has no file in field {field!r}", status=400)
+        if sink.mime is None:
+            # Пустой файл: проверка типа его отклонит
+            sink.write(b"", True)
+        sink.close()
+    except Exception:
+        if sink is not None:
+            sink.discard()
+        raise
+
+    upload.update(mime=sink.mime, content_hash=sink.digest.hexdigest(), size=sink.size)
+    logger.info(f"Upload {upload['filename']} received: {upload['size']} bytes, {upload['mime']}")
+    return upload
+
+
+def receive_files(
+    stream,
+    content_type: str,
+    upload_dir: str,
+    field: str = "files",
+    allowed_extension=system.allowed_extension,
+    allowed_mime=system.allowed_mime,
+) -> dict:
+    """
+    Принимает из потока тела запроса multipart/form-data с несколькими файлами
+    в одном поле. Как и в receive, файлы пишутся на диск частями, а тип
+    проверяется по первым байтам. Неподходящий файл не отклоняет весь запрос:
+    его остаток пропускается, а причина возвращается в "error" этого файла
+
+    :param stream: Поток тела запроса (request.stream)
+    :param content_type: Заголовок Content-Type запроса
+    :param upload_dir: Каталог для файлов
+    :param field: Имя поля формы с файлами
+    :param allowed_extension: Проверка имени файла
+    :param allowed_mime: Проверка описания типа от libmagic
+    :raises UploadRejectedError: Если запрос не multipart или тело оборвано
+    :return: Словарь {"form": MultiDict полей, "files": список словарей
+        {"filename", "path", "mime", "size", "error"}}. У отклоненного файла
+        "path" равен None
+    """
+    mimetype, options = parse_options_header(content_type)
+    if mimetype != "multipart/form-data" or "boundary" not in options:
+        raise UploadRejectedError("Request must be multipart/form-data", status=400)
+
+    decoder = MultipartDecoder(options["boundary"].encode(), MAX_FORM_MEMORY_SIZE)
+    form, files = MultiDict(), []
+
+    part, value, sink, eof = None, [], None, False
+
+    def reject(error: str) -> None:
+        nonlocal sink
+        if sink is not None:
+            sink.discard()
+            sink = None
+        files[-1].update(path=None, error=error)
+        logger.warning(f"Upload {files[-1]['filename']} rejected: {error}")
+
+    try:
+        while True:
+            event = decoder.next_event()
+
+            if event is NEED_DATA:
+                if eof:
+                    raise UploadRejectedError("Request body is incomplete", status=400)
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                eof = not chunk
+                decoder.receive_data(chunk or None)
+                continue
+
+            if isinstance(event, Epilogue):
+                break
+
+            if isinstance(event, Field):
+                part, value = event, []
+
+            elif isinstance(event, File):
+                part = event
+                if event.name != field:
+                    continue
+
+                filename = system.secure_filename(event.filename)
+                if filename == "":
+                    continue
+                # Номер в имени, чтобы одинаковые имена не перезаписывали друг друга
+                path = os.path.join(upload_dir, f"{len(files)}_{filename}")
+                files.append({"filename": filename, "path": path, "mime": None, "size": 0, "error": None})
+
+                if not allowed_extension(filename):
+                    reject("File extension is not allowed")
+                else:
+                    sink = _FileSink(path, allowed_mime)
+
+            elif isinstance(event, Data):
+                if sink is not None:
+                    try:
+                        sink.write(event.data, not event.more_data)
+                    except UploadRejectedError as e:
+                        reject(str(e))
+                        continue
+                    if not event.more_data:
+                        sink.close()
+                        files[-1].update(mime=sink.mime, size=sink.size)
+                        sink = None
+                elif isinstance(part, Field):
+                    value.append(event.data)
+                    if not event.more_data:
+                        form.add(part.name, b"".join(value).decode(errors="replace"))
+    except Exception:
+        if sink is not None:
+            sink.discard()
+        raise
+
+    logger.info(f"Upload received: {len(files)} files, {sum(file['size'] for file in files)} bytes")
+    return {"form": form, "files": files}
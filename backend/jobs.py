@@ -0,0 +1,182 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+from backend import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов, обрабатывающих задачи
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Сколько задач может ждать в очереди сверх выполняющихся
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 8))
+# Через сколько секунд после завершения задача удаляется из списка
+JOB_TTL = int(os.getenv("JOB_TTL", 3600))
+
+
+class QueueFullError(Exception):
+    """Очередь задач заполнена"""
+
+
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, чтобы рабочие процессы не наследовали состояние torch/tensorflow родителя
+        _executor = ProcessPoolExecutor(
+            max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def _purge_expired() -> None:
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if job["finished"] is not None and now - job["finished"] > JOB_TTL:
+            del _jobs[job_id]
+
+
+def _run(fn, *args) -> tuple:
+    """
+    Выполняет задачу в рабочем процессе и забирает накопленные в нем метрики,
+    чтобы основной процесс показывал их в /metrics
+
+    :return: Результат задачи и снимок метрик (см. metrics.drain)
+    """
+    try:
+        result = fn(*args)
+    except Exception as e:
+        # Метрики неудачной задачи тоже нужны, поэтому передаем их вместе с ошибкой
+        e.metrics = metrics.drain()
+        raise
+    return result, metrics.drain()
+
+
+def _on_done(job_id: str, on_done=None):
+    def callback(future):
+        with _lock:
+            if job_id in _jobs:
+                _jobs[job_id]["finished"] = time.time()
+        if on_done is not None:
+            on_done()
+
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            metrics.merge(future.result()[1])
+        elif hasattr(error, "metrics"):
+            metrics.merge(error.metrics)
+
+    return callback
+
+
+def submit(fn, *args, on_done=None) -> str:
+    """
+    Ставит задачу в очередь пула процессов
+
+    :param fn: Функция уровня модуля (должна сериализоваться pickle)
+    :param args: Аргументы функции
+    :param on_done: Функция без аргументов, вызываемая в этом процессе, когда
+        задача завершена, упала или отменена
+    :raises QueueFullError: Если очередь заполнена
+    :return: Идентификатор задачи
+    """
+    with _lock:
+        _purge_expired()
+
+        active = sum(not job["future"].done() for job in _jobs.values())
+        if active >= JOB_WORKERS + JOB_QUEUE_SIZE:
+            raise QueueFullError(f"{active} jobs are already pending")
+
+        job_id = uuid.uuid4().hex
+        future = _get_executor().submit(_run, fn, *args)
+        _jobs[job_id] = {"future": future, "created": time.time(), "finished": None}
+
+    future.add_done_callback(_on_done(job_id, on_done))
+    logger.info(f"Job {job_id} submitted")
+    return job_id
+
+
+def record(result) -> str:
+    """
+    Регистрирует уже готовый результат как завершенную задачу, чтобы его
+    артефакты отдавались так же, как артефакты задач (удаляется через JOB_TTL)
+
+    :param result: Результат (в том же формате, что и результат задачи)
+    :return: Идентификатор задачи
+    """
+    future = Future()
+    future.set_result((result, {}))
+    now = time.time()
+
+    with _lock:
+        _purge_expired()
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {"future": future, "created": now, "finished": now}
+
+    return job_id
+
+
+def status(job_id: str) -> dict | None:
+    """
+    Состояние задачи
+
+    :param job_id: Идентификатор задачи
+    :return: Словарь {"status", "result", "error", "created"} или None, если задача не найдена.
+        status: queued | running | done | failed | cancelled
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+
+    future = job["future"]
+    info = {"status": "queued", "result": None, "error": None, "created": job["created"]}
+
+    if future.cancelled():
+        info["status"] = "cancelled"
+    elif future.running():
+        info["status"] = "running"
+    elif future.done():
+        try:
+            info["result"] = future.result()[0]
+            info["status"] = "done"
+        except CancelledError:
+            info["status"] = "cancelled"
+        except Exception as e:
+            info["status"] = "failed"
+            info["error"] = str(e)
+
+    return info
+
+
+def cancel(job_id: str) -> bool | None:
+    """
+    Отменяет задачу. Отменить можно только задачу, которая еще ждет в очереди
+
+    :param job_id: Идентификатор задачи
+    :return: True, если задача отменена, False, если она уже выполняется
+        или завершена, None, если задача не найдена
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+
+    cancelled = job["future"].cancel()
+    if cancelled:
+        logger.info(f"Job {job_id} cancelled")
+    return cancelled
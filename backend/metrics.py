@@ -0,0 +1,248 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Границы корзин гистограмм длительности (в секундах): от миллисекунд до минут
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Границы корзин гистограммы размеров батчей моделей
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+PREFIX = "emoclassify"
+
+_lock = threading.Lock()
+
+# Счетчики: {(имя, метки): значение}
+_counters = {}
+# Гистограммы: {(имя, метки): [счетчики по корзинам, сумма, количество]}
+_histograms = {}
+# Границы корзин и описание для каждой метрики
+_buckets = {}
+_help = {}
+
+# Замеры текущего запроса (см. trace)
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def describe(name: str, text: str, buckets: tuple | None = None) -> None:
+    """
+    Задает описание метрики и, для гистограмм, границы корзин
+
+    :param name: Имя метрики (без префикса)
+    :param text: Описание для /metrics
+    :param buckets: Границы корзин гистограммы
+    """
+    _help[name] = text
+    if buckets is not None:
+        _buckets[name] = tuple(buckets)
+
+
+describe("stage_seconds", "Duration of pipeline stages", DURATION_BUCKETS)
+describe("request_seconds", "Duration of API requests", DURATION_BUCKETS)
+describe("batch_size", "Number of items passed to a model in one call", BATCH_BUCKETS)
+describe("requests_total", "API requests by route and status")
+describe("frames_total", "Video frames by kind (sampled, analyzed)")
+describe("faces_total", "Faces found on analyzed frames")
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """
+    Увеличивает счетчик
+
+    :param name: Имя счетчика
+    :param value: На сколько увеличить
+    :param labels: Метки
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+    trace = _trace.get()
+    if trace is not None:
+        trace_key = name + _format_labels(key[1])
+        with trace["lock"]:
+            trace["counters"][trace_key] = trace["counters"].get(trace_key, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """
+    Добавляет значение в гистограмму
+
+    :param name: Имя гистограммы (границы корзин - см. describe)
+    :param value: Значение
+    :param labels: Метки
+    """
+    buckets = _buckets.get(name, DURATION_BUCKETS)
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Записывает длительность стадии в гистограмму и в замеры текущего запроса
+
+    :param stage: Имя стадии
+    :param seconds: Длительность в секундах
+    """
+    observe("stage_seconds", seconds, stage=stage)
+
+    trace = _trace.get()
+    if trace is not None:
+        with trace["lock"]:
+            trace["stages"][stage] = trace["stages"].get(stage, 0) + seconds
+
+
+def observe_batch(model: str, size: int) -> None:
+    """
+    Записывает размер батча, переданного модели
+
+    :param model: Имя модели
+    :param size: Количество элементов
+    """
+    if size:
+        observe("batch_size", size, model=model)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Контекстный менеджер, замеряющий длительность стадии (см. observe_stage)
+
+    :param name: Имя стадии
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+class StageClock:
+    """
+    Накапливает длительность стадии, разбитой на много коротких вызовов
+    (декодирование или кодирование отдельных кадров), чтобы записать ее одним замером
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def flush(self) -> None:
+        """
+        Записывает накопленную длительность, если стадия выполнялась
+        """
+        if self.seconds:
+            observe_stage(self.name, self.seconds)
+            self.seconds = 0.0
+
+
+def start_trace() -> contextvars.Token:
+    """
+    Начинает сбор замеров текущего запроса. Замеры из других потоков попадают
+    в него, только если поток запущен через contextvars.copy_context().run
+
+    :return: Токен для finish_trace
+    """
+    return _trace.set({"stages": {}, "counters": {}, "lock": threading.Lock()})
+
+
+def finish_trace(token: contextvars.Token) -> dict:
+    """
+    Заканчивает сбор замеров текущего запроса
+
+    :param token: Токен из start_trace
+    :return: Словарь {"stages": {стадия: секунды}, "counters": {счетчик: значение}}
+    """
+    trace = _trace.get()
+    _trace.reset(token)
+    return {"stages": trace["stages"], "counters": trace["counters"]}
+
+
+def drain() -> dict:
+    """
+    Забирает и обнуляет все значения метрик процесса. Используется в рабочих
+    процессах задач, чтобы передать их замеры в основной процесс (см. merge)
+
+    :return: Снимок метрик
+    """
+    global _counters, _histograms
+    with _lock:
+        snapshot = {"counters": _counters, "histograms": _histograms}
+        _counters, _histograms = {}, {}
+    return snapshot
+
+
+def merge(snapshot: dict) -> None:
+    """
+    Добавляет снимок метрик другого процесса (см. drain)
+
+    :param snapshot: Снимок метрик
+    """
+    with _lock:
+        for key, value in snapshot["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+        for key, (counts, total, count) in snapshot["histograms"].items():
+            histogram = _histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+            histogram[1] += total
+            histogram[2] += count
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{name}="{value}"' for name, value in labels + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render() -> str:
+    """
+    Все метрики в текстовом формате Prometheus
+
+    :return: Текст для ответа /metrics
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(value[0]), value[1], value[2]) for key, value in _histograms.items()}
+
+    lines = []
+    for name in sorted({key[0] for key in counters}):
+        lines.append(f"# HELP {PREFIX}_{name} {_help.get(name, name)}")
+        lines.append(f"# TYPE {PREFIX}_{name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{PREFIX}_{name}{_format_labels(labels)} {value:g}")
+
+    for name in sorted({key[0] for key in histograms}):
+        buckets = _buckets.get(name, DURATION_BUCKETS)
+        lines.append(f"# HELP {PREFIX}_{name} {_help.get(name, name)}")
+        lines.append(f"# TYPE {PREFIX}_{name} histogram")
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f"{PREFIX}_{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{PREFIX}_{name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{PREFIX}_{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
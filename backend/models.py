@@ -0,0 +1,211 @@
+import gc
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VOICE_MODEL_PATH = "./voice_model/model3.h5"
+VIT_MODEL_NAME = "trpakov/vit-face-expression"
+
+# Загрузчики моделей по имени
+_loaders = {}
+
+# Загруженные модели
+_models = {}
+
+# Время загрузки и прирост памяти процесса для каждой модели
+_stats = {}
+
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _rss() -> int:
+    """
+    Возвращает текущий объем резидентной памяти процесса
+
+    :return: Объем памяти в байтах (0, если /proc недоступен)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def register(name: str):
+    """
+    Декоратор, регистрирующий функцию-загрузчик модели под именем name
+
+    :param name: Имя модели в реестре
+    :return: Декоратор
+    """
+
+    def decorator(loader):
+        _loaders[name] = loader
+        _locks[name] = threading.Lock()
+        return loader
+
+    return decorator
+
+
+def get(name: str):
+    """
+    Возвращает модель, загружая ее при первом обращении.
+    Загрузка каждой модели выполняется ровно один раз, даже при
+    одновременных обращениях из нескольких потоков
+
+    :param name: Имя модели в реестре
+    :return: Загруженная модель
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    if name not in _loaders:
+        raise KeyError(f"Unknown model: {name}")
+
+    with _locks[name]:
+        model = _models.get(name)
+        if model is not None:
+            return model
+
+        rss_before = _rss()
+        start = time.perf_counter()
+        model = _loaders[name]()
+        load_time = time.perf_counter() - start
+
+        with _registry_lock:
+            _models[name] = model
+            _stats[name] = {
+                "load_time": load_time,
+                "memory": max(_rss() - rss_before, 0),
+            }
+
+        logger.info(
+            f"Model {name} loaded in {load_time:.2f}s, "
+            f"+{_stats[name]['memory'] / 2**20:.1f} MiB"
+        )
+        return model
+
+
+def warmup(*names: str) -> dict:
+    """
+    Заранее загружает модели, чтобы первый запрос не ждал загрузки
+
+    :param names: Имена моделей (по умолчанию - все зарегистрированные)
+    :return: Отчет о загрузке моделей (см. report())
+    """
+    for name in names or tuple(_loaders):
+        get(name)
+
+    return report()
+
+
+def unload(name: str) -> None:
+    """
+    Выгружает модель из памяти. При следующем обращении она будет загружена заново
+
+    :param name: Имя модели в реестре
+    """
+    with _locks[name]:
+        with _registry_lock:
+            _models.pop(name, None)
+            _stats.pop(name, None)
+        gc.collect()
+
+    logger.info(f"Model {name} unloaded")
+
+
+def is_loaded(name: str) -> bool:
+    """
+    Проверяет, загружена ли модель
+
+    :param name: Имя модели в реестре
+    :return: Булевое значение (True/False)
+    """
+    return name in _models
+
+
+def report() -> dict:
+    """
+    Отчет о состоянии моделей
+
+    :return: Словарь {имя модели: {"loaded", "load_time", "memory"}}
+    """
+    with _registry_lock:
+        return {
+            name: {"loaded": name in _models, **_stats.get(name, {})}
+            for name in _loaders
+        }
+
+
+@register("voice")
+def _load_voice():
+    import tensorflow as tf
+
+    return tf.keras.models.load_model(VOICE_MODEL_PATH)
+
+
+@register("voice_numpy")
+def _load_voice_numpy():
+    from backend.voice_engine import NumpyVoiceModel
+
+    return NumpyVoiceModel(VOICE_MODEL_PATH)
+
+
+@register("vit")
+def _load_vit():
+    os.environ["XDG_CACHE_HOME"] = "/home/uncanny/.cache"
+    os.environ["HUGGINGFACE_HUB_CACHE"] = "/home/uncanny/.cache"
+
+    from transformers import AutoFeatureExtractor, AutoModelForImageClassification
+
+    extractor = AutoFeatureExtractor.from_pretrained(VIT_MODEL_NAME)
+    model = AutoModelForImageClassification.from_pretrained(VIT_MODEL_NAME)
+    model.eval()
+
+    # Метки классов не меняются, поэтому берем их из конфигурации один раз
+    id2label = dict(model.config.id2label)
+
+    return extractor, model, id2label
+
+
+@register("vit_int8")
+def _load_vit_int8():
+    import torch
+
+    # Квантуем отдельную копию, чтобы не держать в памяти еще и fp32-модель из реестра
+    extractor, model, id2label = _load_vit()
+
+    # Веса линейных слоев хранятся в int8, активации квантуются на лету
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    return extractor, model, id2label
+
+
+@register("mtcnn")
+def _load_mtcnn():
+    import torch
+    from facenet_pytorch import MTCNN
+
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    logger.info("Running on device: {}".format(device))
+
+    # Инициализация MTCNN-модели
+    return MTCNN(
+        image_size=160,
+        margin=0,
+        min_face_size=200,
+        thresholds=[0.6, 0.7, 0.7],
+        factor=0.709,
+        post_process=True,
+        keep_all=False,
+        device=device,
+    )
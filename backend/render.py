@@ -0,0 +1,200 @@
+import numpy as np
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from matplotlib.figure import Figure
+from PIL import Image
+
+# Размер комбинированного изображения в дюймах (при dpi по умолчанию - 1500x600)
+FIGSIZE = (15, 6)
+# Размер графика вероятностей на тайм-лайне в дюймах (при dpi по умолчанию - 1500x800)
+GRAPH_FIGSIZE = (15, 8)
+
+
+class Compositor:
+    """
+    Собирает комбинированное изображение (лицо + столбчатая диаграмма вероятностей)
+    без matplotlib на каждом кадре. Фон диаграммы (оси, подписи, заголовок)
+    рисуется matplotlib один раз, а на каждом кадре в буфер вызывающего
+    вставляются лицо и закрашенные прямоугольники столбцов.
+
+    После создания сборщик только читается, поэтому один экземпляр можно
+    использовать из нескольких потоков, если у каждого свой буфер (см. compose)
+    """
+
+    def __init__(self, labels: list, colors: dict):
+        """
+        :param labels: Метки классов в порядке столбцов
+        :param colors: Цвета для меток классов
+        """
+        self.labels = list(labels)
+
+        # Figure без pyplot: фигура не регистрируется в глобальном состоянии pyplot,
+        # поэтому сборщики можно создавать из разных потоков
+        fig = Figure(figsize=FIGSIZE)
+        axs = fig.subplots(1, 2)
+        axs[0].axis("off")
+
+        # Рисуем все столбцы на 100%, чтобы узнать их положение и цвет в пикселях
+        sns.barplot(
+            ax=axs[1],
+            y=self.labels,
+            x=[100] * len(self.labels),
+            hue=self.labels,
+            palette=[colors[label] for label in self.labels],
+            orient="h",
+            legend=False,
+        )
+        axs[1].set_xlabel("Probability (%)")
+        axs[1].set_title("Emotion Probabilities")
+        axs[1].set_xlim([0, 100])
+
+        canvas = FigureCanvas(fig)
+        canvas.draw()
+        height = canvas.get_width_height()[1]
+
+        # Координаты matplotlib отсчитываются снизу, координаты буфера - сверху
+        def to_rows(bbox):
+            return (
+                int(round(height - bbox.y1)),
+                int(round(height - bbox.y0)),
+                int(round(bbox.x0)),
+                int(round(bbox.x1)),
+            )
+
+        self.bars = []
+        for patch in axs[1].patches:
+            color = np.round(np.array(patch.get_facecolor()[:3]) * 255).astype(np.uint8)
+            self.bars.append((*to_rows(patch.get_window_extent()), color))
+            patch.set_visible(False)
+
+        self.face_box = to_rows(axs[0].get_window_extent())
+
+        canvas.draw()
+        self.background = np.asarray(canvas.buffer_rgba())[..., :3].copy()
+        self.background.flags.writeable = False
+
+    def compose(self, face, class_probabilities: dict, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Собирает комбинированное изображение
+
+        :param face: Лицо (PIL.Image)
+        :param class_probabilities: Вероятность принадлежности к классу (в порядке labels)
+        :param out: Буфер для изображения (np.ndarray той же формы, что background).
+            Если None, создается новый
+        :return: Изображение (out или новый буфер)
+        """
+        if out is None:
+            out = np.empty_like(self.background)
+        np.copyto(out, self.background)
+
+        # Вписываем лицо в левую половину с сохранением пропорций, как imshow
+        top, bottom, left, right = self.face_box
+        width, height = face.size
+        scale = min((right - left) / width, (bottom - top) / height)
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        x = left + (right - left - size[0]) // 2
+        y = top + (bottom - top - size[1]) // 2
+        out[y:y + size[1], x:x + size[0]] = np.asarray(
+            face.convert("RGB").resize(size, Image.BILINEAR)
+        )
+
+        # Правая граница столбца соответствует 100%. Первый столбец пикселей
+        # не закрашиваем, чтобы не перекрыть ось, как и matplotlib
+        for (top, bottom, left, right, color), label in zip(self.bars, self.labels):
+            length = int(round((right - left) * class_probabilities[label]))
+            out[top:bottom, left + 1:left + length] = color
+
+        return out
+
+
+def minmax_downsample(values: np.ndarray, buckets: int) -> tuple:
+    """
+    Прореживает ряды до 2 * buckets точек: кадры делятся на buckets равных
+    интервалов, и от каждого остаются минимум и максимум в порядке их следования.
+    Если интервал - столбец пикселей графика, то линия выглядит так же,
+    как линия по всем кадрам
+
+    :param values: Ряды (кадры x ряды)
+    :param buckets: Количество интервалов (ширина области графика в пикселях)
+    :return: Номера кадров и значения точек (точки x ряды). Если кадров мало,
+        возвращаются все
+    """
+    n, k = values.shape
+    if n <= 2 * buckets:
+        frames = np.repeat(np.arange(n)[:, None], k, axis=1)
+        return frames, values
+
+    # Дополняем последним кадром до целого числа интервалов одного размера
+    size = -(-n // buckets)
+    m = -(-n // size)
+    padded = np.concatenate([values, np.repeat(values[-1:], m * size - n, axis=0)])
+    blocks = padded.reshape(m, size, k)
+
+    starts = (np.arange(m) * size)[:, None]
+    lo, hi = blocks.argmin(axis=1), blocks.argmax(axis=1)
+    first, second = np.minimum(lo, hi), np.maximum(lo, hi)
+
+    frames = np.empty((2 * m, k), dtype=np.int64)
+    frames[0::2], frames[1::2] = starts + first, starts + second
+    points = np.empty((2 * m, k), dtype=values.dtype)
+    points[0::2] = np.take_along_axis(blocks, first[:, None], axis=1)[:, 0]
+    points[1::2] = np.take_along_axis(blocks, second[:, None], axis=1)[:, 0]
+
+    return np.minimum(frames, n - 1), points
+
+
+class GraphRenderer:
+    """
+    Рисует график вероятностей эмоций на тайм-лайне за время, не зависящее
+    от длины видео. Оси, подписи и отступы создаются один раз, а на каждом
+    вызове у готовых линий меняются только данные, прореженные до ширины
+    области графика в пикселях (см. minmax_downsample)
+    """
+
+    def __init__(self, labels: list, colors: dict):
+        """
+        :param labels: Метки классов в порядке осей
+        :param colors: Цвета для меток классов
+        """
+        self.labels = list(labels)
+
+        self.figure = Figure(figsize=GRAPH_FIGSIZE)
+        self.canvas = FigureCanvas(self.figure)
+        self.axes = self.figure.subplots(len(self.labels), 1, sharex=True)
+
+        self.lines = []
+        for ax, label in zip(self.axes, self.labels):
+            self.lines.append(ax.plot([], [], color=colors[label])[0])
+            ax.set_ylabel("Вероятность (%)")
+            ax.set_title(label.capitalize())
+
+        self.axes[-1].set_xlabel("Кадр")
+        self.figure.suptitle("Вероятность эмоции на тайм-лайне")
+        # Отступы считаются один раз по подписям шкалы 0-100, которые не меняются между графиками
+        for ax in self.axes:
+            ax.set_ylim(0, 100)
+        self.figure.tight_layout()
+        for ax in self.axes:
+            ax.set_autoscaley_on(True)
+
+        # Больше точек, чем пикселей по ширине, на графике не различить
+        self.width = max(1, int(self.axes[0].get_window_extent().width))
+
+    def render(self, values: np.ndarray, fig_path: str) -> str:
+        """
+        Рисует график и сохраняет его
+
+        :param values: Вероятности в процентах (кадры x метки)
+        :param fig_path: Путь для сохранения графика
+        :return: Путь к графику
+        """
+        frames, points = minmax_downsample(values, self.width)
+
+        for i, (ax, line) in enumerate(zip(self.axes, self.lines)):
+            line.set_data(frames[:, i], points[:, i])
+            ax.relim()
+            ax.autoscale_view()
+
+        self.figure.savefig(fig_path)
+        return fig_path
+
@@ -1,3 +1,5 @@
+import os
+
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.shared import Inches, Pt
@@ -15,12 +17,14 @@ def generate_report_text(filename: str, emotion: str) -> str:
     return f"В резуальтате обработке файла {filename}, был получен результат средней эмоции: {emotion}."
 
 
-def create_report(text: str, filename: str, image_path: str | None) -> str:
+def create_report(text: str, filename: str, image_path: str | None, output_dir: str = "report") -> str:
     """
     Создает отчет в формате docx
     :param text: текст отчета
     :param filename: имя файла
-    :return: Путь до отчета
+    :param image_path: путь к графику или None
+    :param output_dir: каталог для отчета
+    :return: Имя файла отчета в output_dir
     """
     doc = Document()
 
@@ -33,21 +37,20 @@ def create_report(text: str, filename: str, image_path: str | None) -> str:
     title_run.font.name = "Times New Roman"
 
     # Текст
-    text = doc.add_paragraph()
-    text.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    text_run = text.add_run(text)
+    paragraph = doc.add_paragraph()
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    text_run = paragraph.add_run(text)
     text_run.font.size = Pt(12)
     text_run.font.name = "Times New Roman"
 
     if image_path is not None:
         # Изображение
         image = doc.add_paragraph()
-        image_run = image.add_run(image_path, width=Inches(3))
-        image_run.width = Pt(300)
+        image.add_run().add_picture(image_path, width=Inches(3))
 
     # Сохранить
     filename = f"{filename[:filename.find('.')]}_report.docx"
-    report_path = f"report/{filename}"
+    report_path = os.path.join(output_dir, filename)
     doc.save(report_path)
 
     return filename
@@ -0,0 +1,203 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Корневой каталог рабочих каталогов сессий
+WORKDIR_ROOT = os.getenv("WORKDIR_ROOT", "sessions")
+# Через сколько секунд после последнего изменения рабочий каталог удаляется
+WORKDIR_TTL = int(os.getenv("WORKDIR_TTL", 3600))
+# Максимальный суммарный размер рабочих каталогов в байтах
+STORAGE_QUOTA = int(os.getenv("STORAGE_QUOTA_MB", 10240)) * 2**20
+# Как часто (в секундах) сборщик проверяет рабочие каталоги
+GC_INTERVAL = int(os.getenv("STORAGE_GC_INTERVAL", 60))
+
+# Подкаталог рабочего каталога для результатов (видео, графики, отчеты)
+REPORT_DIR = "report"
+
+_collector = None
+_collector_lock = threading.Lock()
+_counters = {"created": 0, "released": 0, "expired": 0, "evicted": 0}
+_counters_lock = threading.Lock()
+# Каталоги, которые еще используются запросами или задачами этого процесса (см. keep)
+_active = set()
+_active_lock = threading.Lock()
+
+
+def _count(name: str, value: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += value
+
+
+def create_workdir() -> str:
+    """
+    Создает рабочий каталог сессии с подкаталогом REPORT_DIR для результатов.
+    Имя каталога начинается со времени создания, поэтому сортировка по имени
+    дает порядок от старых к новым. При первом вызове запускает сборщик (см. collect).
+    Пока каталог не передан в keep или release, сборщик его не удаляет
+
+    :return: Путь к рабочему каталогу
+    """
+    _start_collector()
+
+    workdir = os.path.join(WORKDIR_ROOT, f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}")
+    os.makedirs(os.path.join(workdir, REPORT_DIR))
+    with _active_lock:
+        _active.add(os.path.abspath(workdir))
+    _count("created")
+    return workdir
+
+
+def report_dir(workdir: str | None) -> str:
+    """
+    :param workdir: Рабочий каталог сессии (None - общий каталог report)
+    :return: Каталог для результатов сессии
+    """
+    return REPORT_DIR if workdir is None else os.path.join(workdir, REPORT_DIR)
+
+
+def touch(workdir: str) -> None:
+    """
+    Продлевает жизнь рабочего каталога: TTL отсчитывается заново
+
+    :param workdir: Рабочий каталог сессии
+    """
+    try:
+        os.utime(workdir)
+    except OSError:
+        pass
+
+
+def keep(workdir: str) -> None:
+    """
+    Сессия завершена, но ее результаты еще нужны: каталог перестает считаться
+    используемым и удаляется сборщиком через TTL, отсчитанный от этого момента
+
+    :param workdir: Рабочий каталог сессии
+    """
+    with _active_lock:
+        _active.discard(os.path.abspath(workdir))
+    touch(workdir)
+
+
+def release(workdir: str) -> None:
+    """
+    Удаляет рабочий каталог сессии, которая больше не нужна. Стоимость зависит
+    только от количества файлов этой сессии
+
+    :param workdir: Рабочий каталог сессии
+    """
+    with _active_lock:
+        _active.discard(os.path.abspath(workdir))
+    shutil.rmtree(workdir, ignore_errors=True)
+    _count("released")
+
+
+def _dir_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def collect(ttl: float = WORKDIR_TTL, quota: int = STORAGE_QUOTA) -> dict:
+    """
+    Удаляет рабочие каталоги с истекшим TTL, а затем, если суммарный размер
+    оставшихся больше квоты, - самые старые, пока размер не уложится в квоту.
+    Каталоги, которые еще используются (созданы и не переданы в keep или release),
+    не удаляются, а их время изменения обновляется, чтобы их не удалил по TTL
+    сборщик другого процесса с тем же WORKDIR_ROOT
+
+    :param ttl: Время жизни каталога после последнего изменения в секундах
+    :param quota: Максимальный суммарный размер в байтах
+    :return: Словарь {"workdirs": осталось каталогов, "bytes": их размер,
+        "expired": удалено по TTL, "evicted": удалено по квоте}
+    """
+    if not os.path.isdir(WORKDIR_ROOT):
+        return {"workdirs": 0, "bytes": 0, "expired": 0, "evicted": 0}
+
+    with _active_lock:
+        active = set(_active)
+    for workdir in active:
+        touch(workdir)
+
+    now = time.time()
+    expired, alive, in_use = 0, [], []
+    for entry in sorted(os.scandir(WORKDIR_ROOT), key=lambda entry: entry.name):
+        if not entry.is_dir():
+            continue
+        if os.path.abspath(entry.path) in active:
+            # Файлы во вложенных каталогах не меняют время изменения каталога,
+            # поэтому по нему нельзя понять, идет ли еще анализ
+            in_use.append(_dir_size(entry.path))
+            continue
+        try:
+            mtime = entry.stat().st_mtime
+        except OSError:
+            continue
+        if now - mtime > ttl:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            expired += 1
+        else:
+            alive.append((entry.path, _dir_size(entry.path)))
+
+    total = sum(in_use) + sum(size for _, size in alive)
+    evicted = 0
+    for path, size in alive:
+        if total <= quota:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted += 1
+        logger.warning(f"Workdir {path} evicted: storage quota exceeded")
+
+    _count("expired", expired)
+    _count("evicted", evicted)
+    if expired or evicted:
+        logger.info(f"Storage GC: {expired} workdirs expired, {evicted} evicted, {total} bytes in use")
+
+    return {
+        "workdirs": len(in_use) + len(alive) - evicted,
+        "bytes": total,
+        "expired": expired,
+        "evicted": evicted,
+    }
+
+
+def _collector_loop() -> None:
+    while True:
+        try:
+            collect()
+        except Exception as e:
+            logger.error(f"Storage GC failed: {e}")
+        time.sleep(GC_INTERVAL)
+
+
+def _start_collector() -> None:
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = threading.Thread(target=_collector_loop, name="storage-gc", daemon=True)
+            _collector.start()
+
+
+def stats() -> dict:
+    """
+    Счетчики рабочих каталогов текущего процесса
+
+    :return: Словарь {"created", "released", "expired", "evicted"}
+    """
+    with _counters_lock:
+        return dict(_counters)
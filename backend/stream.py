@@ -0,0 +1,267 @@
+import logging
+import os
+import threading
+import time
+
+import librosa
+import numpy as np
+from dotenv import load_dotenv
+
+from backend import metrics
+from backend.audio import (
+    HOP_LENGTH,
+    N_FFT,
+    N_MFCC,
+    SAMPLE_RATE,
+    WINDOW_FRAMES,
+    WINDOW_HOP,
+    emotion_enc,
+    get_key_by_value,
+    predict_windows,
+    voice_model,
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Через сколько новых кадров MFCC выдается эмоция текущего окна
+STREAM_HOP = int(os.getenv("VOICE_STREAM_HOP", WINDOW_HOP))
+# Бюджет задержки на шаг в миллисекундах: от получения куска, завершившего шаг, до выдачи эмоции
+STREAM_BUDGET_MS = float(os.getenv("VOICE_STREAM_BUDGET_MS", 250))
+# Максимальное количество одновременных потоковых сессий
+STREAM_MAX_SESSIONS = int(os.getenv("VOICE_STREAM_MAX_SESSIONS", 8))
+# Сколько байт PCM читается из запроса и обрабатывается за раз
+STREAM_CHUNK_SIZE = int(os.getenv("VOICE_STREAM_CHUNK_SIZE", 2**14))
+
+# Поддерживаемые форматы PCM: моно, little-endian, частота SAMPLE_RATE
+PCM_FORMATS = {
+    "s16le": (np.dtype("<i2"), 1 / 32768),
+    "f32le": (np.dtype("<f4"), 1.0),
+}
+# Параметры librosa.power_to_db по умолчанию
+AMIN = 1e-10
+TOP_DB = 80.0
+
+_sessions = threading.BoundedSemaphore(STREAM_MAX_SESSIONS)
+
+metrics.describe("voice_stream_hop_seconds", "Latency of streaming voice hops", metrics.DURATION_BUCKETS)
+metrics.describe("voice_stream_hops_total", "Streaming voice hops by outcome (emitted, skipped, over_budget)")
+
+# Окно STFT, мел-фильтры и матрица DCT, как в librosa.feature.melspectrogram и mfcc
+_window = librosa.filters.get_window("hann", N_FFT, fftbins=True).astype(np.float32)
+_mel_basis = librosa.filters.mel(sr=SAMPLE_RATE, n_fft=N_FFT).astype(np.float32)
+# (MFCC линейны по логарифму мел-спектра, поэтому матрица DCT - это MFCC единичной матрицы)
+_dct = librosa.feature.mfcc(S=np.eye(_mel_basis.shape[0], dtype=np.float32), n_mfcc=N_MFCC)
+
+
+class StreamBusyError(RuntimeError):
+    """
+    Открыто максимальное количество потоковых сессий (см. STREAM_MAX_SESSIONS)
+    """
+
+
+class VoiceStream:
+    """
+    Оценка эмоций по голосу в реальном времени. Принимает куски PCM и держит
+    только то, что нужно для следующих кадров: хвост сигнала короче N_FFT
+    в кольцевом буфере отсчетов и логарифмы мел-спектра последних
+    WINDOW_FRAMES кадров в кольцевом буфере кадров. Для каждого куска
+    считаются только новые кадры, а раз в STREAM_HOP кадров окно
+    WINDOW_FRAMES x N_MFCC передается в голосовую модель.
+
+    Память сессии не зависит от длины разговора, а на каждом куске
+    выполняется не больше одного вызова модели: если клиент прислал
+    сразу несколько шагов, оценивается только последнее окно, а
+    пропущенные шаги учитываются в "skipped"
+    """
+
+    def __init__(self, pcm_format: str = "s16le", hop: int = STREAM_HOP, budget_ms: float = STREAM_BUDGET_MS):
+        """
+        :param pcm_format: Формат отсчетов (см. PCM_FORMATS)
+        :param hop: Шаг выдачи в кадрах MFCC
+        :param budget_ms: Бюджет задержки на шаг в миллисекундах
+        :raises ValueError: Если формат не поддерживается
+        """
+        if pcm_format not in PCM_FORMATS:
+            raise ValueError(f"Unsupported PCM format: {pcm_format!r}")
+        self.dtype, self.scale = PCM_FORMATS[pcm_format]
+        self.hop = max(1, hop)
+        self.budget = budget_ms / 1000
+        # Модель загружается при открытии сессии, чтобы первый шаг не ждал загрузки
+        voice_model()
+
+        # Остаток байт, не кратный размеру отсчета
+        self._pending = b""
+        # Отсчеты, из которых еще будут считаться кадры. Начало дополнено нулями,
+        # как в librosa при center=True (см. audio.compute_mfcc)
+        self._samples = np.zeros(N_FFT + STREAM_CHUNK_SIZE // self.dtype.itemsize, dtype=np.float32)
+        self._filled = N_FFT // 2
+        # Логарифмы мел-спектра последних WINDOW_FRAMES кадров
+        self._log_mel = np.zeros((WINDOW_FRAMES, _mel_basis.shape[0]), dtype=np.float32)
+
+        self.samples = 0
+        self.frames = 0
+        self.hops = 0
+        self.skipped = 0
+        self.over_budget = 0
+        self._last_emitted = None
+
+    def feed(self, data: bytes) -> list:
+        """
+        Добавляет кусок PCM и выдает эмоции для завершенных шагов
+
+        :param data: Отсчеты в формате сессии
+        :return: Список из одного результата (см. _emit), если шаг завершен, иначе пустой список
+        """
+        received = time.perf_counter()
+
+        data = self._pending + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._pending = data[usable:]
+
+        for start in range(0, usable, STREAM_CHUNK_SIZE):
+            chunk = np.frombuffer(data[start:min(start + STREAM_CHUNK_SIZE, usable)], dtype=self.dtype)
+            self._push(chunk.astype(np.float32) * self.scale)
+
+        return [self._emit(received)] if self._due() else []
+
+    def finish(self) -> list:
+        """
+        Завершает поток: дополняет конец нулями, как librosa при center=True,
+        и выдает эмоцию последнего окна, если после последнего шага появились новые кадры
+
+        :return: Список из одного результата или пустой список
+        """
+        received = time.perf_counter()
+        # После последнего отсчета librosa считает кадры, пока их центр внутри сигнала
+        n_frames = 1 + self.samples // HOP_LENGTH
+        while self.frames < n_frames:
+            self._push_samples(np.zeros(HOP_LENGTH, dtype=np.float32))
+        if self.frames >= WINDOW_FRAMES and self._last_emitted != self.frames:
+            return [self._emit(received)]
+        return []
+
+    def _push(self, x: np.ndarray) -> None:
+        self.samples += len(x)
+        self._push_samples(x)
+
+    def _push_samples(self, x: np.ndarray) -> None:
+        self._samples[self._filled:self._filled + len(x)] = x
+        self._filled += len(x)
+
+        n_new = 1 + (self._filled - N_FFT) // HOP_LENGTH if self._filled >= N_FFT else 0
+        if not n_new:
+            return
+
+        with metrics.stage("features"):
+            frames = librosa.util.frame(self._samples[:self._filled], frame_length=N_FFT, hop_length=HOP_LENGTH, axis=0)
+            power = np.abs(np.fft.rfft(frames[:n_new] * _window, axis=1)) ** 2
+            log_mel = 10 * np.log10(np.maximum(AMIN, power.astype(np.float32) @ _mel_basis.T))
+
+            for row in log_mel:
+                self._log_mel[self.frames % WINDOW_FRAMES] = row
+                self.frames += 1
+
+            # Оставляем только отсчеты, нужные следующему кадру
+            consumed = n_new * HOP_LENGTH
+            rest = self._filled - consumed
+            self._samples[:rest] = self._samples[consumed:self._filled]
+            self._filled = rest
+
+    def _due(self) -> bool:
+        if self.frames < WINDOW_FRAMES:
+            return False
+        if self._last_emitted is None:
+            return True
+        return self.frames - self._last_emitted >= self.hop
+
+    def window(self) -> np.ndarray:
+        """
+        MFCC текущего окна. Как и в audio.predict_voice, порог top_db
+        считается по максимуму окна
+
+        :return: Матрица (WINDOW_FRAMES x N_MFCC)
+        """
+        log_mel = np.roll(self._log_mel, -(self.frames % WINDOW_FRAMES), axis=0)
+        log_mel = np.maximum(log_mel, log_mel.max() - TOP_DB)
+        return log_mel @ _dct.T
+
+    def _emit(self, received: float) -> dict:
+        """
+        Оценивает текущее окно
+
+        :param received: Время получения куска, завершившего шаг (time.perf_counter)
+        :return: Словарь {"start", "end" (секунды от начала потока), "emotion",
+            "probabilities", "latency_ms", "skipped" (сколько шагов пропущено перед этим)}
+        """
+        skipped = 0
+        if self._last_emitted is not None:
+            skipped = max(0, (self.frames - self._last_emitted) // self.hop - 1)
+
+        probabilities = predict_windows(self.window()[None])[0]
+
+        latency = time.perf_counter() - received
+        self._last_emitted = self.frames
+        self.hops += 1
+        self.skipped += skipped
+
+        metrics.observe("voice_stream_hop_seconds", latency)
+        metrics.inc("voice_stream_hops_total", outcome="emitted")
+        if skipped:
+            metrics.inc("voice_stream_hops_total", skipped, outcome="skipped")
+        if latency > self.budget:
+            self.over_budget += 1
+            metrics.inc("voice_stream_hops_total", outcome="over_budget")
+            logger.warning(f"Voice stream hop took {latency * 1000:.1f} ms, budget {self.budget * 1000:.0f} ms")
+
+        seconds_per_frame = HOP_LENGTH / SAMPLE_RATE
+        return {
+            "start": round((self.frames - WINDOW_FRAMES) * seconds_per_frame, 3),
+            "end": round(self.frames * seconds_per_frame, 3),
+            "emotion": get_key_by_value(emotion_enc, probabilities.argmax()),
+            "probabilities": probabilities.tolist(),
+            "latency_ms": round(latency * 1000, 2),
+            "skipped": skipped,
+        }
+
+    def summary(self) -> dict:
+        """
+        :return: Итоги сессии {"seconds", "frames", "hops", "skipped", "over_budget"}
+        """
+        return {
+            "seconds": round(self.samples / SAMPLE_RATE, 3),
+            "frames": self.frames,
+            "hops": self.hops,
+            "skipped": self.skipped,
+            "over_budget": self.over_budget,
+        }
+
+
+def open_session(**kwargs) -> VoiceStream:
+    """
+    Открывает потоковую сессию, если не превышен STREAM_MAX_SESSIONS.
+    Сессию нужно закрыть через close_session
+
+    :param kwargs: Параметры VoiceStream
+    :raises StreamBusyError: Если открыто максимальное количество сессий
+    :raises ValueError: Если параметры неверны
+    :return: Сессия
+    """
+    if not _sessions.acquire(blocking=False):
+        raise StreamBusyError("Too many voice streams")
+    try:
+        return VoiceStream(**kwargs)
+    except Exception:
+        _sessions.release()
+        raise
+
+
+def close_session(session: VoiceStream) -> None:
+    """
+    Закрывает сессию, открытую через open_session
+
+    :param session: Сессия
+    """
+    _sessions.release()
+    logger.info(f"Voice stream closed: {session.summary()}")
@@ -4,6 +4,7 @@ import logging
 import os
 import re
 import shutil
+import threading
 import time
 from unicodedata import normalize
 
@@ -12,13 +13,6 @@ import magic
 from moviepy.editor import VideoFileClip
 from pydub import AudioSegment
 
-# Добавляем логирование
-logging.basicConfig(
-    filename="logfile.log",
-    level=logging.INFO,
-    filemode="w",
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
 AUDIO_EXTENSIONS = {"wav"}
@@ -94,34 +88,55 @@ def converter(filename: str, upload_dir: str = "uploaded_files") -> str:
     return filename
 
 
-def allowed_file(filename: str) -> bool:
+# Дескриптор libmagic не потокобезопасен, поэтому у каждого потока свой
+_magic = threading.local()
+
+
+def magic_handle() -> magic.Magic:
     """
-    Проверяет разрешенность файла на основе его расширения и MIME-типа
-    :param filename: Имя файла (с его путем)
-    :return: Булевое значение (True/False)
+    Дескриптор libmagic текущего потока: создается один раз и переиспользуется
+    :return: magic.Magic
     """
+    handle = getattr(_magic, "handle", None)
+    if handle is None:
+        handle = _magic.handle = magic.Magic()
+    return handle
 
+
+def allowed_extension(filename: str) -> bool:
+    """
+    Проверяет разрешенность файла по расширению
+    :param filename: Имя файла
+    :return: Булевое значение (True/False)
+    """
     # Проверяем содержит ли имя файла точку (.)
     if "." not in filename[1:]:
         return False
 
-    # Получаем расширение файла
-    file_extension = filename.rsplit(".", 1)[1].lower()
-
     # Проверяем содержится ли расширение файла в списке разрешенных
-    if file_extension not in ALLOWED_EXTENSIONS:
-        return False
+    return filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-    mime = magic.Magic()
 
-    # Получаем MIME тип файла
-    file_mt = mime.from_file(filename)
+def allowed_mime(file_mt: str) -> bool:
+    """
+    Проверяет, содержится ли MIME-тип (описание libmagic) в списке разрешенных
+    :param file_mt: Описание типа файла от libmagic
+    :return: Булевое значение (True/False)
+    """
+    return any(allowed_type in file_mt for allowed_type in ALLOWED_MIMES)
+
 
-    # Проверяем, содержится ли MIME-тип файла в списке разрешенных
-    if not any(allowed_type in file_mt for allowed_type in ALLOWED_MIMES):
+def allowed_file(filename: str) -> bool:
+    """
+    Проверяет разрешенность файла на основе его расширения и MIME-типа
+    :param filename: Имя файла (с его путем)
+    :return: Булевое значение (True/False)
+    """
+    if not allowed_extension(filename):
         return False
 
-    return True
+    # Получаем MIME тип файла
+    return allowed_mime(magic_handle().from_file(filename))
 
 
 _windows_device_files = (
@@ -0,0 +1,215 @@
+import json
+import os
+
+import numpy as np
+
+# Формат файла: MAGIC, длина заголовка (uint32), JSON-заголовок, выровненный
+# до ALIGNMENT, затем колонки подряд: время кадров (float32), маска кадров
+# с лицом (uint8), вероятности (float32, кадры x метки), рамки лиц (float32, кадры x 4)
+MAGIC = b"EMOTL\x01"
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class Timeline:
+    """
+    Вероятности эмоций по кадрам видео в предвыделенных массивах: время кадра,
+    маска кадров с лицом, вероятности (кадры x метки, float32) и рамки лиц.
+    Хранится в бинарном файле, который читается через np.memmap (см. save, load)
+    """
+
+    def __init__(self, labels: list, fps: float, capacity: int = 0):
+        """
+        :param labels: Метки классов (колонки вероятностей)
+        :param fps: Частота выбранных кадров
+        :param capacity: Ожидаемое количество кадров (массивы растут, если кадров больше)
+        """
+        self.labels = list(labels)
+        self.fps = float(fps)
+        self.length = 0
+        self._times = np.zeros(capacity, dtype=np.float32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._values = np.full((capacity, len(self.labels)), np.nan, dtype=np.float32)
+        self._boxes = np.full((capacity, 4), np.nan, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def times(self) -> np.ndarray:
+        """Время кадров в секундах"""
+        return self._times[:self.length]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Маска кадров, на которых найдено лицо"""
+        return self._valid[:self.length]
+
+    @property
+    def values(self) -> np.ndarray:
+        """Вероятности (кадры x метки), NaN для кадров без лица"""
+        return self._values[:self.length]
+
+    @property
+    def boxes(self) -> np.ndarray:
+        """Рамки лиц (кадры x 4), NaN для кадров без лица"""
+        return self._boxes[:self.length]
+
+    def _grow(self) -> None:
+        capacity = max(2 * len(self._times), 64)
+        for name, fill in (("_times", 0), ("_valid", False), ("_values", np.nan), ("_boxes", np.nan)):
+            old = getattr(self, name)
+            new = np.full((capacity, *old.shape[1:]), fill, dtype=old.dtype)
+            new[:self.length] = old[:self.length]
+            setattr(self, name, new)
+
+    def append(self, probabilities: dict | None, box=None) -> None:
+        """
+        Добавляет следующий выбранный кадр
+
+        :param probabilities: Вероятности {метка: вероятность} или None, если лица нет
+        :param box: Рамка лица (x1, y1, x2, y2) или None
+        """
+        if self.length == len(self._times):
+            self._grow()
+
+        i = self.length
+        self._times[i] = i / self.fps
+        if probabilities is not None:
+            self._valid[i] = True
+            self._values[i] = [probabilities[label] for label in self.labels]
+        if box is not None:
+            self._boxes[i] = box
+        self.length += 1
+
+    def probabilities(self, i: int) -> dict | None:
+        """
+        :param i: Номер кадра
+        :return: Вероятности кадра {метка: вероятность} или None, если лица нет
+        """
+        if not self.valid[i]:
+            return None
+        return dict(zip(self.labels, self.values[i].tolist()))
+
+    def slice(self, start: float | None = None, end: float | None = None) -> "Timeline":
+        """
+        Кадры в интервале времени [start, end) без копирования массивов
+
+        :param start: Начало интервала в секундах (None - с начала)
+        :param end: Конец интервала в секундах (None - до конца)
+        :return: Timeline, массивы которого - срезы массивов исходного
+        """
+        times = self.times
+        first = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        last = self.length if end is None else int(np.searchsorted(times, end, side="left"))
+        last = max(first, last)
+
+        part = Timeline(self.labels, self.fps)
+        part._times = times[first:last]
+        part._valid = self.valid[first:last]
+        part._values = self.values[first:last]
+        part._boxes = self.boxes[first:last]
+        part.length = last - first
+        return part
+
+    def per_second(self) -> tuple:
+        """
+        Средние вероятности по секундам видео
+
+        :return: Номера секунд (int32) и средние вероятности (секунды x метки,
+            float32, NaN для секунд без лица). Секунды идут подряд от первой до последней
+        """
+        if not self.length:
+            return np.zeros(0, dtype=np.int32), np.zeros((0, len(self.labels)), dtype=np.float32)
+
+        seconds = np.floor(self.times).astype(np.int32)
+        first = seconds[0]
+        index = seconds - first
+        n_seconds = index[-1] + 1
+
+        sums = np.zeros((n_seconds, len(self.labels)), dtype=np.float32)
+        counts = np.zeros(n_seconds, dtype=np.float32)
+        np.add.at(sums, index[self.valid], self.values[self.valid])
+        np.add.at(counts, index[self.valid], 1)
+
+        with np.errstate(invalid="ignore"):
+            return np.arange(first, first + n_seconds, dtype=np.int32), sums / counts[:, None]
+
+    def interpolated(self) -> np.ndarray:
+        """
+        Вероятности с линейно заполненными кадрами без лица (для графиков)
+
+        :return: Массив float32 (кадры x метки). Если лицо не найдено ни разу - NaN
+        """
+        values = self.values.copy()
+        if not self.valid.any() or self.valid.all():
+            return values
+
+        frames = np.arange(self.length)
+        for column in range(values.shape[1]):
+            values[:, column] = np.interp(frames, frames[self.valid], values[self.valid, column])
+        return values
+
+    def save(self, path: str) -> str:
+        """
+        Сохраняет тайм-лайн в бинарный файл
+
+        :param path: Путь к файлу
+        :return: Путь к файлу
+        """
+        header = json.dumps({"labels": self.labels, "fps": self.fps, "frames": self.length}).encode()
+        offset = _align(len(MAGIC) + 4 + len(header))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(MAGIC)
+            file.write(np.uint32(len(header)).tobytes())
+            file.write(header)
+            for column in (self.times, self.valid.astype(np.uint8), self.values, self.boxes):
+                file.write(b"\0" * (offset - file.tell()))
+                file.write(np.ascontiguousarray(column).tobytes())
+                offset = _align(file.tell())
+        os.replace(tmp_path, path)
+
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Timeline":
+        """
+        Читает тайм-лайн из файла (см. save)
+
+        :param path: Путь к файлу
+        :param mmap: Отображать колонки в память (np.memmap), а не читать их целиком
+        :raises ValueError: Если файл не является тайм-лайном
+        :return: Timeline (при mmap=True - только для чтения)
+        """
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an emotion timeline file")
+            header_size = int(np.frombuffer(file.read(4), dtype=np.uint32)[0])
+            header = json.loads(file.read(header_size))
+
+        timeline = cls(header["labels"], header["fps"])
+        n = timeline.length = header["frames"]
+        offset = _align(len(MAGIC) + 4 + header_size)
+
+        columns = []
+        for dtype, shape in (
+            (np.float32, (n,)),
+            (np.uint8, (n,)),
+            (np.float32, (n, len(timeline.labels))),
+            (np.float32, (n, 4)),
+        ):
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            if mmap and size:
+                columns.append(np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape))
+            else:
+                columns.append(np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape))
+            offset = _align(offset + size)
+
+        timeline._times, valid, timeline._values, timeline._boxes = columns
+        timeline._valid = valid.view(bool)
+        return timeline
@@ -0,0 +1,79 @@
+import numpy as np
+
+# Размер шаблона лица (в пикселях после масштабирования)
+TEMPLATE_SIZE = 32
+# Радиус поиска вокруг предыдущего положения (в пикселях шаблона)
+SEARCH_RADIUS = 8
+
+
+class FaceTracker:
+    """
+    Сопровождает лицо между детекциями MTCNN: ищет шаблон лица из последней
+    детекции в окрестности предыдущего положения по нормированной
+    взаимной корреляции
+    """
+
+    def __init__(self, min_confidence: float = 0.6):
+        """
+        :param min_confidence: Минимальная корреляция с шаблоном, ниже которой
+            сопровождение считается потерянным
+        """
+        self.min_confidence = min_confidence
+        self.box = None
+        self.template = None
+
+    def _patch(self, image, box, size: int) -> np.ndarray:
+        # Области за пределами кадра PIL заполняет нулями
+        patch = image.crop(tuple(box)).convert("L").resize((size, size))
+        return np.asarray(patch, dtype=np.float32)
+
+    def reset(self, image, box) -> None:
+        """
+        Запоминает лицо из новой детекции
+
+        :param image: Кадр (PIL.Image)
+        :param box: Рамка лица [x1, y1, x2, y2] или None, если лицо не найдено
+        """
+        self.box = None if box is None else np.asarray(box, dtype=np.float32)
+        if self.box is None:
+            self.template = None
+            return
+
+        template = self._patch(image, self.box, TEMPLATE_SIZE)
+        self.template = template - template.mean()
+
+    def track(self, image) -> tuple:
+        """
+        Переносит рамку лица на следующий кадр
+
+        :param image: Кадр (PIL.Image)
+        :return: Новая рамка и корреляция с шаблоном (None, 0.0, если лица нет)
+        """
+        if self.box is None:
+            return None, 0.0
+
+        x1, y1, x2, y2 = self.box
+        # Масштаб пикселя шаблона в пикселях кадра
+        sx = (x2 - x1) / TEMPLATE_SIZE
+        sy = (y2 - y1) / TEMPLATE_SIZE
+
+        region = self._patch(
+            image,
+            (x1 - SEARCH_RADIUS * sx, y1 - SEARCH_RADIUS * sy, x2 + SEARCH_RADIUS * sx, y2 + SEARCH_RADIUS * sy),
+            TEMPLATE_SIZE + 2 * SEARCH_RADIUS,
+        )
+
+        # Все положения шаблона в области поиска: (2r+1, 2r+1, T, T)
+        windows = np.lib.stride_tricks.sliding_window_view(region, (TEMPLATE_SIZE, TEMPLATE_SIZE))
+        windows = windows - windows.mean(axis=(2, 3), keepdims=True)
+
+        numerator = np.einsum("ijkl,kl->ij", windows, self.template)
+        denominator = np.sqrt((windows**2).sum(axis=(2, 3)) * (self.template**2).sum()) + 1e-6
+        correlation = numerator / denominator
+
+        dy, dx = np.unravel_index(correlation.argmax(), correlation.shape)
+        self.box = self.box + np.array(
+            [(dx - SEARCH_RADIUS) * sx, (dy - SEARCH_RADIUS) * sy] * 2, dtype=np.float32
+        )
+
+        return self.box, float(correlation[dy, dx])
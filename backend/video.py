@@ -1,54 +1,52 @@
+import itertools
 import logging
+import math
 import os
+import threading
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import seaborn as sns
-import torch
 from dotenv import load_dotenv
-from facenet_pytorch import MTCNN
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from moviepy.editor import ImageSequenceClip, VideoFileClip
+from moviepy.editor import VideoFileClip
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
 from PIL import Image, ImageDraw
-from tqdm.notebook import tqdm
-from transformers import (
-    AutoConfig,
-    AutoFeatureExtractor,
-    AutoModelForImageClassification,
-)
+from tqdm.auto import tqdm
 
-load_dotenv()
+from backend import metrics, models
+from backend.render import Compositor, GraphRenderer
+from backend.timeline import Timeline
+from backend.tracking import FaceTracker
 
-os.environ['XDG_CACHE_HOME'] = '/home/uncanny/.cache'
-os.environ['HUGGINGFACE_HUB_CACHE'] = '/home/uncanny/.cache'
+load_dotenv()
 
-extractor = AutoFeatureExtractor.from_pretrained("trpakov/vit-face-expression")
-model = AutoModelForImageClassification.from_pretrained("trpakov/vit-face-expression")
+# Сколько кадров обрабатывается MTCNN и моделью за один вызов
+BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", 16))
+# Сколько кадров анализируется на секунду видео, независимо от fps исходника
+SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", 15))
+# Кадры, отличающиеся от последнего проанализированного меньше порога
+# (средняя разница яркости, 0-255), не анализируются заново. 0 - анализировать все
+DIFF_THRESHOLD = float(os.getenv("VIDEO_DIFF_THRESHOLD", 0))
+# Через сколько проанализированных кадров запускать MTCNN, между ними лицо
+# сопровождается трекером. 1 - запускать MTCNN на каждом кадре
+DETECT_INTERVAL = int(os.getenv("VIDEO_DETECT_INTERVAL", 1))
+# Минимальная корреляция трекера с шаблоном лица, ниже которой запускается MTCNN
+TRACK_MIN_CONFIDENCE = float(os.getenv("VIDEO_TRACK_MIN_CONFIDENCE", 0.6))
+# Шаг прореживания пикселей при сравнении кадров
+SIGNATURE_STEP = 8
+# Точность классификатора эмоций на CPU: "fp32" или "int8" (динамическое квантование линейных слоев)
+VIT_PRECISION = os.getenv("VIT_PRECISION", "fp32")
 
-# Добавляем логирование 
-logging.basicConfig(
-    filename="logfile.log",
-    level=logging.INFO,
-    filemode="w",
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-logger.info("Running on device: {}".format(device))
-
-# Инициализация MTCNN-модели
-mtcnn = MTCNN(
-    image_size=160,
-    margin=0,
-    min_face_size=200,
-    thresholds=[0.6, 0.7, 0.7],
-    factor=0.709,
-    post_process=True,
-    keep_all=False,
-    device=device,
-)
+# Сборщики комбинированных изображений по наборам меток. Сборщик только читается,
+# а буфер изображения у каждого вызова render_video и video_pipeline свой
+_compositors = {}
+_compositor_lock = threading.Lock()
+# График вероятностей на тайм-лайне, создается при первом графике
+_graph_renderer = None
+_graph_lock = threading.Lock()
+
+# Список наших эмоций
+EMOTIONS = ["angry", "disgust", "fear", "happy", "neutral", "sad", "surprise"]
 
 # Цвета для разных эмоций
 colors = {
@@ -63,169 +61,475 @@ colors = {
 
 
 def load_video(scene: str):
-    clip = VideoFileClip(scene)
+    """
+    Открывает видео-файл без декодирования кадров
 
-    vid_fps = clip.fps
-    video = clip.without_audio()
-    video_data = np.array(list(video.iter_frames()))
+    :param scene: Путь к видео-файлу
+    :return: fps видео и клип без аудио-дорожки
+    """
+    clip = VideoFileClip(scene, audio=False)
 
-    return vid_fps, video, video_data
+    return clip.fps, clip
 
 
-def detect_emotions(image):
-    """Обнаруживает эмоцию по данному изображению
+def iter_frames(video, skips: int = 1):
+    """
+    Генератор кадров видео. Кадры декодируются по одному,
+    поэтому в памяти находится только текущий кадр, а не весь ролик
+
+    :param video: Видео-клип moviepy
+    :param skips: Шаг прореживания кадров
+    :return: Генератор кадров (np.ndarray, uint8)
+    """
+    # Время декодирования копится по кадрам и записывается одним замером на файл
+    clock = metrics.StageClock("decode_video")
+    frames = video.iter_frames(dtype="uint8")
+    try:
+        for i in itertools.count():
+            with clock.measure():
+                frame = next(frames, None)
+            if frame is None:
+                return
+            if i % skips == 0:
+                yield frame
+    finally:
+        clock.flush()
+
+
+def frame_signature(frame: np.ndarray) -> np.ndarray:
+    """
+    Уменьшенная яркостная копия кадра для быстрого сравнения кадров
+
+    :param frame: Кадр (np.ndarray, uint8)
+    :return: Матрица яркости (np.ndarray, float32)
+    """
+    return frame[::SIGNATURE_STEP, ::SIGNATURE_STEP].mean(axis=2, dtype=np.float32)
+
+
+def check_sampling(
+    sample_fps: float = SAMPLE_FPS,
+    diff_threshold: float = DIFF_THRESHOLD,
+    detect_interval: int = DETECT_INTERVAL,
+) -> None:
+    """
+    Проверяет параметры выборки и анализа кадров
+
+    :param sample_fps: Сколько кадров анализировать на секунду видео (больше 0)
+    :param diff_threshold: Порог изменения кадра (не меньше 0)
+    :param detect_interval: Через сколько кадров запускать MTCNN (не меньше 1)
+    :raises ValueError: Если параметр вне допустимого диапазона
+    """
+    if not sample_fps > 0:
+        raise ValueError(f"sample_fps must be positive, got {sample_fps}")
+    if not diff_threshold >= 0:
+        raise ValueError(f"diff_threshold must be non-negative, got {diff_threshold}")
+    if not detect_interval >= 1:
+        raise ValueError(f"detect_interval must be at least 1, got {detect_interval}")
+
+
+def sample_frames(video, sample_fps: float = SAMPLE_FPS, diff_threshold: float = DIFF_THRESHOLD):
+    """
+    Генератор кадров для анализа: выбирает sample_fps кадров на секунду видео
+    и отмечает, изменился ли кадр относительно последнего проанализированного
+
+    :param video: Видео-клип moviepy
+    :param sample_fps: Сколько кадров выбирать на секунду видео
+    :param diff_threshold: Порог средней разницы яркости, ниже которого кадр считается неизменившимся
+    :raises ValueError: Если sample_fps или diff_threshold вне допустимого диапазона
+    :return: Генератор пар (кадр, нужно ли анализировать кадр заново)
+    """
+    check_sampling(sample_fps, diff_threshold)
+    step = 1 / sample_fps
+    next_time = 0.0
+    reference = None
+
+    for i, frame in enumerate(iter_frames(video)):
+        # Небольшой допуск, чтобы погрешность float не сдвигала выборку на кадр
+        if i / video.fps + 1e-6 < next_time:
+            continue
+        next_time += step
+
+        if diff_threshold <= 0:
+            yield frame, True
+            continue
+
+        signature = frame_signature(frame)
+        changed = reference is None or np.abs(signature - reference).mean() >= diff_threshold
+        if changed:
+            reference = signature
+
+        yield frame, changed
+
+
+def iter_batches(iterable, size: int):
+    """
+    Группирует элементы генератора в списки фиксированного размера
+
+    :param iterable: Исходный генератор
+    :param size: Размер группы
+    :return: Генератор списков (последний может быть короче)
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def detect_face(image):
+    """Находит лицо на изображении
 
     :param image: Фотография (кадр видео)
-    :return: Лицо и вероятность принадлежности к классу (tuple(face, class_probabilities)), если найдено. Иначе - tuple(None, None)
+    :return: Обрезанное лицо, если найдено. Иначе - None
     """
-    temporary = image.copy()
+    return detect_faces([image])[0]
+
 
-    # Поиск лиц на изображении с помощью MTCNN модели
-    sample = mtcnn.detect(temporary)
-    if sample[0] is not None:
-        box = sample[0][0]
+def detect_boxes(images: list) -> list:
+    """
+    Находит рамки лиц на группе изображений одного размера за один вызов MTCNN
+
+    :param images: Список фотографий (кадров видео) одинакового размера
+    :return: Список рамок [x1, y1, x2, y2] в порядке изображений, None для кадров без лица
+    """
+    if not images:
+        return []
 
-        # Обрезаем лицо
-        face = temporary.crop(box)
+    # Поиск лиц на всех изображениях с помощью MTCNN модели
+    metrics.observe_batch("mtcnn", len(images))
+    with metrics.stage("detection"):
+        boxes, _ = models.get("mtcnn").detect(images)
 
-        inputs = extractor(images=face, return_tensors="pt")
+    return [None if image_boxes is None else image_boxes[0] for image_boxes in boxes]
 
-        outputs = model(**inputs)
 
-        # Применяем softmax к logits чтобы получить вероятности
-        probabilities = torch.nn.functional.softmax(outputs.logits, dim=-1)
+def detect_faces(images: list) -> list:
+    """
+    Находит лица на группе изображений одного размера за один вызов MTCNN
 
-        # Получаем id2label атрибут из конфигураций
-        config = AutoConfig.from_pretrained("trpakov/vit-face-expression")
-        id2label = config.id2label
+    :param images: Список фотографий (кадров видео) одинакового размера
+    :return: Список обрезанных лиц в порядке изображений, None для кадров без лица
+    """
+    # Обрезаем лица
+    return [
+        None if box is None else image.crop(box)
+        for image, box in zip(images, detect_boxes(images))
+    ]
 
-        probabilities = probabilities.detach().numpy().tolist()[0]
 
-        class_probabilities = {
-            id2label[i]: prob for i, prob in enumerate(probabilities)
-        }
+def track_boxes(images: list, tracker: FaceTracker, offset: int, detect_interval: int) -> list:
+    """
+    Находит рамки лиц на последовательных кадрах, запуская MTCNN только на каждом
+    detect_interval-ом кадре. На остальных кадрах рамка переносится трекером,
+    а если трекер теряет лицо, кадр проверяется MTCNN заново
+
+    :param images: Список последовательных кадров (PIL.Image) одинакового размера
+    :param tracker: Трекер лица, хранящий состояние между вызовами
+    :param offset: Порядковый номер первого кадра группы
+    :param detect_interval: Через сколько кадров запускать MTCNN
+    :return: Список рамок [x1, y1, x2, y2] в порядке изображений, None для кадров без лица
+    """
+    keyframes = [i for i in range(len(images)) if (offset + i) % detect_interval == 0]
+    detected = dict(zip(keyframes, detect_boxes([images[i] for i in keyframes])))
+
+    boxes = []
+    for i, image in enumerate(images):
+        if i in detected:
+            box = detected[i]
+            tracker.reset(image, box)
+        else:
+            box, confidence = tracker.track(image)
+            if box is not None and confidence < tracker.min_confidence:
+                box = detect_boxes([image])[0]
+                tracker.reset(image, box)
 
-        return face, class_probabilities
-    return None, None
+        boxes.append(box)
 
+    return boxes
 
-def create_combined_image(face, class_probabilities):
+
+def vit_model() -> tuple:
     """
-    Объединяет найденное лицо со столбчатой диаграммой (для красоты)
+    Классификатор эмоций выбранной точности (см. VIT_PRECISION)
 
-    :param face: Лицо
-    :param class_probabilities: Вероятность принадлежности к классу
-    :return: Объединенное изображение
+    :raises ValueError: Если указана неизвестная точность
+    :return: Экстрактор признаков, модель и метки классов
     """
+    if VIT_PRECISION == "fp32":
+        return models.get("vit")
+    if VIT_PRECISION == "int8":
+        return models.get("vit_int8")
+    raise ValueError(f"Unknown VIT_PRECISION: {VIT_PRECISION}")
 
-    palette = [colors[label] for label in class_probabilities.keys()]
 
-    fig, axs = plt.subplots(1, 2, figsize=(15, 6))
-    axs[0].imshow(np.array(face))
-    axs[0].axis("off")
+def classify_faces(faces: list, classifier: tuple | None = None) -> list:
+    """
+    Определяет эмоции для группы лиц за один проход модели
 
-    sns.barplot(
-        ax=axs[1],
-        y=list(class_probabilities.keys()),
-        x=[prob * 100 for prob in class_probabilities.values()],
-        palette=palette,
-        orient="h",
-    )
-    axs[1].set_xlabel("Probability (%)")
-    axs[1].set_title("Emotion Probabilities")
-    axs[1].set_xlim([0, 100])
+    :param faces: Список лиц (PIL.Image)
+    :param classifier: Экстрактор признаков, модель и метки классов (по умолчанию vit_model())
+    :return: Список словарей вероятностей принадлежности к классу, по одному на лицо
+    """
+    if not faces:
+        return []
 
-    canvas = FigureCanvas(fig)
-    canvas.draw()
-    img = np.frombuffer(canvas.tostring_rgb(), dtype="uint8")
-    img = img.reshape(canvas.get_width_height()[::-1] + (3,))
+    # torch импортируется здесь, чтобы импорт модуля не загружал фреймворк
+    import torch
 
-    plt.close(fig)
-    return img
+    extractor, model, id2label = classifier or vit_model()
 
+    metrics.observe_batch("vit", len(faces))
+    with metrics.stage("classification"):
+        inputs = extractor(images=faces, return_tensors="pt")
 
-def video_pipeline(file_path: str, doGraph: bool) -> tuple:
+        with torch.inference_mode():
+            outputs = model(**inputs)
+
+    # Применяем softmax к logits чтобы получить вероятности
+    probabilities = torch.nn.functional.softmax(outputs.logits, dim=-1)
+
+    return [
+        {id2label[i]: prob for i, prob in enumerate(row)}
+        for row in probabilities.numpy().tolist()
+    ]
+
+
+def detect_emotions(image):
+    """Обнаруживает эмоцию по данному изображению
+
+    :param image: Фотография (кадр видео)
+    :return: Лицо и вероятность принадлежности к классу (tuple(face, class_probabilities)), если найдено. Иначе - tuple(None, None)
     """
-    Пайплайн для обработки видео
+    face = detect_face(image)
+    if face is None:
+        return None, None
 
-    :param file_path: Путь к видео-файлу
-    :param doGraph: Делать ли график
-    :return: tuple: Путь к gif и None | Путь к gif и путь к графику
+    return face, classify_faces([face])[0]
+
+
+def create_combined_image(face, class_probabilities, out: np.ndarray | None = None):
     """
-    vid_fps, video, video_data = load_video(file_path)
-    filename = os.path.basename(file_path)
+    Объединяет найденное лицо со столбчатой диаграммой (для красоты)
 
-    skips = 2
-    reduced_video = []
-
-    for i in tqdm(range(0, len(video_data), skips)):  
-        """Укорачиваем видео в 2 раза в угоду оптимизации. 
-        Можно и больше, главное - расчитать сколько милисекунд 
-        в среднем длится человеческая эмоция, 
-        затем можно привязать это к video_fps"""
-        reduced_video.append(video_data[i])
-
-    # Список наших эмоций
-    emotions = ["angry", "disgust", "fear", "happy", "neutral", "sad", "surprise"]
-
-    # Список для хранения комбинированных изображений из create_combined_image()
-    combined_images = []
-
-    # Список для хранения вероятностей всех классов
-    all_class_probabilities = []
-
-    # Проходимся по всем кадрам в видео
-    for i, frame in tqdm(enumerate(reduced_video),
-                        total=len(reduced_video),
-                        desc="Processing frames"):
-        
-        # Рассматриваем кадры в типе uint8
-        frame = frame.astype(np.uint8)
-
-        # Получаем лицо и эмоции
-        face, class_probabilities = detect_emotions(Image.fromarray(frame))
-        
-        if face is not None:
-            # Создаем комбинированное изображение, если лицо найдено
-            combined_image = create_combined_image(face, class_probabilities)
-            combined_images.append(combined_image)
+    :param face: Лицо
+    :param class_probabilities: Вероятность принадлежности к классу
+    :param out: Буфер для изображения из предыдущего вызова того же видео
+        (перезаписывается) или None
+    :return: Объединенное изображение (out или новый буфер)
+    """
+    with metrics.stage("render"):
+        labels = tuple(class_probabilities.keys())
+        compositor = _compositors.get(labels)
+        if compositor is None:
+            with _compositor_lock:
+                compositor = _compositors.get(labels)
+                if compositor is None:
+                    compositor = _compositors[labels] = Compositor(labels, colors)
+
+        return compositor.compose(face, class_probabilities, out)
+
+
+def analyze_frames(
+    video,
+    batch_size: int = BATCH_SIZE,
+    sample_fps: float = SAMPLE_FPS,
+    diff_threshold: float = DIFF_THRESHOLD,
+    detect_interval: int = DETECT_INTERVAL,
+):
+    """
+    Генератор результатов анализа выбранных кадров видео: кадры декодируются,
+    выбираются, проходят детекцию и классификацию группами по batch_size
+
+    :param video: Видео-клип moviepy
+    :param batch_size: Сколько кадров обрабатывается MTCNN и моделью за один вызов
+    :param sample_fps: Сколько кадров анализировать на секунду видео
+    :param diff_threshold: Порог изменения кадра, ниже которого используется предыдущий результат
+    :param detect_interval: Через сколько кадров запускать MTCNN (1 - на каждом кадре,
+        больше 1 - между детекциями лицо сопровождается трекером)
+    :return: Генератор кортежей (лицо, рамка лица, вероятности классов, проанализирован
+        ли кадр заново) для каждого выбранного кадра. Для кадров без лица первые три - None
+    """
+    # Результат последнего проанализированного кадра: лицо, рамка и вероятности
+    last = (None, None, None)
+    analyzed = 0
+    tracker = FaceTracker(TRACK_MIN_CONFIDENCE)
+
+    # Проходимся по кадрам видео группами по batch_size
+    for batch in iter_batches(sample_frames(video, sample_fps, diff_threshold), batch_size):
+        # Находим лица только на изменившихся кадрах группы
+        images = [Image.fromarray(frame) for frame, changed in batch if changed]
+        if detect_interval > 1:
+            boxes = track_boxes(images, tracker, analyzed, detect_interval)
         else:
-            class_probabilities = {emotion: None for emotion in emotions}
-            
-        all_class_probabilities.append(class_probabilities)
+            boxes = detect_boxes(images)
+        analyzed += len(images)
 
-    # Создаем видео-клип из всех наших кадров
-    clip_with_plot = ImageSequenceClip(combined_images,
-                                    fps=vid_fps/skips)  # Здесь можно задать нужный fps выходного видео
+        # Обрезаем лица
+        faces = [
+            None if box is None else image.crop(tuple(box))
+            for image, box in zip(images, boxes)
+        ]
+        metrics.inc("frames_total", len(batch), kind="sampled")
+        metrics.inc("frames_total", len(images), kind="analyzed")
+        metrics.inc("faces_total", sum(face is not None for face in faces))
 
-    # Сохраняем файл
-    gif_path = f"./report/{filename[:filename.find('.')]}.mp4"
-    clip_with_plot.write_videofile(f"./report/{filename[:filename.find('.')]}.mp4", fps=vid_fps/skips)
+        # Определяем эмоции всех найденных лиц за один вызов модели
+        found = iter(classify_faces([face for face in faces if face is not None]))
+        results = iter(zip(faces, boxes))
 
-    # Преобразуем список вероятностей в DataFrame
-    df = pd.DataFrame(all_class_probabilities)
+        for frame, changed in batch:
+            if changed:
+                face, box = next(results)
+                last = (face, box, None if face is None else next(found))
 
-    df = df * 100
+            # Если кадр почти не изменился, используем предыдущий результат
+            yield (*last, changed)
+
+
+def render_graph(timeline: Timeline, fig_path: str) -> str:
+    """
+    Рисует график вероятностей эмоций на тайм-лайне
+
+    :param timeline: Результат анализа видео (см. video_pipeline)
+    :param fig_path: Путь для сохранения графика
+    :return: Путь к графику
+    """
+    global _graph_renderer
 
-    # Интерполируем проопущенные значения, чтобы график не выглядил "рваным"
-    df.interpolate(method='linear', inplace=True)
+    with metrics.stage("graph"):
+        # Интерполируем пропущенные значения, чтобы график не выглядел "рваным"
+        values = timeline.interpolated() * 100
 
-    fig, axs = plt.subplots(len(df.columns), 1, figsize=(15, 8), sharex=True)
+        # Фигура одна на процесс, поэтому графики разных запросов рисуются по очереди
+        with _graph_lock:
+            if _graph_renderer is None or _graph_renderer.labels != timeline.labels:
+                _graph_renderer = GraphRenderer(timeline.labels, colors)
+            return _graph_renderer.render(values, fig_path)
 
-    for i, emotion in enumerate(df.columns):
-        axs[i].plot(df[emotion], color=colors[emotion])
-        axs[i].set_ylabel('Вероятность (%)')
-        axs[i].set_title(emotion.capitalize())
 
+def render_video(file_path: str, timeline: Timeline, gif_path: str) -> str | None:
+    """
+    Собирает видео лиц и эмоций по сохраненному результату анализа,
+    без повторного запуска моделей
+
+    :param file_path: Путь к исходному видео-файлу
+    :param timeline: Результат анализа видео (см. video_pipeline)
+    :param gif_path: Путь для сохранения видео
+    :return: Путь к видео или None, если на видео не найдено ни одного лица
+    """
+    _, video = load_video(file_path)
+    writer = None
+    combined_image = None
+    encode = metrics.StageClock("encode")
+
+    try:
+        frames = sample_frames(video, timeline.fps)
+        for i, ((frame, _), box) in enumerate(zip(frames, timeline.boxes)):
+            if not timeline.valid[i]:
+                continue
+
+            face = Image.fromarray(frame).crop(tuple(box.tolist()))
+            combined_image = create_combined_image(face, timeline.probabilities(i), combined_image)
+            with encode.measure():
+                if writer is None:
+                    writer = FFMPEG_VideoWriter(gif_path, combined_image.shape[1::-1], timeline.fps)
+                writer.write_frame(combined_image)
+    finally:
+        if writer is not None:
+            with encode.measure():
+                writer.close()
+        encode.flush()
+        video.close()
+
+    return None if writer is None else gif_path
+
+
+def video_pipeline(
+    file_path: str,
+    doGraph: bool,
+    batch_size: int = BATCH_SIZE,
+    sample_fps: float = SAMPLE_FPS,
+    diff_threshold: float = DIFF_THRESHOLD,
+    detect_interval: int = DETECT_INTERVAL,
+    render: bool = True,
+    output_dir: str = "report",
+) -> tuple:
+    """
+    Пайплайн для обработки видео
+
+    :param file_path: Путь к видео-файлу
+    :param doGraph: Делать ли график
+    :param batch_size: Сколько кадров обрабатывается MTCNN и моделью за один вызов
+    :param sample_fps: Сколько кадров анализировать на секунду видео
+    :param diff_threshold: Порог изменения кадра, ниже которого используется предыдущий результат
+    :param detect_interval: Через сколько кадров запускать MTCNN (1 - на каждом кадре,
+        больше 1 - между детекциями лицо сопровождается трекером)
+    :param render: Собирать ли видео лиц и эмоций. Если False, выполняется только анализ,
+        а видео можно собрать позже через render_video
+    :param output_dir: Каталог для видео и графика
+    :return: tuple: Путь к gif, путь к графику (или None) и результат анализа
+        (backend.timeline.Timeline: вероятности и рамки лиц по кадрам). Путь к gif
+        равен None, если видео не собиралось или на видео не найдено ни одного лица
+    :raises ValueError: Если параметры выборки кадров вне допустимого диапазона (см. check_sampling)
+    """
+    check_sampling(sample_fps, diff_threshold, detect_interval)
+    vid_fps, video = load_video(file_path)
+    filename = os.path.basename(file_path)
 
+    # Анализируем фиксированное число кадров на секунду видео: человеческая эмоция
+    # длится заметно дольше одного кадра, поэтому результат не зависит от fps исходника
+    out_fps = min(sample_fps, vid_fps)
+    total_frames = math.ceil(video.duration * out_fps)
+
+    timeline = Timeline(EMOTIONS, out_fps, total_frames)
+
+    # Комбинированные изображения из create_combined_image() сразу пишем в видео,
+    # чтобы не держать их все в памяти
+    gif_path = os.path.join(output_dir, f"{filename[:filename.find('.')]}.mp4")
+    writer = None
+    combined_image = None
+    encode = metrics.StageClock("encode")
+    reused = 0
+
+    try:
+        results = tqdm(analyze_frames(video, batch_size, sample_fps, diff_threshold, detect_interval),
+                       total=total_frames,
+                       desc="Processing frames")
+
+        for face, box, class_probabilities, changed in results:
+            reused += not changed
+
+            if face is not None and render:
+                # Создаем комбинированное изображение, если лицо найдено
+                if changed:
+                    combined_image = create_combined_image(face, class_probabilities, combined_image)
+                with encode.measure():
+                    if writer is None:
+                        # Здесь можно задать нужный fps выходного видео
+                        writer = FFMPEG_VideoWriter(
+                            gif_path, combined_image.shape[1::-1], out_fps
+                        )
+                    writer.write_frame(combined_image)
+
+            timeline.append(class_probabilities, box)
+    finally:
+        if writer is not None:
+            with encode.measure():
+                writer.close()
+        encode.flush()
+        video.close()
+
+    logger.info(f"{filename}: {len(timeline)} frames sampled, {reused} reused")
+
+    if writer is None:
+        gif_path = None
 
     if doGraph:
-        plt.xlabel('Кадр')
-        fig.suptitle('Вероятность эмоции на тайм-лайне')
-        plt.tight_layout()
-        fig_path = f"./report/{filename[:filename.find('.')]}_graph.png"
-        plt.savefig(f"./report/{filename[:filename.find('.')]}_graph.png")
+        fig_path = render_graph(timeline, os.path.join(output_dir, f"{filename[:filename.find('.')]}_graph.png"))
 
-        return gif_path, fig_path
+        return gif_path, fig_path, timeline
 
-    return gif_path, None
+    return gif_path, None, timeline
@@ -0,0 +1,152 @@
+import json
+
+import h5py
+import numpy as np
+
+
+class NumpyVoiceModel:
+    """
+    Прямой проход Sequential-модели Keras (Conv1D, MaxPooling1D, Dense и т.д.)
+    на NumPy. Веса и архитектура читаются из .h5 файла, TensorFlow не нужен.
+    Интерфейс predict совпадает с keras.Model.predict
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Путь к .h5 файлу модели Keras
+        :raises ValueError: Если в модели есть неподдерживаемый слой
+        """
+        with h5py.File(path, "r") as f:
+            config = json.loads(f.attrs["model_config"])
+            weights = f["model_weights"]
+
+            self.layers = []
+            # Размер выхода (units последнего Dense) нужен для ответа на пустой вход
+            self.output_size = None
+            for layer in config["config"]["layers"]:
+                name = layer["config"].get("name")
+                params = {}
+                if name in weights:
+                    # Имена весов - относительные пути вида "conv1d_19/kernel"
+                    group = weights[name]
+                    for weight_name in group.attrs["weight_names"]:
+                        weight_name = weight_name.decode() if isinstance(weight_name, bytes) else weight_name
+                        params[weight_name.rsplit("/", 1)[-1].split(":")[0]] = np.asarray(
+                            group[weight_name], dtype=np.float32
+                        )
+                self.layers.append(self._build(layer["class_name"], layer["config"], params))
+                if layer["class_name"] == "Dense":
+                    self.output_size = layer["config"]["units"]
+
+    @staticmethod
+    def _activation(name: str):
+        if name == "linear":
+            return lambda x: x
+        if name == "relu":
+            return lambda x: np.maximum(x, 0)
+        if name == "softmax":
+
+            def softmax(x):
+                e = np.exp(x - x.max(axis=-1, keepdims=True))
+                return e / e.sum(axis=-1, keepdims=True)
+
+            return softmax
+        raise ValueError(f"Unsupported activation: {name}")
+
+    def _build(self, class_name: str, config: dict, params: dict):
+        """
+        Превращает слой Keras в функцию над батчем
+
+        :param class_name: Тип слоя
+        :param config: Конфигурация слоя
+        :param params: Веса слоя
+        :raises ValueError: Если слой или его параметры не поддерживаются
+        :return: Функция (np.ndarray -> np.ndarray)
+        """
+        if class_name in ("InputLayer", "Dropout", "Flatten"):
+            # Dropout на инференсе ничего не делает, Flatten выполняется в Dense
+            return lambda x: x
+
+        if class_name == "Activation":
+            return self._activation(config["activation"])
+
+        if class_name == "Conv1D":
+            kernel, bias = params["kernel"], params.get("bias")
+            size = kernel.shape[0]
+            if tuple(config["strides"]) != (1,) or tuple(config["dilation_rate"]) != (1,):
+                raise ValueError("Only Conv1D with strides=1 and dilation_rate=1 is supported")
+            padding = config["padding"]
+            if padding not in ("same", "valid"):
+                raise ValueError(f"Unsupported Conv1D padding: {padding}")
+            activation = self._activation(config["activation"])
+            # Ядро в порядке окон sliding_window_view: (каналы * размер ядра) x фильтры
+            patch_kernel = np.ascontiguousarray(kernel.transpose(1, 0, 2).reshape(-1, kernel.shape[2]))
+            # При малом числе входных каналов выгоднее одно большое умножение на
+            # матрицу окон (im2col), при большом - копирование окон дороже, чем
+            # несколько умножений на сдвинутые входы
+            use_patches = kernel.shape[0] * kernel.shape[1] <= 512
+
+            def conv1d(x):
+                if padding == "same":
+                    x = np.pad(x, ((0, 0), ((size - 1) // 2, size // 2), (0, 0)))
+                length = x.shape[1] - size + 1
+                if use_patches:
+                    patches = np.lib.stride_tricks.sliding_window_view(x, size, axis=1)
+                    out = (patches.reshape(x.shape[0] * length, -1) @ patch_kernel).reshape(x.shape[0], length, -1)
+                else:
+                    out = x[:, :length] @ kernel[0]
+                    for k in range(1, size):
+                        out += x[:, k:k + length] @ kernel[k]
+                if bias is not None:
+                    out += bias
+                return activation(out)
+
+            return conv1d
+
+        if class_name == "MaxPooling1D":
+            pool, stride = config["pool_size"][0], config["strides"][0]
+            if pool != stride or config["padding"] != "valid":
+                raise ValueError("Only MaxPooling1D with strides=pool_size and padding='valid' is supported")
+
+            def max_pooling1d(x):
+                length = x.shape[1] // pool
+                return x[:, :length * pool].reshape(x.shape[0], length, pool, x.shape[2]).max(axis=2)
+
+            return max_pooling1d
+
+        if class_name == "Dense":
+            kernel, bias = params["kernel"], params.get("bias")
+            activation = self._activation(config["activation"])
+
+            def dense(x):
+                # Flatten в channels_last совпадает с reshape по строкам
+                out = x.reshape(x.shape[0], -1) @ kernel
+                if bias is not None:
+                    out += bias
+                return activation(out)
+
+            return dense
+
+        raise ValueError(f"Unsupported layer: {class_name}")
+
+    def predict(self, x, batch_size: int = 32, verbose=0) -> np.ndarray:
+        """
+        Прямой проход по батчам
+
+        :param x: Входные данные (примеры x ...)
+        :param batch_size: Сколько примеров обрабатывать за раз
+        :param verbose: Не используется, оставлен для совместимости с Keras
+        :return: Выход модели (np.ndarray, float32)
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if x.shape[0] == 0:
+            return np.zeros((0, self.output_size), dtype=np.float32)
+
+        outputs = []
+        for start in range(0, x.shape[0], batch_size):
+            out = x[start:start + batch_size]
+            for layer in self.layers:
+                out = layer(out)
+            outputs.append(out)
+
+        return np.concatenate(outputs)
@@ -0,0 +1,80 @@
+"""
+Сравнение пропускной способности покадровой и пакетной детекции лиц MTCNN
+
+Запуск:
+    python -m benchmarks.detection path/to/video.mp4 --frames 128 --chunks 1 4 8 16 32
+"""
+import argparse
+import itertools
+import time
+
+from PIL import Image
+
+from backend.video import detect_face, detect_faces, iter_batches, iter_frames, load_video
+
+
+def load_frames(file_path: str, count: int) -> list:
+    """
+    Декодирует первые кадры видео
+
+    :param file_path: Путь к видео-файлу
+    :param count: Количество кадров
+    :return: Список кадров (PIL.Image)
+    """
+    _, video = load_video(file_path)
+    try:
+        return [Image.fromarray(frame) for frame in itertools.islice(iter_frames(video), count)]
+    finally:
+        video.close()
+
+
+def measure_per_frame(frames: list) -> tuple:
+    """
+    Детекция по одному кадру за вызов
+
+    :param frames: Список кадров
+    :return: Кадров в секунду и количество найденных лиц
+    """
+    start = time.perf_counter()
+    found = sum(detect_face(frame) is not None for frame in frames)
+    return len(frames) / (time.perf_counter() - start), found
+
+
+def measure_batched(frames: list, chunk_size: int) -> tuple:
+    """
+    Детекция группами по chunk_size кадров за вызов
+
+    :param frames: Список кадров
+    :param chunk_size: Размер группы
+    :return: Кадров в секунду и количество найденных лиц
+    """
+    start = time.perf_counter()
+    found = 0
+    for chunk in iter_batches(frames, chunk_size):
+        found += sum(face is not None for face in detect_faces(chunk))
+    return len(frames) / (time.perf_counter() - start), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("video", help="Путь к видео-файлу")
+    parser.add_argument("--frames", type=int, default=128, help="Количество кадров")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="Размеры групп")
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+
+    # Прогрев, чтобы не учитывать инициализацию модели
+    detect_faces(frames[:1])
+
+    fps, found = measure_per_frame(frames)
+    print(f"{'mode':<12}{'chunk':>8}{'fps':>12}{'speedup':>10}{'faces':>8}")
+    print(f"{'per-frame':<12}{1:>8}{fps:>12.2f}{1:>10.2f}{found:>8}")
+
+    for chunk_size in args.chunks:
+        batched_fps, found = measure_batched(frames, chunk_size)
+        print(f"{'batched':<12}{chunk_size:>8}{batched_fps:>12.2f}{batched_fps / fps:>10.2f}{found:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Время отрисовки графика вероятностей на тайм-лайне в зависимости от длины видео
+
+Запуск:
+    python -m benchmarks.graph --minutes 1 10 60 120 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from backend.timeline import Timeline
+from backend.video import EMOTIONS, SAMPLE_FPS, render_graph
+
+
+def make_timeline(minutes: float, seed: int = 0) -> Timeline:
+    """
+    Синтетический тайм-лайн: случайное блуждание вероятностей, каждый
+    десятый кадр без лица
+
+    :param minutes: Длина видео в минутах
+    :param seed: Зерно генератора
+    :return: Timeline с SAMPLE_FPS кадрами на секунду
+    """
+    n = int(minutes * 60 * SAMPLE_FPS)
+    rng = np.random.default_rng(seed)
+    logits = np.cumsum(rng.normal(scale=0.1, size=(n, len(EMOTIONS))), axis=0)
+    probabilities = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+    timeline = Timeline(EMOTIONS, SAMPLE_FPS, n)
+    for i, row in enumerate(probabilities):
+        timeline.append(None if i % 10 == 0 else dict(zip(EMOTIONS, row.tolist())))
+    return timeline
+
+
+def measure(timeline: Timeline, fig_path: str, repeat: int) -> float:
+    """
+    :param timeline: Тайм-лайн
+    :param fig_path: Путь для графика
+    :param repeat: Количество замеров
+    :return: Медианное время отрисовки в миллисекундах
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render_graph(timeline, fig_path)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60, 120], help="Длины видео в минутах")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество замеров на длину")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fig_path = os.path.join(tmp_dir, "graph.png")
+
+        # Прогрев: первый вызов создает фигуру
+        render_graph(make_timeline(1 / 60), fig_path)
+
+        print(f"{'minutes':>8}{'frames':>10}{'ms':>10}")
+        for minutes in args.minutes:
+            timeline = make_timeline(minutes)
+            print(f"{minutes:>8g}{len(timeline):>10}{measure(timeline, fig_path, args.repeat):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+Воспроизводимый офлайн-бенчмарк аудио- и видео-пайплайнов по стадиям
+
+Запуск:
+    python -m benchmarks.pipelines --seconds 10 --width 640 --height 360 --fps 30 --output result.json
+    python -m benchmarks.pipelines --baseline baseline.json --tolerance 0.2
+    python -m benchmarks.pipelines --memory-sweep 5 20 60 --max-growth-mb 64
+
+Входные файлы генерируются ffmpeg (тестовая таблица и синусоида), по умолчанию
+вместо моделей используются заменители из benchmarks.stand_ins, поэтому
+бенчмарк не требует сети и кэша HuggingFace. Каждый сценарий выполняется
+в отдельном процессе, чтобы пиковая память одного не влияла на другой
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from queue import Empty
+
+import numpy as np
+
+from backend.decoder import get_ffmpeg
+
+SCENARIOS = ["voice", "voice_timeline", "video"]
+# Допустимый рост пиковой памяти видео-пайплайна между самым коротким и самым длинным видео
+MAX_GROWTH_MB = 64
+# Сколько секунд ждать результат одного сценария
+SCENARIO_TIMEOUT = 1800
+PERCENTILES = [50, 95, 99]
+# Стадии короче этого времени не сравниваются с базовым результатом: их разброс - шум
+MIN_COMPARE_MS = 5.0
+
+
+class StageTimer:
+    """
+    Замеряет собственное время стадий: время вложенных стадий вычитается
+    из времени внешней, поэтому сумма по стадиям не превышает общего времени
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._children = []
+
+    def _start(self) -> float:
+        self._children.append(0.0)
+        return time.perf_counter()
+
+    def _stop(self, stage: str, start: float) -> None:
+        elapsed = time.perf_counter() - start
+        self.samples[stage].append(elapsed - self._children.pop())
+        if self._children:
+            self._children[-1] += elapsed
+
+    def wrap(self, func, stage: str):
+        """
+        Оборачивает функцию: каждый вызов - один замер стадии
+
+        :param func: Функция
+        :param stage: Имя стадии
+        :return: Обернутая функция
+        """
+
+        def wrapper(*args, **kwargs):
+            start = self._start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._stop(stage, start)
+
+        return wrapper
+
+    def wrap_generator(self, func, stage: str):
+        """
+        Оборачивает функцию-генератор: каждый полученный элемент - один замер стадии
+
+        :param func: Функция-генератор
+        :param stage: Имя стадии
+        :return: Обернутая функция-генератор
+        """
+
+        def wrapper(*args, **kwargs):
+            iterator = iter(func(*args, **kwargs))
+            while True:
+                start = self._start()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self._stop(stage, start)
+                yield item
+
+        return wrapper
+
+    def patch(self, owner, name: str, stage: str, generator: bool = False) -> None:
+        """
+        Подменяет атрибут модуля или класса замеряемой версией
+
+        :param owner: Модуль или класс
+        :param name: Имя функции
+        :param stage: Имя стадии
+        :param generator: Является ли функция генератором
+        """
+        func = getattr(owner, name)
+        setattr(owner, name, (self.wrap_generator if generator else self.wrap)(func, stage))
+
+
+def summarize(samples: list) -> dict:
+    """
+    Сводная статистика по замерам
+
+    :param samples: Длительности в секундах
+    :return: Количество, сумма, среднее и перцентили (в миллисекундах)
+    """
+    values = np.array(samples) * 1000
+    summary = {"calls": len(values), "total_ms": float(values.sum()), "mean_ms": float(values.mean())}
+    for q in PERCENTILES:
+        summary[f"p{q}_ms"] = float(np.percentile(values, q))
+    return summary
+
+
+def make_inputs(directory: str, seconds: float, width: int, height: int, fps: float) -> dict:
+    """
+    Генерирует синтетические аудио- и видео-файлы (или берет уже сгенерированные)
+
+    :param directory: Каталог для файлов
+    :param seconds: Длительность
+    :param width: Ширина кадра
+    :param height: Высота кадра
+    :param fps: Частота кадров
+    :return: Пути {"audio": wav, "video": mp4}
+    """
+    name = f"synthetic_{seconds:g}s_{width}x{height}_{fps:g}fps"
+    paths = {"audio": os.path.join(directory, f"{name}.wav"), "video": os.path.join(directory, f"{name}.mp4")}
+    tone = f"sine=frequency=220:sample_rate=44100:duration={seconds}"
+
+    commands = {
+        "audio": ["-f", "lavfi", "-i", tone, "-ac", "1"],
+        "video": [
+            "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={seconds}",
+            "-f", "lavfi", "-i", tone,
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest",
+        ],
+    }
+    for kind, args in commands.items():
+        if not os.path.exists(paths[kind]):
+            subprocess.run([get_ffmpeg(), "-nostdin", "-v", "error", "-y", *args, paths[kind]], check=True)
+
+    return paths
+
+
+def instrument(timer: StageTimer) -> None:
+    """
+    Подменяет функции пайплайнов замеряемыми версиями
+    """
+    from backend import audio, video
+
+    timer.patch(audio, "decode_audio", "decode")
+    timer.patch(audio, "compute_mfcc", "features")
+
+    voice_model = audio.voice_model
+
+    def timed_voice_model():
+        model = voice_model()
+        return type("TimedModel", (), {"predict": staticmethod(timer.wrap(model.predict, "inference"))})
+
+    audio.voice_model = timed_voice_model
+
+    timer.patch(video, "iter_frames", "decode", generator=True)
+    timer.patch(video, "sample_frames", "sampling", generator=True)
+    timer.patch(video, "detect_boxes", "detection")
+    timer.patch(video, "classify_faces", "classification")
+    timer.patch(video, "create_combined_image", "rendering")
+    timer.patch(video, "render_graph", "graph")
+
+    class TimedWriter(video.FFMPEG_VideoWriter):
+        write_frame = timer.wrap(video.FFMPEG_VideoWriter.write_frame, "encoding")
+        close = timer.wrap(video.FFMPEG_VideoWriter.close, "encoding")
+
+    video.FFMPEG_VideoWriter = TimedWriter
+
+
+def run_scenario(scenario: str, paths: dict, options: dict) -> dict:
+    """
+    Выполняет сценарий несколько раз и собирает статистику. Вызывается
+    в отдельном процессе
+
+    :param scenario: Имя сценария (см. SCENARIOS)
+    :param paths: Пути к входным файлам
+    :param options: Параметры запуска (repeat, warmup, real_models, render, seconds)
+    :return: Статистика сценария
+    """
+    if not options["real_models"]:
+        from benchmarks import stand_ins
+
+        stand_ins.install()
+
+    from backend import audio, video
+
+    timer = StageTimer()
+    instrument(timer)
+
+    if scenario == "voice":
+        # Без оконного режима модель оценивает только первый фрагмент записи
+        run = lambda: audio.predict_voice(paths["audio"])
+        units = min(options["seconds"], audio.LENGTH_CHOSEN / audio.SAMPLE_RATE)
+    elif scenario == "voice_timeline":
+        run, units = lambda: audio.predict_voice_timeline(paths["audio"]), options["seconds"]
+    else:
+        run, units = lambda: video.video_pipeline(paths["video"], True, render=options["render"]), None
+
+    for _ in range(options["warmup"]):
+        run()
+    timer.samples.clear()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    wall = []
+    for _ in range(options["repeat"]):
+        start = time.perf_counter()
+        result = run()
+        wall.append(time.perf_counter() - start)
+
+    if scenario == "video":
+        # Пропускная способность видео - проанализированные кадры в секунду
+        units, unit = len(result[2]), "frames/s"
+    else:
+        unit = "audio s/s"
+
+    return {
+        "wall": summarize(wall),
+        "throughput": {"value": units / float(np.median(wall)), "unit": unit},
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_before_mb": rss_before / 1024,
+        "stages": {stage: summarize(samples) for stage, samples in timer.samples.items()},
+    }
+
+
+def _child(scenario: str, paths: dict, options: dict, queue) -> None:
+    # Отчеты пайплайна (видео и графики) пишутся в ./report рабочего каталога
+    os.chdir(options["workdir"])
+    queue.put(run_scenario(scenario, paths, options))
+
+
+class ScenarioFailedError(RuntimeError):
+    """
+    Процесс сценария завершился с ошибкой или не уложился в отведенное время
+    """
+
+
+def run_in_process(scenario: str, paths: dict, options: dict) -> dict:
+    """
+    Выполняет сценарий в отдельном процессе (см. run_scenario)
+
+    :param scenario: Имя сценария
+    :param paths: Пути к входным файлам
+    :param options: Параметры запуска (options["timeout"] - сколько секунд ждать результат)
+    :raises ScenarioFailedError: Если процесс упал или не вернул результат за options["timeout"]
+    :return: Статистика сценария
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(scenario, paths, options, queue))
+    process.start()
+
+    deadline = time.monotonic() + options["timeout"]
+    stats, timed_out = None, False
+    try:
+        # Ждем короткими интервалами, чтобы сразу заметить, что процесс упал, не вернув результат
+        while stats is None and process.is_alive():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            try:
+                stats = queue.get(timeout=min(1.0, remaining))
+            except Empty:
+                pass
+        if stats is None and not timed_out:
+            # Результат мог попасть в очередь прямо перед завершением процесса
+            try:
+                stats = queue.get(timeout=1.0)
+            except Empty:
+                pass
+    finally:
+        if stats is None and process.is_alive():
+            process.terminate()
+        process.join()
+
+    if timed_out:
+        raise ScenarioFailedError(f"{scenario}: no result in {options['timeout']:.0f} s")
+    if stats is None or process.exitcode != 0:
+        raise ScenarioFailedError(f"{scenario}: process exited with code {process.exitcode}")
+    return stats
+
+
+def memory_sweep(lengths: list, args, options: dict) -> list:
+    """
+    Запускает видео-пайплайн на видео разной длины, каждый раз в новом процессе,
+    и сравнивает пиковую память: при потоковой обработке она не должна расти с длиной
+
+    :param lengths: Длительности видео в секундах
+    :param args: Аргументы командной строки (размер кадра, fps, max_growth_mb)
+    :param options: Параметры запуска сценария
+    :return: Список строк с описанием нарушений (пустой, если память не растет)
+    """
+    peaks = []
+    for seconds in sorted(lengths):
+        paths = make_inputs(options["workdir"], seconds, args.width, args.height, args.fps)
+        stats = run_in_process("video", paths, {**options, "seconds": seconds, "repeat": 1, "warmup": 0})
+        peaks.append((seconds, stats["peak_rss_mb"]))
+        print(f"video {seconds:g}s: peak rss {stats['peak_rss_mb']:.0f} MB, p50 {stats['wall']['p50_ms']:.0f} ms")
+
+    growth = peaks[-1][1] - peaks[0][1]
+    print(f"peak rss growth {peaks[0][0]:g}s -> {peaks[-1][0]:g}s: {growth:.0f} MB (max {args.max_growth_mb:g} MB)")
+    if growth > args.max_growth_mb:
+        return [f"video peak rss grows with length: {peaks[0][1]:.0f} -> {peaks[-1][1]:.0f} MB"]
+    return []
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Сравнивает результат с сохраненным базовым и находит регрессии
+
+    :param result: Результат бенчмарка
+    :param baseline: Базовый результат
+    :param tolerance: Допустимое относительное ухудшение (0.2 - на 20%)
+    :return: Список строк с описанием регрессий
+    """
+    regressions = []
+
+    def check(name: str, new: float, old: float, higher_is_better: bool = False, floor: float = 0):
+        if old <= 0 or max(old, new) < floor:
+            return
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > tolerance:
+            regressions.append(f"{name}: {old:.2f} -> {new:.2f} ({change:.0%} worse)")
+
+    for scenario, stats in result["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if base is None:
+            continue
+        check(f"{scenario} wall p50, ms", stats["wall"]["p50_ms"], base["wall"]["p50_ms"])
+        check(f"{scenario} throughput, {stats['throughput']['unit']}", stats["throughput"]["value"],
+              base["throughput"]["value"], higher_is_better=True)
+        check(f"{scenario} peak rss, MB", stats["peak_rss_mb"], base["peak_rss_mb"])
+        for stage, stage_stats in stats["stages"].items():
+            if stage in base["stages"]:
+                check(f"{scenario}/{stage} total, ms", stage_stats["total_ms"], base["stages"][stage]["total_ms"],
+                      floor=MIN_COMPARE_MS)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="Сценарии")
+    parser.add_argument("--seconds", type=float, default=10, help="Длительность синтетических файлов")
+    parser.add_argument("--width", type=int, default=640, help="Ширина кадра")
+    parser.add_argument("--height", type=int, default=360, help="Высота кадра")
+    parser.add_argument("--fps", type=float, default=30, help="Частота кадров")
+    parser.add_argument("--repeat", type=int, default=3, help="Количество замеряемых запусков")
+    parser.add_argument("--warmup", type=int, default=1, help="Количество запусков для прогрева")
+    parser.add_argument("--no-render", action="store_true", help="Не собирать видео лиц (analysis-only)")
+    parser.add_argument("--real-models", action="store_true", help="Использовать настоящие модели вместо заменителей")
+    parser.add_argument("--workdir", default=None, help="Каталог для входных файлов и отчетов (по умолчанию временный)")
+    parser.add_argument("--output", default=None, help="Куда сохранить результат (JSON)")
+    parser.add_argument("--baseline", default=None, help="Базовый результат для сравнения (JSON)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое относительное ухудшение")
+    parser.add_argument("--memory-sweep", type=float, nargs="+", default=None,
+                        help="Вместо сценариев проверить, что пиковая память видео не растет с длительностью (секунды)")
+    parser.add_argument("--max-growth-mb", type=float, default=MAX_GROWTH_MB, help="Допустимый рост пиковой памяти")
+    parser.add_argument("--timeout", type=float, default=SCENARIO_TIMEOUT, help="Сколько секунд ждать результат сценария")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="emoclassify-bench-")
+    os.makedirs(os.path.join(workdir, "report"), exist_ok=True)
+
+    options = {
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "real_models": args.real_models,
+        "render": not args.no_render,
+        "seconds": args.seconds,
+        "workdir": workdir,
+        "timeout": args.timeout,
+    }
+
+    if args.memory_sweep:
+        try:
+            violations = memory_sweep(args.memory_sweep, args, options)
+        except ScenarioFailedError as e:
+            print(f"FAILED {e}")
+            sys.exit(1)
+        for violation in violations:
+            print(f"REGRESSION {violation}")
+        sys.exit(1 if violations else 0)
+
+    paths = make_inputs(workdir, args.seconds, args.width, args.height, args.fps)
+
+    result = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        },
+        "scenarios": {},
+    }
+
+    for scenario in args.scenarios:
+        try:
+            stats = result["scenarios"][scenario] = run_in_process(scenario, paths, options)
+        except ScenarioFailedError as e:
+            print(f"FAILED {e}")
+            sys.exit(1)
+
+        print(f"{scenario}: p50 {stats['wall']['p50_ms']:.1f} ms, "
+              f"{stats['throughput']['value']:.2f} {stats['throughput']['unit']}, "
+              f"peak rss {stats['peak_rss_mb']:.0f} MB")
+        for stage, stage_stats in sorted(stats["stages"].items(), key=lambda item: -item[1]["total_ms"]):
+            print(f"    {stage:<16}{stage_stats['calls']:>8} calls{stage_stats['total_ms']:>12.1f} ms"
+                  f"{stage_stats['p50_ms']:>10.2f} p50{stage_stats['p95_ms']:>10.2f} p95")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
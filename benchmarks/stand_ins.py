@@ -0,0 +1,80 @@
+"""
+Легкие модели-заменители для бенчмарков: повторяют интерфейс настоящих моделей,
+не требуют сети, кэша HuggingFace и файлов весов
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend import models
+from backend.video import EMOTIONS
+
+# Доля стороны кадра, которую занимает "лицо" заменителя MTCNN
+FACE_SCALE = 0.4
+# Размер изображения лица на входе заменителя классификатора
+FACE_INPUT_SIZE = 32
+
+
+class StandInMTCNN:
+    """
+    Заменитель MTCNN: "находит" лицо в центре каждого кадра
+    """
+
+    def detect(self, images: list) -> tuple:
+        boxes, probs = [], []
+        for image in images:
+            width, height = image.size
+            side = FACE_SCALE * min(width, height)
+            x1, y1 = (width - side) / 2, (height - side) / 2
+            boxes.append(np.array([[x1, y1, x1 + side, y1 + side]], dtype=np.float32))
+            probs.append(np.array([0.99], dtype=np.float32))
+
+        return boxes, probs
+
+
+class StandInVoiceModel:
+    """
+    Заменитель голосовой модели: линейный слой по средним MFCC и softmax
+    """
+
+    def __init__(self, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.weights = rng.normal(size=(40, 7)).astype(np.float32) / 100
+
+    def predict(self, x, batch_size: int = 32, verbose=0) -> np.ndarray:
+        logits = np.asarray(x, dtype=np.float32).mean(axis=1) @ self.weights
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+def _load_vit():
+    import torch
+
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(
+        torch.nn.Flatten(),
+        torch.nn.Linear(3 * FACE_INPUT_SIZE * FACE_INPUT_SIZE, len(EMOTIONS)),
+    ).eval()
+
+    def extractor(images, return_tensors="pt"):
+        pixels = np.stack(
+            [np.asarray(image.convert("RGB").resize((FACE_INPUT_SIZE, FACE_INPUT_SIZE))) for image in images]
+        )
+        return {"pixel_values": torch.from_numpy(pixels).permute(0, 3, 1, 2).float() / 255}
+
+    def classifier(pixel_values):
+        return SimpleNamespace(logits=model(pixel_values))
+
+    return extractor, classifier, dict(enumerate(EMOTIONS))
+
+
+def install() -> None:
+    """
+    Регистрирует заменители вместо настоящих моделей в реестре backend.models.
+    Вызывать до первого обращения к моделям
+    """
+    models.register("mtcnn")(StandInMTCNN)
+    models.register("vit")(_load_vit)
+    models.register("vit_int8")(_load_vit)
+    models.register("voice")(StandInVoiceModel)
+    models.register("voice_numpy")(StandInVoiceModel)
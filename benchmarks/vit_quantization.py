@@ -0,0 +1,112 @@
+"""
+Сравнение int8 (динамическое квантование) и fp32 классификатора эмоций на лицах
+
+Запуск:
+    python -m benchmarks.vit_quantization path/to/faces --batch 16 --limit 500
+
+В каталоге должны лежать вырезанные лица (.jpg, .jpeg, .png, .bmp)
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend import models
+from backend.video import classify_faces, iter_batches
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_faces(directory: str, limit: int | None) -> list:
+    """
+    Загружает вырезанные лица из каталога (включая вложенные)
+
+    :param directory: Каталог с изображениями
+    :param limit: Максимальное количество изображений (None - все)
+    :return: Список лиц (PIL.Image)
+    """
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+
+    return [Image.open(path).convert("RGB") for path in paths]
+
+
+def run(faces: list, classifier: tuple, batch_size: int) -> tuple:
+    """
+    Классифицирует все лица и замеряет пропускную способность
+
+    :param faces: Список лиц
+    :param classifier: Экстрактор признаков, модель и метки классов
+    :param batch_size: Сколько лиц за один проход модели
+    :return: Вероятности (лица x классы), лиц в секунду
+    """
+    # Прогрев, чтобы не учитывать первый проход
+    classify_faces(faces[:1], classifier)
+
+    start = time.perf_counter()
+    rows = []
+    for batch in iter_batches(faces, batch_size):
+        rows += [list(probs.values()) for probs in classify_faces(batch, classifier)]
+
+    return np.array(rows), len(faces) / (time.perf_counter() - start)
+
+
+def compare(fp32: np.ndarray, int8: np.ndarray) -> dict:
+    """
+    Сравнивает распределения классов двух моделей
+
+    :param fp32: Вероятности fp32-модели
+    :param int8: Вероятности int8-модели
+    :return: Доля совпавших классов, средняя и максимальная разница вероятностей,
+        среднее KL-расхождение int8 от fp32
+    """
+    eps = 1e-8
+    kl = (fp32 * (np.log(fp32 + eps) - np.log(int8 + eps))).sum(axis=1)
+
+    return {
+        "agreement": float((fp32.argmax(axis=1) == int8.argmax(axis=1)).mean()),
+        "mean_abs_diff": float(np.abs(fp32 - int8).mean()),
+        "max_abs_diff": float(np.abs(fp32 - int8).max()),
+        "mean_kl": float(kl.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("faces", help="Каталог с вырезанными лицами")
+    parser.add_argument("--batch", type=int, default=16, help="Сколько лиц за один проход модели")
+    parser.add_argument("--limit", type=int, default=None, help="Максимальное количество лиц")
+    args = parser.parse_args()
+
+    faces = load_faces(args.faces, args.limit)
+    if not faces:
+        parser.error(f"No images found in {args.faces}")
+
+    fp32_classifier = models.get("vit")
+    int8_classifier = models.get("vit_int8")
+    labels = list(fp32_classifier[2].values())
+
+    fp32, fp32_fps = run(faces, fp32_classifier, args.batch)
+    int8, int8_fps = run(faces, int8_classifier, args.batch)
+
+    report = compare(fp32, int8)
+    print(f"faces: {len(faces)}, batch: {args.batch}")
+    print(f"agreement: {report['agreement']:.2%}")
+    print(f"mean |p_fp32 - p_int8|: {report['mean_abs_diff']:.4f}, max: {report['max_abs_diff']:.4f}")
+    print(f"mean KL(fp32 || int8): {report['mean_kl']:.5f}")
+    print(f"fp32: {fp32_fps:.2f} faces/s, int8: {int8_fps:.2f} faces/s, speedup: {int8_fps / fp32_fps:.2f}")
+
+    # Распределение предсказанных классов у обеих моделей
+    print(f"{'class':<12}{'fp32':>8}{'int8':>8}")
+    for i, label in enumerate(labels):
+        print(f"{label:<12}{(fp32.argmax(axis=1) == i).sum():>8}{(int8.argmax(axis=1) == i).sum():>8}")
+
+
+if __name__ == "__main__":
+    main()
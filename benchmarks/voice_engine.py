@@ -0,0 +1,97 @@
+"""
+Сверка и сравнение скорости NumPy-движка голосовой модели с Keras
+
+Запуск:
+    python -m benchmarks.voice_engine path/to/audio.wav --batches 1 4 16 64 256
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend import models
+from backend.audio import SAMPLE_RATE, signal_windows
+from backend.decoder import decode_audio
+
+
+def load_windows(file_path: str, count: int) -> np.ndarray:
+    """
+    Окна MFCC записи, повторенные до нужного количества
+
+    :param file_path: Путь к аудио- или видео-файлу
+    :param count: Количество окон
+    :return: Массив окон (окна x кадры x MFCC)
+    """
+    windows, _, _ = signal_windows(decode_audio(file_path, SAMPLE_RATE))
+    return np.resize(windows, (count, *windows.shape[1:])).astype(np.float32)
+
+
+def compare_outputs(keras_model, numpy_model, windows: np.ndarray) -> tuple:
+    """
+    Сравнивает выходы моделей до softmax (вероятности у модели почти всегда
+    насыщены, поэтому по ним расхождение не видно) и итоговые классы
+
+    :param keras_model: Модель Keras
+    :param numpy_model: Модель NumpyVoiceModel
+    :param windows: Окна MFCC
+    :return: Максимальное абсолютное и относительное расхождение логитов,
+        доля совпавших классов
+    """
+    import tensorflow as tf
+
+    keras_logits = tf.keras.Model(keras_model.inputs, keras_model.layers[-2].output).predict(windows, verbose=0)
+
+    out = windows
+    for layer in numpy_model.layers[:-1]:
+        out = layer(out)
+
+    error = np.abs(keras_logits - out).max()
+    agreement = (
+        keras_model.predict(windows, verbose=0).argmax(axis=1) == numpy_model.predict(windows).argmax(axis=1)
+    ).mean()
+
+    return error, error / np.abs(keras_logits).max(), agreement
+
+
+def measure(model, windows: np.ndarray, batch_size: int, repeat: int) -> float:
+    """
+    Среднее время одного вызова predict на батче
+
+    :param model: Модель
+    :param windows: Окна MFCC
+    :param batch_size: Размер батча
+    :param repeat: Количество повторов
+    :return: Время в миллисекундах
+    """
+    batch = windows[:batch_size]
+    model.predict(batch, batch_size=batch_size, verbose=0)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model.predict(batch, batch_size=batch_size, verbose=0)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("audio", help="Путь к аудио- или видео-файлу")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 4, 16, 64, 256], help="Размеры батчей")
+    parser.add_argument("--repeat", type=int, default=10, help="Количество повторов")
+    args = parser.parse_args()
+
+    windows = load_windows(args.audio, max(args.batches))
+    keras_model = models.get("voice")
+    numpy_model = models.get("voice_numpy")
+
+    error, relative, agreement = compare_outputs(keras_model, numpy_model, windows)
+    print(f"max logit error: {error:.3g} (relative {relative:.3g}), class agreement: {agreement:.2%}")
+
+    print(f"{'batch':>8}{'keras, ms':>12}{'numpy, ms':>12}{'speedup':>10}")
+    for batch_size in args.batches:
+        keras_time = measure(keras_model, windows, batch_size, args.repeat)
+        numpy_time = measure(numpy_model, windows, batch_size, args.repeat)
+        print(f"{batch_size:>8}{keras_time:>12.2f}{numpy_time:>12.2f}{keras_time / numpy_time:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
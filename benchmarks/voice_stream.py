@@ -0,0 +1,200 @@
+"""
+Проверка потоковой оценки эмоций по голосу: фейковый клиент присылает PCM кусками в темпе реального времени
+
+Без --url сессия backend.stream.VoiceStream запускается в этом же процессе,
+с --url куски отправляются на POST /stream/voice запущенного API
+(Transfer-Encoding: chunked), а ответы читаются параллельно с отправкой.
+Задержка шага считается от отправки последнего отсчета окна до получения
+результата. Если хотя бы один шаг не уложился в бюджет, бенчмарк
+завершается с кодом 1.
+
+Запуск:
+    python -m benchmarks.voice_stream --seconds 30 --stand-ins
+    python -m benchmarks.voice_stream path/to/audio.wav --url http://localhost:5000
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+
+def make_signal(seconds: float, sample_rate: int, seed: int = 0) -> np.ndarray:
+    """
+    Синтетический "голос": тон с плавающей частотой и шумом
+
+    :param seconds: Длительность
+    :param sample_rate: Частота дискретизации
+    :param seed: Зерно генератора
+    :return: Сигнал float32
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    x = 0.3 * np.sin(2 * np.pi * 180 * t * (1 + 0.3 * np.sin(0.5 * t))) + 0.05 * rng.normal(size=t.size)
+    return x.astype(np.float32)
+
+
+def iter_chunks(pcm: bytes, chunk_bytes: int, realtime: float, bytes_per_second: int):
+    """
+    Отдает куски PCM, выдерживая темп воспроизведения
+
+    :param pcm: Отсчеты
+    :param chunk_bytes: Размер куска в байтах
+    :param realtime: Скорость относительно реального времени (0 - без пауз)
+    :param bytes_per_second: Байт на секунду звука
+    :return: Генератор (кусок, число отправленных байт после куска)
+    """
+    start = time.perf_counter()
+    for offset in range(0, len(pcm), chunk_bytes):
+        chunk = pcm[offset:offset + chunk_bytes]
+        if realtime:
+            delay = start + offset / bytes_per_second / realtime - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield chunk, offset + len(chunk)
+
+
+class SendLog:
+    """
+    Время отправки кусков: по нему считается, когда ушел последний отсчет окна
+    """
+
+    def __init__(self, bytes_per_second: int):
+        self.bytes_per_second = bytes_per_second
+        self.sent = []
+        self.times = []
+        self.lock = threading.Lock()
+
+    def add(self, sent: int) -> None:
+        with self.lock:
+            self.sent.append(sent)
+            self.times.append(time.perf_counter())
+
+    def latency(self, end: float, received: float) -> float:
+        with self.lock:
+            i = min(np.searchsorted(self.sent, end * self.bytes_per_second - 1), len(self.sent) - 1)
+            return received - self.times[i]
+
+
+def run_local(pcm: bytes, args, bytes_per_second: int) -> tuple:
+    """
+    :return: Результаты шагов с клиентской задержкой и итоги сессии
+    """
+    from backend import stream
+
+    session = stream.open_session(pcm_format="s16le", hop=args.hop, budget_ms=args.budget)
+    log, results = SendLog(bytes_per_second), []
+    try:
+        for chunk, sent in iter_chunks(pcm, args.chunk_bytes, args.realtime, bytes_per_second):
+            log.add(sent)
+            for result in session.feed(chunk):
+                results.append((result, log.latency(result["end"], time.perf_counter())))
+        for result in session.finish():
+            results.append((result, log.latency(result["end"], time.perf_counter())))
+        return results, session.summary()
+    finally:
+        stream.close_session(session)
+
+
+def run_http(pcm: bytes, args, bytes_per_second: int) -> tuple:
+    """
+    :return: Результаты шагов с клиентской задержкой и итоги сессии
+    """
+    url = urllib.parse.urlsplit(args.url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+    connection.putrequest("POST", f"{url.path.rstrip('/')}/stream/voice?hop={args.hop}")
+    connection.putheader("Content-Type", "application/octet-stream")
+    connection.putheader("Transfer-Encoding", "chunked")
+    connection.endheaders()
+    # Ответ без Content-Length закрывает HTTPConnection, поэтому тело отправляется в сокет напрямую
+    sock = connection.sock
+
+    log, results, summary, errors = SendLog(bytes_per_second), [], {}, []
+
+    def read():
+        try:
+            response = connection.getresponse()
+            if response.status != 200:
+                errors.append(f"HTTP {response.status}: {response.read().decode(errors='replace')}")
+                return
+            for line in response:
+                message = json.loads(line)
+                if "summary" in message:
+                    summary.update(message["summary"])
+                elif "emotion" in message:
+                    results.append((message, log.latency(message["end"], time.perf_counter())))
+        except Exception as e:
+            errors.append(repr(e))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+
+    try:
+        for chunk, sent in iter_chunks(pcm, args.chunk_bytes, args.realtime, bytes_per_second):
+            log.add(sent)
+            sock.sendall(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        sock.sendall(b"0\r\n\r\n")
+    except OSError as e:
+        # Сервер закрыл соединение (например, ответил 503): причина будет в ответе
+        errors.append(repr(e))
+
+    reader.join()
+    connection.close()
+    if errors:
+        raise RuntimeError(errors[-1] if errors[-1].startswith("HTTP") else errors[0])
+    return results, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("audio", nargs="?", help="Аудио-файл (по умолчанию - синтетический сигнал)")
+    parser.add_argument("--seconds", type=float, default=30, help="Длительность синтетического сигнала")
+    parser.add_argument("--url", help="Адрес API (по умолчанию - сессия в этом процессе)")
+    parser.add_argument("--chunk-ms", type=float, default=100, help="Длительность куска в миллисекундах")
+    parser.add_argument("--realtime", type=float, default=1, help="Скорость отправки относительно реального времени (0 - без пауз)")
+    parser.add_argument("--hop", type=int, default=None, help="Шаг в кадрах MFCC")
+    parser.add_argument("--budget", type=float, default=None, help="Бюджет задержки шага в миллисекундах")
+    parser.add_argument("--stand-ins", action="store_true", help="Модель-заменитель вместо model3.h5 (только без --url)")
+    args = parser.parse_args()
+
+    if args.stand_ins:
+        from benchmarks import stand_ins
+
+        stand_ins.install()
+
+    from backend import stream
+    from backend.decoder import decode_audio
+
+    args.hop = args.hop or stream.STREAM_HOP
+    args.budget = args.budget or stream.STREAM_BUDGET_MS
+
+    x = decode_audio(args.audio, stream.SAMPLE_RATE) if args.audio else make_signal(args.seconds, stream.SAMPLE_RATE)
+    pcm = (np.clip(x, -1, 1) * 32767).astype("<i2").tobytes()
+    bytes_per_second = stream.SAMPLE_RATE * 2
+    args.chunk_bytes = max(2, int(args.chunk_ms / 1000 * stream.SAMPLE_RATE)) * 2
+
+    results, summary = (run_http if args.url else run_local)(pcm, args, bytes_per_second)
+
+    print(f"{'start':>8}{'end':>8}  {'emotion':<16}{'server ms':>10}{'client ms':>10}")
+    for result, latency in results:
+        print(f"{result['start']:>8.2f}{result['end']:>8.2f}  {result['emotion']:<16}"
+              f"{result['latency_ms']:>10.1f}{latency * 1000:>10.1f}")
+
+    latencies = np.array([latency * 1000 for _, latency in results])
+    over_budget = int((latencies > args.budget).sum())
+    if len(latencies):
+        print(f"hops: {len(latencies)}, p50 {np.percentile(latencies, 50):.1f} ms, "
+              f"p95 {np.percentile(latencies, 95):.1f} ms, max {latencies.max():.1f} ms, "
+              f"budget {args.budget:.0f} ms, over budget: {over_budget}")
+    print(f"session: {summary}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
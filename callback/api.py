@@ -1,39 +1,63 @@
+import cProfile
+import json
 import logging
 import os
+import time
+import uuid
 
 from dotenv import load_dotenv
-from flask import Flask, Request, Response, jsonify, request, send_file
+import numpy as np
+from flask import Flask, Request, Response, g, jsonify, request, send_file, stream_with_context, url_for
 from flask.logging import default_handler
 from flask_cors import CORS
 
-from backend import system
-from backend.audio import predict_voice
+from backend import bulk, cache, ingest, jobs, metrics, models, storage, stream, system
+from backend.av import analyze_voice_track, av_pipeline
 from backend.report import create_report, generate_report_text
-from backend.video import video_pipeline
+from backend.video import (
+    DETECT_INTERVAL,
+    DIFF_THRESHOLD,
+    SAMPLE_FPS,
+    VIT_PRECISION,
+    check_sampling,
+    video_pipeline,
+)
+from backend.timeline import Timeline
 
 load_dotenv()
 
 HOST_ADRESS = os.getenv("HOST_ADRESS")
 BACKEND_PORT = os.getenv("BACKEND_PORT")
-FOLDERS = ["uploaded_files", "report"]
+# Модели, загружаемые при старте (через запятую: voice, vit, mtcnn). Остальные загружаются при первом запросе
+WARMUP_MODELS = [name.strip() for name in os.getenv("WARMUP_MODELS", "").split(",") if name.strip()]
 REQUIRED_SETTINGS = []
+# Каталог для профилей cProfile. Если задан, запрос с параметром ?profile=1 профилируется
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+# Расширение файла тайм-лайна видео (см. backend.timeline)
+TIMELINE_EXTENSION = ".timeline"
+# Настройки сессии, от которых зависит результат анализа (входят в ключ кэша)
+CACHE_PARAMS = [
+    "file_type",
+    "make_graph",
+    "double_check",
+    "voice_timeline",
+    "sample_fps",
+    "diff_threshold",
+    "detect_interval",
+    "analysis_only",
+]
 
 app = Flask(__name__)
 app.config["MAX_CONTENT_LENGTH"] = 2 * 1000 * 1000 * 1000  # 2Gb
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
-app.config["UPLOAD_FOLDER"] = "uploaded_files"
 CORS(app)
 
-for folder in FOLDERS:
-    if not os.path.exists(folder):
-        os.mkdir(folder)
-
 
 # Flask-логгирование
 logging.basicConfig(
     filename="logfile.log",
     level=logging.INFO,
-    filemode="w",
+    filemode="a",
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
@@ -42,16 +66,114 @@ default_handler = logging.StreamHandler()
 logger.addHandler(default_handler)
 
 
-def check_type(path: str) -> int:
-    """Функция для обработки ответа от system модуля
+@app.before_request
+def start_request_metrics():
+    """
+    Начинает замеры стадий запроса и, если запрошено, профилирование
+    """
+    g.started = time.perf_counter()
+    g.trace = metrics.start_trace()
+    g.profiler = None
+
+    if PROFILE_DIR and request.args.get("profile"):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
 
-    :param path: Путь к файлу
-    :return: Код обработки
+@app.after_request
+def finish_request_metrics(response: Response) -> Response:
+    """
+    Записывает длительность запроса в метрики и пишет в лог замеры его стадий
+    одной JSON-строкой. Профиль сохраняется в PROFILE_DIR, а путь к нему
+    возвращается в заголовке X-Profile
+    """
+    if "trace" not in g:
+        return response
+
+    if g.profiler is not None:
+        g.profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof")
+        g.profiler.dump_stats(profile_path)
+        g.profiler = None
+        response.headers["X-Profile"] = profile_path
+
+    elapsed = time.perf_counter() - g.started
+    trace = metrics.finish_trace(g.trace)
+    route = request.url_rule.rule if request.url_rule else "unknown"
+
+    metrics.observe("request_seconds", elapsed, route=route)
+    metrics.inc("requests_total", route=route, status=response.status_code)
+    # Ответ 500 на необработанное исключение уже учтен здесь, teardown его не считает
+    g.request_counted = True
+
+    if route != "/metrics":
+        logger.info(json.dumps({
+            "route": route,
+            "status": response.status_code,
+            "seconds": round(elapsed, 4),
+            "stages": {stage: round(seconds, 4) for stage, seconds in trace["stages"].items()},
+            "counters": trace["counters"],
+        }))
+
+    return response
+
+
+@app.teardown_request
+def release_request_workdir(error):
     """
-    isType, file_mt = system.allowed_file(path)
-    if not isType:
-        return 415
-    return 200
+    Удаляет рабочий каталог запроса, если он нужен только на время запроса
+    """
+    if g.get("release_workdir") is not None:
+        storage.release(g.release_workdir)
+
+
+@app.teardown_request
+def abort_request_metrics(error):
+    """
+    Останавливает профилирование и учитывает запрос, если обработчик упал
+    и ответ на него не прошел через finish_request_metrics
+    """
+    if g.get("profiler") is not None:
+        g.profiler.disable()
+    if error is not None and not g.get("request_counted"):
+        route = request.url_rule.rule if request.url_rule else "unknown"
+        metrics.inc("requests_total", route=route, status=500)
+
+
+@app.errorhandler(ingest.UploadRejectedError)
+def upload_rejected(error: ingest.UploadRejectedError):
+    """
+    Ответ на загрузку, отклоненную при приеме (тип файла, пустой или неполный запрос)
+    """
+    logger.warning(f"[flask] Upload rejected: {error}")
+    return jsonify({"error": str(error)}), error.status
+
+
+@app.errorhandler(stream.StreamBusyError)
+def stream_busy(error: stream.StreamBusyError):
+    """
+    Ответ на потоковую сессию сверх VOICE_STREAM_MAX_SESSIONS
+    """
+    logger.warning(f"[flask] Voice stream rejected: {error}")
+    return jsonify({"error": str(error)}), 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_report():
+    """
+    Метрики в формате Prometheus: длительность стадий и запросов,
+    размеры батчей моделей, количество кадров и лиц
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/models", methods=["GET"])
+def models_report():
+    """
+    Отчет о загруженных моделях: время загрузки и занимаемая память
+    """
+    return jsonify(models.report())
 
 
 def video_or_audio(filename: str) -> str:
@@ -66,15 +188,59 @@ def video_or_audio(filename: str) -> str:
     return "audio"
 
 
-def load_request_params(request: Request) -> dict:
-    """Функция загрузки параметров из запроса
+def parse_flag(value: str) -> bool:
+    """Разбирает флаг из поля формы. Флаг включают только "1", "true" и "yes"
+    (без учета регистра), поэтому "false" и "0" его не включают
+
+    :param value: Значение поля
+    :return: Булевое значение (True/False)
+    """
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+def read_form(form: dict, session: dict) -> None:
+    """Заполняет настройки сессии из полей формы
+
+    :param form: Поля формы (MultiDict)
+    :param session: Настройки сессии
+    :raises UploadRejectedError: Если параметры анализа видео вне допустимого диапазона (400)
+    """
+    session["report"] = form.get("report", False)
+    session["make_graph"] = form.get("make_graph", False)
+    session["transcribe"] = form.get("transcribe", False)
+    session["transcribe_focus"] = form.get("transcribe_focus", False)
+    session["double_check"] = form.get("double_check", False, type=parse_flag)
+    session["voice_timeline"] = form.get("voice_timeline", False, type=parse_flag)
+    session["sample_fps"] = form.get("sample_fps", SAMPLE_FPS, type=float)
+    session["diff_threshold"] = form.get("diff_threshold", DIFF_THRESHOLD, type=float)
+    session["detect_interval"] = form.get("detect_interval", DETECT_INTERVAL, type=int)
+    session["analysis_only"] = form.get("analysis_only", False, type=parse_flag)
+    session["timeline_resolution"] = form.get("timeline_resolution", "frame")
+    session["timeline_format"] = form.get("timeline_format", "json")
+    session["timeline_start"] = form.get("timeline_start", None, type=float)
+    session["timeline_end"] = form.get("timeline_end", None, type=float)
+
+    try:
+        check_sampling(session["sample_fps"], session["diff_threshold"], session["detect_interval"])
+    except ValueError as e:
+        raise ingest.UploadRejectedError(str(e), status=400)
+
+
+def load_request_params(request: Request, reuse_cached: bool = False) -> dict:
+    """Функция загрузки параметров из запроса. Тело запроса принимается потоком
+    (см. backend.ingest): файл неподходящего типа отклоняется по первым байтам
 
     :param request: Запрос
+    :param reuse_cached: Если клиент передал sha256 файла в заголовке X-Content-SHA256,
+        запросил analysis_only и результат для него уже в кэше, файл не принимается,
+        а запись кэша возвращается в session["cached"]
     :raises e: Точка останова при ошибке
-    :return: Словарь, содержащий настройки сессии
+    :return: Словарь, содержащий настройки сессии. Файл и результаты сессии
+        находятся в ее рабочем каталоге session["workdir"] (см. backend.storage)
     """
     session = {
         "filename": None,  # Имя файла
+        "workdir": storage.create_workdir(),  # Рабочий каталог сессии
         "file_type": None,  # Тип файла из функции video_or_audio()
         "report": False,  # Cоставить отчет о проделанной работе
         "make_graph": False,  # Нарисовать график для всей дорожки, показывающий эмоции
@@ -82,12 +248,38 @@ def load_request_params(request: Request) -> dict:
         # "transcribe": False,  # Добавить в ответ расшифровку разговора
         # "transcribe_focus": False,  # Показать эмоции в словах, к которым они принадлежат (работает только при "transcribe": True)
         "double_check": False,  # Добавить проверку эмоции в видео с помощью анализа аудио-дорожки (работате толкьо при "file_type": "video")
+        "voice_timeline": False,  # Оценить всю аудио-дорожку по окнам и вернуть эмоции по сегментам
+        "sample_fps": SAMPLE_FPS,  # Сколько кадров видео анализировать на секунду
+        "diff_threshold": DIFF_THRESHOLD,  # Порог изменения кадра, ниже которого кадр не анализируется заново
+        "detect_interval": DETECT_INTERVAL,  # Через сколько кадров запускать MTCNN, между ними лицо сопровождается трекером
+        "analysis_only": False,  # Вернуть только вероятности эмоций, без видео, графика и отчета
+        "timeline_resolution": "frame",  # Вероятности по кадрам ("frame") или средние по секундам ("second")
+        "timeline_format": "json",  # Формат вероятностей: "json" или "binary" (float32, кадры x эмоции)
+        "timeline_start": None,  # Вернуть вероятности начиная с этой секунды
+        "timeline_end": None,  # Вернуть вероятности до этой секунды
+        "content_hash": None,  # sha256 файла, посчитанный при приеме
+        "cached": None,  # Запись кэша, если файл не принимался (см. reuse_cached)
     }
+    claimed_hash = request.headers.get("X-Content-SHA256", "").strip().lower()
+
+    def lookup_cached(form: dict, filename: str) -> dict | None:
+        # Поля формы, переданные до файла, уже прочитаны
+        if not reuse_cached or not claimed_hash:
+            return None
+        read_form(form, session)
+        # Хэш не доказывает, что у клиента есть файл, поэтому без файла отдается только
+        # результат анализа, без артефактов (видео, графика, отчета), которые нельзя выдать чужому
+        if not session["analysis_only"]:
+            return None
+        session["file_type"] = video_or_audio(filename)
+        return cache.get(cache_key(claimed_hash, session), count=False)
+
     try:
-        session["report"] = request.form.get("report", False)
-        session["make_graph"] = request.form.get("make_graph", False)
-        session["transcribe"] = request.form.get("transcribe", False)
-        session["transcribe_focus"] = request.form.get("transcribe_focus", False)
+        with metrics.stage("upload_write"):
+            upload = ingest.receive(
+                request.stream, request.content_type, session["workdir"], on_file=lookup_cached
+            )
+        read_form(upload["form"], session)
 
         logger.info(f"[flask] All request params sucessfully loaded")
 
@@ -97,81 +289,458 @@ def load_request_params(request: Request) -> dict:
                 logger.error(f"[flask] Missing required setting: {key}")
                 raise ValueError
 
-        file = request.files["file"].filename
-        filename = system.secure_filename(file.filename)
-        if filename == "":
-            logger.error(f"[flask] File name must contain name and extension")
-            raise ValueError
-
+        filename = upload["filename"]
         session["file_type"] = video_or_audio(filename)
+        session["filename"] = filename
 
-        path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(path)
-        logger.info(f"[flask] File saved")
-
-        # Проверка файла на тип данных
-        status_code = check_type(path)
-        if status_code != 200:
-            raise "File data type is broken"
+        if upload["skipped"] is not None:
+            logger.info(f"[flask] Result for {filename} found in cache, file not received")
+            session["content_hash"] = claimed_hash
+            session["cached"] = upload["skipped"]
+            return session
 
-        session["filename"] = filename
+        logger.info(f"[flask] File saved")
+        session["content_hash"] = upload["content_hash"]
         return session
 
     except Exception as e:
         logger.error(f"[flask] Exception while loading parameters: {e}")
+        storage.release(session["workdir"])
         raise e
 
 
-@app.route("/upload", methods=["POST"])
-def handle_file_upload():
+def add_voice_result(voice: dict, response: dict) -> str:
+    """Добавляет в ответ результат анализа аудио-дорожки
+
+    :param voice: Результат анализа голоса (см. backend.av.analyze_voice_track)
+    :param response: Ответ API
+    :return: Итоговая эмоция
     """
-    Пайплайн для API
+    response["audio_answer"] = voice["emotion"]
+    if voice["segments"] is not None:
+        response["audio_timeline"] = voice["segments"]
 
+    return voice["emotion"]
 
-    """
-    request._load_form_data  # Загружаем данные переданные в формате form_data
 
-    session: dict = load_request_params(request)
+def analyze_file(file_path: str, session: dict) -> tuple:
+    """Анализирует файл согласно настройкам сессии
 
+    :param file_path: Путь к файлу
+    :param session: Настройки сессии
+    :return: Результат ({"response": ответ API}) и артефакты ({"video": путь к видео,
+        "graph": путь к графику, "timeline": путь к тайм-лайну видео, см. backend.timeline})
+    """
     response = {}
-    figure = None
-    gif = None
+    artifacts = {"video": None, "graph": None, "timeline": None}
+    voice_windowed = bool(session["voice_timeline"])
 
     if session["file_type"] == "video":
-        gif_path, fig_path = video_pipeline(
-            os.path.join(app.config["UPLOAD_FOLDER"], session["filename"]),
-            session["make_graph"],
-        )
-        gif = send_file(gif_path, as_attachment=True)
+        do_graph = session["make_graph"] and not session.get("analysis_only")
+        video_kwargs = {
+            "sample_fps": session.get("sample_fps", SAMPLE_FPS),
+            "diff_threshold": session.get("diff_threshold", DIFF_THRESHOLD),
+            "detect_interval": session.get("detect_interval", DETECT_INTERVAL),
+            "render": not session.get("analysis_only"),
+            "output_dir": storage.report_dir(session.get("workdir")),
+        }
 
         if session["double_check"]:
-            # Вызываем метод анализа для видео с предварительной конвертацией видео в .wav формат
-            filename = system.convert_mp4_to_wav(
-                os.path.join(app.config["UPLOAD_FOLDER"], session["filename"])
+            # Лицо и голос анализируются одновременно, аудио-дорожка декодируется
+            # из видео напрямую, без промежуточного .wav
+            gif_path, fig_path, video_timeline, voice, merged = av_pipeline(
+                file_path, do_graph, voice_windowed, **video_kwargs
+            )
+            add_voice_result(voice, response)
+            if merged is not None:
+                response["av_timeline"] = merged
+        else:
+            gif_path, fig_path, video_timeline = video_pipeline(
+                file_path, do_graph, **video_kwargs
             )
-            answer = predict_voice(filename)
-            response["audio_answer"] = answer
+
+        # Тайм-лайн сохраняется файлом, чтобы ответы по диапазонам времени читали его через mmap
+        timeline_path = os.path.join(
+            video_kwargs["output_dir"], os.path.splitext(os.path.basename(file_path))[0] + TIMELINE_EXTENSION
+        )
+        artifacts = {"video": gif_path, "graph": fig_path, "timeline": video_timeline.save(timeline_path)}
     else:
-        answer = predict_voice(
-            os.path.join(app.config["UPLOAD_FOLDER"], session["filename"])
+        add_voice_result(analyze_voice_track(file_path, voice_windowed), response)
+
+    # TTL рабочего каталога отсчитывается от окончания анализа, а не от загрузки
+    if session.get("workdir"):
+        storage.touch(session["workdir"])
+
+    return {"response": response}, artifacts
+
+
+def cache_key(content_hash: str, session: dict) -> str:
+    """Ключ кэша результата для содержимого файла и настроек сессии
+
+    :param content_hash: sha256 содержимого файла
+    :param session: Настройки сессии
+    :return: Ключ кэша
+    """
+    # Квантованный классификатор дает немного другие вероятности, поэтому точность входит в ключ.
+    # Версия результата отделяет записи, в которых тайм-лайн хранился в JSON
+    return cache.make_key(
+        content_hash,
+        vit_precision=VIT_PRECISION,
+        result_version=2,
+        **{name: session.get(name) for name in CACHE_PARAMS},
+    )
+
+
+def analyze_file_cached(file_path: str, session: dict, refresh: bool = False) -> dict:
+    """Анализирует файл, используя кэш результатов по содержимому файла
+
+    :param file_path: Путь к файлу
+    :param session: Настройки сессии
+    :param refresh: Анализировать заново и перезаписать запись кэша
+    :return: Запись кэша ({"result": ..., "artifacts": ...}, см. analyze_file)
+    """
+    # Хэш уже посчитан при приеме файла, повторно файл не читается
+    content_hash = session.get("content_hash") or cache.hash_file(file_path)
+    key = cache_key(content_hash, session)
+    if refresh:
+        cache.remove(key)
+        return cache.put(key, *analyze_file(file_path, session))
+    return cache.get_or_compute(key, lambda: analyze_file(file_path, session))
+
+
+def load_timeline(entry: dict) -> Timeline | None:
+    """Тайм-лайн видео из записи кэша
+
+    :param entry: Запись кэша (см. analyze_file_cached)
+    :raises FileNotFoundError: Если файл тайм-лайна уже вытеснен из кэша
+    :return: Timeline, отображенный в память, или None для аудио
+    """
+    path = entry["artifacts"].get("timeline")
+    return None if path is None else Timeline.load(path)
+
+
+def timeline_response(response: dict, timeline: Timeline | None, params: dict) -> Response:
+    """Ответ режима analysis_only: вероятности эмоций без видео и графиков
+
+    :param response: Ответ API (см. analyze_file)
+    :param timeline: Тайм-лайн видео или None
+    :param params: timeline_resolution, timeline_format и, необязательно,
+        timeline_start и timeline_end (в секундах)
+    :return: JSON с ответом и вероятностями или бинарный массив float32
+        (форма, метки, частота и время первого значения - в заголовках X-Timeline-*)
+    """
+    response = dict(response)
+    if timeline is None:
+        return jsonify(response)
+
+    # Читаются только кадры запрошенного интервала
+    timeline = timeline.slice(params.get("timeline_start"), params.get("timeline_end"))
+
+    if params["timeline_resolution"] == "second":
+        seconds, values = timeline.per_second()
+        rate, start = 1, float(seconds[0]) if len(seconds) else 0.0
+    else:
+        values, rate = timeline.values, timeline.fps
+        start = float(timeline.times[0]) if len(timeline) else 0.0
+
+    if params["timeline_format"] == "binary":
+        return Response(
+            np.ascontiguousarray(values).tobytes(),
+            mimetype="application/octet-stream",
+            headers={
+                "X-Timeline-Shape": ",".join(map(str, values.shape)),
+                "X-Timeline-Labels": ",".join(timeline.labels),
+                "X-Timeline-Rate": str(rate),
+                "X-Timeline-Start": str(start),
+            },
         )
-        response["audio_answer"] = answer
+
+    response["video_timeline"] = {
+        "labels": timeline.labels,
+        "rate": rate,
+        "start": start,
+        "values": np.where(np.isnan(values), None, values.astype(float).round(6)).tolist(),
+    }
+    return jsonify(response)
+
+
+@app.route("/cache", methods=["GET"])
+def cache_stats():
+    """
+    Счетчики попаданий и промахов кэша результатов
+    """
+    return jsonify(cache.stats())
+
+
+@app.route("/storage", methods=["GET"])
+def storage_stats():
+    """
+    Счетчики рабочих каталогов: создано, удалено после запроса, по TTL и по квоте
+    """
+    return jsonify(storage.stats())
+
+
+@app.route("/upload", methods=["POST"])
+def handle_file_upload():
+    """
+    Пайплайн для API
+
+
+    """
+    session: dict = load_request_params(request, reuse_cached=True)
+    # Результаты попадают в кэш, поэтому рабочий каталог удаляется сразу после ответа
+    g.release_workdir = session["workdir"]
+
+    entry = session["cached"] or analyze_file_cached(
+        os.path.join(session["workdir"], session["filename"]), session
+    )
+    if session["analysis_only"]:
+        try:
+            timeline = load_timeline(entry)
+        except FileNotFoundError:
+            # Запись вытеснена из кэша между поиском и чтением тайм-лайна
+            if session["cached"] is not None:
+                return jsonify({"error": "Cached result expired, upload the file again"}), 404
+            entry = analyze_file_cached(os.path.join(session["workdir"], session["filename"]), session, refresh=True)
+            timeline = load_timeline(entry)
+        return timeline_response(entry["result"]["response"], timeline, session)
+
+    response = dict(entry["result"]["response"])
+    artifacts = dict(entry["artifacts"])
 
     if session["report"]:
-        report_text = generate_report_text(session["filename"], answer)
-        if fig_path:
-            report_name = create_report(report_text, session["filename"], fig_path)
-            report_path = os.path.join("report", report_name)
-            report = send_file(report_path, as_attachment=True)
+        with metrics.stage("report"):
+            report_text = generate_report_text(session["filename"], response.get("audio_answer"))
+            report_name = create_report(
+                report_text, session["filename"], artifacts["graph"], storage.report_dir(session["workdir"])
+            )
+        artifacts["report"] = os.path.join(storage.report_dir(session["workdir"]), report_name)
+        # Отчет не кэшируется, поэтому рабочий каталог живет до TTL, чтобы отчет можно было скачать
+        g.release_workdir = None
+        storage.keep(session["workdir"])
+
+    # Файлы отдаются отдельными запросами, как артефакты задач (см. job_artifact)
+    job_id = jobs.record({"result": entry["result"], "artifacts": artifacts})
+    response["job_id"] = job_id
+    response["artifacts"] = {
+        name: url_for("job_artifact", job_id=job_id, name=name)
+        for name, path in artifacts.items()
+        if path is not None
+    }
+    return jsonify(response)
 
-            figure = send_file(fig_path, as_attachment=True)
-        else:
-            report_name = create_report(report_text, session["filename"])
-            report_path = os.path.join("report", report_name)
-            report = send_file(report_path, as_attachment=True)
 
-    return response, figure, gif, report
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Ставит файл в очередь на анализ и сразу возвращает идентификатор задачи.
+    Если очередь заполнена, возвращает 429
+    """
+    session: dict = load_request_params(request)
+    file_path = os.path.join(session["workdir"], session["filename"])
+
+    # Пока задача ждет в очереди или выполняется, сборщик не трогает ее рабочий каталог,
+    # а после завершения удаляет его по TTL (см. backend.storage)
+    try:
+        job_id = jobs.submit(analyze_file_cached, file_path, session,
+                             on_done=lambda: storage.keep(session["workdir"]))
+    except jobs.QueueFullError as e:
+        logger.warning(f"[flask] Job rejected: {e}")
+        storage.release(session["workdir"])
+        return jsonify({"error": "Too many pending jobs"}), 429
+
+    return jsonify({"job_id": job_id}), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    """
+    Состояние задачи и, если она завершена, ее результат
+    """
+    info = jobs.status(job_id)
+    if info is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    entry = info.pop("result")
+    if entry is not None:
+        info["response"] = entry["result"]["response"]
+        info["artifacts"] = [
+            name for name, path in entry["artifacts"].items() if path is not None
+        ]
+
+    return jsonify(info)
+
+
+@app.route("/jobs/<job_id>/timeline", methods=["GET"])
+def job_timeline(job_id: str):
+    """
+    Вероятности эмоций завершенной задачи за интервал времени. Параметры запроса:
+    start, end (секунды), resolution (frame или second), format (json или binary)
+    """
+    info = jobs.status(job_id)
+    if info is None or info["result"] is None:
+        return jsonify({"error": "Job not found or not finished"}), 404
+
+    try:
+        timeline = load_timeline(info["result"])
+    except FileNotFoundError:
+        # Файл мог быть вытеснен из кэша, как и другие артефакты (см. job_artifact)
+        return jsonify({"error": "Timeline not found"}), 404
+    if timeline is None:
+        return jsonify({"error": "Job has no video timeline"}), 404
+
+    params = {
+        "timeline_resolution": request.args.get("resolution", "frame"),
+        "timeline_format": request.args.get("format", "json"),
+        "timeline_start": request.args.get("start", None, type=float),
+        "timeline_end": request.args.get("end", None, type=float),
+    }
+    return timeline_response({}, timeline, params)
+
+
+@app.route("/jobs/<job_id>/artifacts/<name>", methods=["GET"])
+def job_artifact(job_id: str, name: str):
+    """
+    Файл-артефакт завершенной задачи или ответа /upload (video, graph, timeline, report)
+    """
+    info = jobs.status(job_id)
+    if info is None or info["result"] is None:
+        return jsonify({"error": "Job not found or not finished"}), 404
+
+    path = info["result"]["artifacts"].get(name)
+    # Файл мог быть вытеснен из кэша или удален вместе с рабочим каталогом
+    if path is None or not os.path.exists(path):
+        return jsonify({"error": "Artifact not found"}), 404
+
+    return send_file(path, as_attachment=True)
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id: str):
+    """
+    Отменяет задачу, которая еще ждет в очереди
+    """
+    cancelled = jobs.cancel(job_id)
+    if cancelled is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not cancelled:
+        return jsonify({"error": "Job is already running or finished"}), 409
+
+    return jsonify({"job_id": job_id, "status": "cancelled"})
+
+
+@app.route("/upload/bulk", methods=["POST"])
+def handle_bulk_upload():
+    """
+    Оценка эмоций по голосу для множества файлов (поле files: аудио, видео
+    или zip/tar архивы с ними). Окна разных файлов обрабатываются моделью
+    общими батчами. Файлы принимаются из потока тела запроса (см. backend.ingest).
+    Ответ - NDJSON, одна строка на файл: сначала строки {"filename", "error"}
+    для отклоненных файлов и архивов, затем результаты по мере готовности
+    """
+    bulk_dir = storage.create_workdir()
+
+    try:
+        with metrics.stage("upload_write"):
+            upload = ingest.receive_files(
+                request.stream,
+                request.content_type,
+                bulk_dir,
+                allowed_extension=bulk.allowed_extension,
+                allowed_mime=bulk.allowed_mime,
+            )
+    except Exception:
+        storage.release(bulk_dir)
+        raise
+    windowed = upload["form"].get("voice_timeline", False, type=parse_flag)
+
+    # Файлы для оценки (путь -> имя в ответе) и строки ответа для файлов, которые оценить нельзя
+    names, errors = {}, []
+    for file in upload["files"]:
+        filename, path = file["filename"], file["path"]
+        if path is None:
+            errors.append({"filename": filename, "error": file["error"]})
+            continue
+
+        if not bulk.is_archive(filename):
+            names[path] = filename
+            continue
+
+        extract_dir = f"{path}.d"
+        os.makedirs(extract_dir)
+        try:
+            extracted = bulk.extract_archive(path, extract_dir)
+        except bulk.ArchiveError as e:
+            logger.warning(f"[flask] Bulk upload: {filename} not extracted: {e}")
+            errors.append({"filename": filename, "error": str(e)})
+            continue
+        finally:
+            os.remove(path)
+
+        # Проверка MIME-типа распакованных файлов, как для одиночной загрузки
+        for candidate, member in extracted:
+            if system.allowed_file(candidate):
+                names[candidate] = f"{filename}/{member}"
+            else:
+                errors.append({"filename": f"{filename}/{member}", "error": "File data type is not allowed"})
+
+    if not names and not errors:
+        storage.release(bulk_dir)
+        return jsonify({"error": "No supported files in request"}), 400
+
+    logger.info(f"[flask] Bulk upload: {len(names)} files")
+
+    def generate():
+        try:
+            for error in errors:
+                yield json.dumps(error, ensure_ascii=False) + "\n"
+            for path, result in bulk.predict_voice_bulk(list(names), windowed=windowed):
+                yield json.dumps({"filename": names[path], **result}, ensure_ascii=False) + "\n"
+        finally:
+            storage.release(bulk_dir)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/stream/voice", methods=["POST"])
+def stream_voice():
+    """
+    Оценка эмоций по голосу в реальном времени. Тело запроса - поток PCM
+    (моно, частота backend.audio.SAMPLE_RATE, формат ?format=s16le|f32le),
+    удобнее всего с Transfer-Encoding: chunked. Ответ - NDJSON: первая строка
+    с параметрами сессии, затем по строке на каждый шаг (см. backend.stream.VoiceStream)
+    и итоговая строка с "summary"
+    """
+    try:
+        session = stream.open_session(
+            pcm_format=request.args.get("format", "s16le"),
+            hop=request.args.get("hop", stream.STREAM_HOP, type=int),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        yield json.dumps({
+            "sample_rate": stream.SAMPLE_RATE,
+            "hop_seconds": round(session.hop * stream.HOP_LENGTH / stream.SAMPLE_RATE, 3),
+            "budget_ms": session.budget * 1000,
+        }) + "\n"
+
+        for chunk in iter(lambda: request.stream.read(stream.STREAM_CHUNK_SIZE), b""):
+            for result in session.feed(chunk):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        for result in session.finish():
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        yield json.dumps({"summary": session.summary()}) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    # Сессия закрывается, даже если клиент отключился до начала ответа
+    response.call_on_close(lambda: stream.close_session(session))
+    return response
 
 
 if __name__ == "__main__":
+    if WARMUP_MODELS:
+        logger.info(f"[flask] Models warmed up: {models.warmup(*WARMUP_MODELS)}")
     app.run(host=HOST_ADRESS, port=BACKEND_PORT, debug=True)
@@ -0,0 +1,208 @@
+import hashlib
+import io
+import json
+import os
+import subprocess
+import zipfile
+
+import numpy as np
+import pytest
+import soundfile
+
+from backend.decoder import get_ffmpeg
+from benchmarks import stand_ins
+from benchmarks.pipelines import make_inputs
+
+stand_ins.install()
+
+from backend import cache, storage  # noqa: E402
+from callback import api  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(storage, "WORKDIR_ROOT", str(tmp_path / "sessions"))
+    return api.app.test_client()
+
+
+def make_wav(seconds: float = 3, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * 44000)) / 44000
+    x = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.normal(size=t.size)
+    buffer = io.BytesIO()
+    soundfile.write(buffer, x.astype(np.float32), 44000, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def upload(client, data: bytes, filename: str = "voice.wav", **form):
+    return client.post(
+        "/upload",
+        data={**form, "file": (io.BytesIO(data), filename)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_upload_returns_json(client):
+    data = make_wav()
+
+    for _ in range(2):  # промах и попадание в кэш
+        response = upload(client, data)
+        assert response.status_code == 200
+        assert response.json["audio_answer"]
+        assert response.json["job_id"]
+
+    assert cache.stats()["hits"] >= 1
+
+
+def test_upload_artifacts_are_downloadable(client):
+    response = upload(client, make_wav(seed=1), report="1")
+    assert response.status_code == 200
+
+    url = response.json["artifacts"]["report"]
+    assert client.get(url).status_code == 200
+    assert client.get(url.rsplit("/", 1)[0] + "/missing").status_code == 404
+
+
+def test_upload_video_artifacts(client, tmp_path):
+    path = make_inputs(str(tmp_path), 2, 160, 120, 10)["video"]
+    with open(path, "rb") as file:
+        response = upload(client, file.read(), "clip.mp4", make_graph="1")
+    assert response.status_code == 200
+
+    artifacts = response.json["artifacts"]
+    assert {"video", "graph", "timeline"} <= set(artifacts)
+    for url in artifacts.values():
+        assert client.get(url).status_code == 200
+
+
+@pytest.mark.parametrize("field, value", [
+    ("sample_fps", "0"),
+    ("sample_fps", "-5"),
+    ("diff_threshold", "-1"),
+    ("detect_interval", "0"),
+])
+def test_upload_rejects_invalid_sampling(client, field, value):
+    response = upload(client, make_wav(), **{field: value})
+    assert response.status_code == 400
+    assert field in response.json["error"]
+
+
+@pytest.mark.parametrize("value, analysis_only", [("false", False), ("0", False), ("1", True), ("true", True)])
+def test_analysis_only_flag(client, value, analysis_only):
+    response = upload(client, make_wav(), analysis_only=value)
+    assert response.status_code == 200
+    assert ("artifacts" not in response.json) == analysis_only
+
+
+@pytest.mark.parametrize("value, windowed", [("false", False), ("0", False), ("1", True), ("yes", True)])
+def test_voice_timeline_flag(client, value, windowed):
+    response = upload(client, make_wav(), voice_timeline=value)
+    assert response.status_code == 200
+    assert ("audio_timeline" in response.json) == windowed
+
+
+def test_bulk_upload_reports_bad_archives(client, tmp_path):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("speaker/voice.wav", make_wav(seed=2))
+    archive.seek(0)
+
+    response = client.post(
+        "/upload/bulk",
+        data={"files": [
+            (io.BytesIO(make_wav()), "voice.wav"),
+            (archive, "good.zip"),
+            (io.BytesIO(b"PK\x03\x04" + b"\0" * 100), "broken.zip"),
+        ]},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+
+    lines = {line["filename"]: line for line in map(json.loads, response.data.splitlines())}
+    assert set(lines) == {"voice.wav", "good.zip/speaker/voice.wav", "broken.zip"}
+    assert lines["voice.wav"]["emotion"]
+    assert lines["good.zip/speaker/voice.wav"]["emotion"]
+    assert "error" in lines["broken.zip"]
+
+
+@pytest.mark.parametrize("analysis_only", ["1", "0"])
+def test_content_hash_shortcut_is_analysis_only(client, analysis_only):
+    data = make_wav(seed=3)
+    assert upload(client, data, analysis_only=analysis_only).status_code == 200
+
+    # Не тот файл с хэшем закэшированного: без analysis_only файл принимается и проверяется
+    response = client.post(
+        "/upload",
+        data={"analysis_only": analysis_only, "file": (io.BytesIO(b"not a wav file"), "voice.wav")},
+        content_type="multipart/form-data",
+        headers={"X-Content-SHA256": hashlib.sha256(data).hexdigest()},
+    )
+    if analysis_only == "1":
+        assert response.status_code == 200
+        assert "artifacts" not in response.json
+    else:
+        assert response.status_code == 415
+
+
+def test_failed_request_is_counted_once(client, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("analysis failed")
+
+    monkeypatch.setattr(api, "analyze_file_cached", fail)
+    assert upload(client, make_wav(seed=4)).status_code == 500
+
+    line = 'emoclassify_requests_total{route="/upload",status="500"}'
+    counts = [row.split()[-1] for row in client.get("/metrics").text.splitlines() if row.startswith(line)]
+    assert counts == ["1"]
+
+
+@pytest.mark.parametrize("value, double_check", [("false", False), ("0", False), ("1", True), ("true", True)])
+def test_double_check_flag(client, tmp_path, value, double_check):
+    path = make_inputs(str(tmp_path), 2, 160, 120, 10)["video"]
+    with open(path, "rb") as file:
+        response = upload(client, file.read(), "clip.mp4", analysis_only="1", double_check=value)
+    assert response.status_code == 200
+    assert ("audio_answer" in response.json) == double_check
+
+
+@pytest.mark.parametrize("voice_timeline", ["0", "1"])
+def test_double_check_silent_video(client, tmp_path, voice_timeline):
+    path = str(tmp_path / "silent.mp4")
+    subprocess.run([
+        get_ffmpeg(), "-nostdin", "-v", "error", "-y",
+        "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=10:duration=2", "-pix_fmt", "yuv420p", path,
+    ], check=True)
+    with open(path, "rb") as file:
+        response = upload(client, file.read(), "silent.mp4", double_check="1", voice_timeline=voice_timeline)
+
+    assert response.status_code == 200
+    assert response.json["audio_answer"] is None
+    if voice_timeline == "1":
+        assert response.json["audio_timeline"] == []
+        assert all(second["voice"] is None for second in response.json["av_timeline"])
+
+
+def remove_cached_timelines():
+    for root, _, files in os.walk(cache.CACHE_DIR):
+        for name in files:
+            if name.startswith("timeline"):
+                os.remove(os.path.join(root, name))
+
+
+def test_evicted_timeline(client, tmp_path):
+    path = make_inputs(str(tmp_path), 2, 160, 120, 10)["video"]
+    with open(path, "rb") as file:
+        data = file.read()
+
+    job_id = upload(client, data, "clip.mp4").json["job_id"]
+    assert upload(client, data, "clip.mp4", analysis_only="1").status_code == 200
+    remove_cached_timelines()
+
+    # Файл принят: результат пересчитывается
+    response = upload(client, data, "clip.mp4", analysis_only="1")
+    assert response.status_code == 200
+    assert response.json["video_timeline"]["values"]
+
+    remove_cached_timelines()
+    assert client.get(f"/jobs/{job_id}/timeline").status_code == 404
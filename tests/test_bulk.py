@@ -0,0 +1,76 @@
+import io
+import tarfile
+import zipfile
+
+import numpy as np
+import pytest
+
+from backend import bulk
+
+
+def make_zip(path, members: dict, compression=zipfile.ZIP_STORED) -> str:
+    with zipfile.ZipFile(path, "w", compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_extract_keeps_member_paths(tmp_path):
+    archive = make_zip(tmp_path / "a.zip", {"one/voice.wav": b"1", "two/voice.wav": b"2", "notes.txt": b"-"})
+    target = tmp_path / "out"
+    target.mkdir()
+
+    extracted = bulk.extract_archive(archive, str(target))
+
+    assert [member for _, member in extracted] == ["one/voice.wav", "two/voice.wav"]
+    assert [open(path, "rb").read() for path, _ in extracted] == [b"1", b"2"]
+
+
+def test_extract_tar(tmp_path):
+    archive = str(tmp_path / "a.tar.gz")
+    with tarfile.open(archive, "w:gz") as tar:
+        info = tarfile.TarInfo("dir/voice.wav")
+        info.size = 3
+        tar.addfile(info, io.BytesIO(b"abc"))
+
+    extracted = bulk.extract_archive(archive, str(tmp_path))
+    assert [member for _, member in extracted] == ["dir/voice.wav"]
+
+
+def test_extract_rejects_zip_bomb(tmp_path):
+    archive = make_zip(tmp_path / "bomb.zip", {"voice.wav": b"\0" * 2**22}, zipfile.ZIP_DEFLATED)
+    with pytest.raises(bulk.ArchiveError, match="more than"):
+        bulk.extract_archive(archive, str(tmp_path))
+
+
+def test_extract_rejects_too_many_members(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_MEMBERS", 2)
+    archive = make_zip(tmp_path / "many.zip", {f"{i}.wav": b"x" for i in range(3)})
+    with pytest.raises(bulk.ArchiveError, match="more than 2 files"):
+        bulk.extract_archive(archive, str(tmp_path))
+
+
+def test_extract_rejects_corrupted_archive(tmp_path):
+    archive = tmp_path / "broken.tar"
+    archive.write_bytes(b"not an archive" * 100)
+    with pytest.raises(bulk.ArchiveError, match="corrupted"):
+        bulk.extract_archive(str(archive), str(tmp_path))
+
+
+def test_bulk_batches_are_bounded(monkeypatch):
+    batches = []
+
+    def predict_windows(windows, batch_size):
+        batches.append(batch_size)
+        return np.zeros((len(windows), len(bulk.emotion_enc)), dtype=np.float32)
+
+    # Одна длинная запись дает больше окон, чем batch_size
+    clip = (np.zeros((40, bulk.WINDOW_FRAMES, bulk.N_MFCC), dtype=np.float32), np.arange(40) * 10, 5000)
+    monkeypatch.setattr(bulk, "prepare_clip", lambda file_path, windowed: clip)
+    monkeypatch.setattr(bulk, "predict_windows", predict_windows)
+    monkeypatch.setattr(bulk, "summarize_windows", lambda predict, starts, n_samples: {"windows": len(predict)})
+
+    results = list(bulk.predict_voice_bulk(["a.wav", "b.wav"], windowed=True, batch_size=16, workers=1))
+
+    assert [result for _, result in results] == [{"windows": 40}, {"windows": 40}]
+    assert batches and all(batch_size == 16 for batch_size in batches)
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from backend import cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache, "CACHE_SIZE", 10_000)
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    def make(size: int) -> str:
+        path = tmp_path / f"artifact-{size}.bin"
+        path.write_bytes(b"\0" * size)
+        return str(path)
+
+    return make
+
+
+def cache_size() -> int:
+    return sum(cache._dir_size(entry.path) for entry in os.scandir(cache.CACHE_DIR) if entry.is_dir())
+
+
+def test_put_scans_cache_only_over_limit(artifact, monkeypatch):
+    scans = []
+    evict_locked = cache._evict_locked
+    monkeypatch.setattr(cache, "_evict_locked", lambda *args, **kwargs: scans.append(1) or evict_locked(*args, **kwargs))
+
+    monkeypatch.setattr(cache, "CACHE_SIZE", 100_000)
+    for i in range(200):
+        cache.put(f"key{i}", {"i": i}, {"video": artifact(1000)})
+        assert cache_size() <= cache.CACHE_SIZE
+        assert cache._read_size() == cache_size()
+
+    # Первая запись считает размер кэша, дальше полный обход нужен только при переполнении,
+    # и тогда освобождается место для нескольких записей
+    assert len(scans) <= 20
+    assert cache.get("key199")["result"] == {"i": 199}
+    assert cache.get("key0") is None
+
+
+def test_oversized_entry_links_stay_valid(artifact):
+    entry = cache.put("big", {"ok": True}, {"video": artifact(50_000), "graph": None})
+
+    path = entry["artifacts"]["video"]
+    assert path.startswith(cache.CACHE_DIR)
+    assert os.path.getsize(path) == 50_000
+    assert entry["artifacts"]["graph"] is None
+
+    # Следующая запись вытесняет ее как обычно
+    cache.put("small", {"ok": True}, {"video": artifact(100)})
+    assert not os.path.exists(path)
+
+
+def test_removed_entry_returns_no_links(artifact, monkeypatch):
+    monkeypatch.setattr(cache, "_load", lambda key: None)
+    entry = cache.put("gone", {"ok": True}, {"video": artifact(100)})
+    assert entry == {"result": {"ok": True}, "artifacts": {"video": None}}
+
+
+def test_remove_updates_size(artifact):
+    cache.put("a", {}, {"video": artifact(1000)})
+    cache.put("b", {}, {"video": artifact(2000)})
+    cache.remove("a")
+    assert cache.get("a") is None
+    assert cache._read_size() == cache_size()
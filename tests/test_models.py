@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import models
+
+NAME = "test_model"
+
+
+@pytest.fixture
+def loads():
+    """Регистрирует медленный загрузчик и считает его вызовы"""
+    calls = []
+
+    @models.register(NAME)
+    def load():
+        calls.append(threading.get_ident())
+        time.sleep(0.05)  # окно, в котором другие потоки тоже обращаются к модели
+        return object()
+
+    yield calls
+
+    for registry in (models._loaders, models._locks, models._models, models._stats):
+        registry.pop(NAME, None)
+
+
+def test_concurrent_get_loads_once(loads):
+    barrier = threading.Barrier(8)
+
+    def get(_):
+        barrier.wait()
+        return models.get(NAME)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(get, range(8)))
+
+    assert len(loads) == 1
+    assert all(model is results[0] for model in results)
+    assert models.is_loaded(NAME)
+
+
+def test_unload_reloads_on_next_get(loads):
+    first = models.get(NAME)
+    models.unload(NAME)
+
+    assert not models.is_loaded(NAME)
+    assert models.report()[NAME] == {"loaded": False}
+
+    second = models.get(NAME)
+    assert len(loads) == 2
+    assert second is not first
+
+
+def test_warmup_reports_loaded_models(loads):
+    report = models.warmup(NAME)
+    assert report[NAME]["loaded"]
+    assert report[NAME]["load_time"] >= 0.05
+    assert len(loads) == 1
+
+
+def test_unknown_model():
+    with pytest.raises(KeyError):
+        models.get("missing_model")
@@ -0,0 +1,27 @@
+import argparse
+
+import pytest
+
+from benchmarks import pipelines
+
+
+def options(tmp_path, timeout: float, render: bool = False) -> dict:
+    return {"repeat": 1, "warmup": 0, "real_models": False, "render": render, "seconds": 1,
+            "workdir": str(tmp_path), "timeout": timeout}
+
+
+def test_failed_scenario_is_reported(tmp_path):
+    with pytest.raises(pipelines.ScenarioFailedError, match="missing: process exited with code 1"):
+        pipelines.run_in_process("missing", {}, options(tmp_path, 120))
+
+
+def test_hung_scenario_times_out(tmp_path):
+    with pytest.raises(pipelines.ScenarioFailedError, match="no result in 0 s"):
+        pipelines.run_in_process("voice", {}, options(tmp_path, 0.1))
+
+
+def test_video_peak_rss_is_flat(tmp_path):
+    # Видео в 10 раз длиннее не должно требовать заметно больше памяти: кадры обрабатываются потоком
+    args = argparse.Namespace(width=160, height=120, fps=10, max_growth_mb=pipelines.MAX_GROWTH_MB)
+    (tmp_path / "report").mkdir()
+    assert pipelines.memory_sweep([3, 30], args, options(tmp_path, 600, render=True)) == []
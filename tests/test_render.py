@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+from PIL import Image
+
+from backend.render import minmax_downsample
+from backend.video import EMOTIONS, create_combined_image
+
+
+def probabilities(winner: str) -> dict:
+    return {label: float(label == winner) for label in EMOTIONS}
+
+
+def test_combined_images_do_not_share_buffers():
+    red = Image.new("RGB", (64, 64), (255, 0, 0))
+    blue = Image.new("RGB", (64, 64), (0, 0, 255))
+
+    first = create_combined_image(red, probabilities("happy"))
+    snapshot = first.copy()
+    second = create_combined_image(blue, probabilities("sad"))
+
+    assert first is not second
+    assert np.array_equal(first, snapshot)
+    assert not np.array_equal(first, second)
+
+
+def test_combined_images_from_threads():
+    faces = [Image.new("RGB", (48, 48), (i * 40, 0, 0)) for i in range(6)]
+    expected = [create_combined_image(face, probabilities(EMOTIONS[i])) for i, face in enumerate(faces)]
+    results = [None] * len(faces)
+
+    def render(i):
+        buffer = None
+        for _ in range(20):
+            buffer = create_combined_image(faces[i], probabilities(EMOTIONS[i]), buffer)
+            if not np.array_equal(buffer, expected[i]):
+                results[i] = False
+                return
+        results[i] = True
+
+    threads = [threading.Thread(target=render, args=(i,)) for i in range(len(faces))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results)
+
+
+def test_minmax_downsample_keeps_bucket_extremes():
+    rng = np.random.default_rng(0)
+    values = rng.random((1003, 3)).astype(np.float32)
+    buckets = 50
+
+    frames, points = minmax_downsample(values, buckets)
+
+    size = -(-len(values) // buckets)
+    assert points.shape == frames.shape == (2 * -(-len(values) // size), 3)
+    np.testing.assert_array_equal(np.take_along_axis(values, frames, axis=0), points)
+    for series in range(values.shape[1]):
+        # Точки каждого интервала - его минимум и максимум в порядке следования кадров
+        for b, start in enumerate(range(0, len(values), size)):
+            block = values[start:start + size, series]
+            pair = points[2 * b:2 * b + 2, series]
+            assert sorted(pair) == [block.min(), block.max()]
+            assert frames[2 * b, series] <= frames[2 * b + 1, series]
+        # Глобальные экстремумы не теряются
+        assert points[:, series].max() == values[:, series].max()
+        assert points[:, series].min() == values[:, series].min()
+
+
+def test_minmax_downsample_short_series_unchanged():
+    values = np.arange(12, dtype=np.float32).reshape(6, 2)
+
+    frames, points = minmax_downsample(values, 3)
+
+    assert points is values
+    np.testing.assert_array_equal(frames, [[i, i] for i in range(6)])
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from backend import storage
+
+
+@pytest.fixture(autouse=True)
+def workdir_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "WORKDIR_ROOT", str(tmp_path / "sessions"))
+    # Сборщик в фоне не нужен: collect вызывается явно
+    monkeypatch.setattr(storage, "_start_collector", lambda: None)
+
+
+def test_active_workdir_survives_collect():
+    active = storage.create_workdir()
+    with open(os.path.join(storage.report_dir(active), "video.mp4"), "wb") as file:
+        file.write(b"\0" * 1024)
+
+    stats = storage.collect(ttl=0, quota=0)
+
+    assert os.path.isdir(active)
+    assert stats["workdirs"] == 1
+    storage.release(active)
+
+
+def test_kept_workdir_is_collected():
+    kept = storage.create_workdir()
+    storage.keep(kept)
+    os.utime(kept, (0, 0))
+
+    assert storage.collect(ttl=60, quota=2**30)["expired"] == 1
+    assert not os.path.exists(kept)
+
+
+def test_quota_evicts_only_finished_workdirs():
+    finished, active = storage.create_workdir(), storage.create_workdir()
+    for workdir in (finished, active):
+        with open(os.path.join(workdir, "voice.wav"), "wb") as file:
+            file.write(b"\0" * 1024)
+    storage.keep(finished)
+
+    stats = storage.collect(ttl=3600, quota=0)
+
+    assert stats["evicted"] == 1
+    assert not os.path.exists(finished)
+    assert os.path.isdir(active)
+    storage.release(active)
@@ -0,0 +1,83 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backend import audio, stream
+from benchmarks.voice_stream import make_signal
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Заглушка голосовой модели: записывает окна каждого вызова"""
+    calls = []
+
+    def predict_windows(windows):
+        calls.append(windows.copy())
+        return np.full((len(windows), len(audio.emotion_enc)), 1 / len(audio.emotion_enc), dtype=np.float32)
+
+    monkeypatch.setattr(stream, "voice_model", lambda: None)
+    monkeypatch.setattr(stream, "predict_windows", predict_windows)
+    return calls
+
+
+def run_stream(pcm: bytes, chunk_size: int) -> tuple:
+    session = stream.VoiceStream("f32le")
+    results = []
+    for start in range(0, len(pcm), chunk_size):
+        results += session.feed(pcm[start:start + chunk_size])
+    results += session.finish()
+    return session, results
+
+
+def test_window_matches_batch_mfcc_across_ring_wrap(model_calls):
+    # Запись в 2.5 раза длиннее окна: кольцевой буфер кадров заполняется несколько раз
+    x = make_signal(6.5, audio.SAMPLE_RATE)
+    pcm = x.astype("<f4").tobytes()
+    expected = audio.compute_mfcc(x)[-audio.WINDOW_FRAMES:]
+
+    # Куски не кратны размеру отсчета и больше STREAM_CHUNK_SIZE
+    for chunk_size in (1001, 4099, stream.STREAM_CHUNK_SIZE * 3 + 5):
+        session, _ = run_stream(pcm, chunk_size)
+        assert session.samples == len(x)
+        assert session.frames == 1 + len(x) // audio.HOP_LENGTH
+        np.testing.assert_allclose(session.window(), expected, atol=1e-3)
+        # Последний вызов модели получил это же окно
+        np.testing.assert_allclose(model_calls[-1][0], expected, atol=1e-3)
+
+
+def test_one_model_call_per_chunk(model_calls):
+    x = make_signal(6.5, audio.SAMPLE_RATE)
+    session = stream.VoiceStream("f32le", hop=20)
+
+    results = session.feed(x.astype("<f4").tobytes())
+
+    # Во всем куске много шагов, но модель вызывается один раз, а остальные шаги пропущены
+    assert len(results) == 1 and len(model_calls) == 1
+    assert results[0]["skipped"] == 0
+    assert session.feed(b"") == []
+
+    results = session.feed(np.zeros(audio.HOP_LENGTH * 65, dtype="<f4").tobytes())
+    assert len(results) == 1 and len(model_calls) == 2
+    assert results[0]["skipped"] == 2
+    assert session.summary()["hops"] == 2
+
+
+def test_session_limit(model_calls, monkeypatch):
+    monkeypatch.setattr(stream, "_sessions", threading.BoundedSemaphore(2))
+
+    sessions = [stream.open_session(), stream.open_session()]
+    with pytest.raises(stream.StreamBusyError):
+        stream.open_session()
+
+    stream.close_session(sessions.pop())
+    sessions.append(stream.open_session())
+
+    stream.close_session(sessions.pop())
+
+    # Ошибка в параметрах не занимает место в лимите
+    with pytest.raises(ValueError):
+        stream.open_session(pcm_format="mp3")
+    sessions.append(stream.open_session())
+    for session in sessions:
+        stream.close_session(session)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from backend.timeline import Timeline
+
+LABELS = ["happy", "sad"]
+
+
+def make_timeline(n: int = 25, fps: float = 10) -> Timeline:
+    timeline = Timeline(LABELS, fps, capacity=4)  # меньше кадров, чтобы массивы выросли
+    for i in range(n):
+        if i % 3 == 2:
+            timeline.append(None)
+        else:
+            timeline.append({"happy": i / n, "sad": 1 - i / n}, box=(i, i, i + 10, i + 10))
+    return timeline
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(tmp_path, mmap):
+    timeline = make_timeline()
+    loaded = Timeline.load(timeline.save(str(tmp_path / "video.emtl")), mmap=mmap)
+
+    assert loaded.labels == LABELS
+    assert loaded.fps == timeline.fps
+    assert len(loaded) == len(timeline)
+    np.testing.assert_array_equal(loaded.times, timeline.times)
+    np.testing.assert_array_equal(loaded.valid, timeline.valid)
+    np.testing.assert_array_equal(loaded.values, timeline.values)
+    np.testing.assert_array_equal(loaded.boxes, timeline.boxes)
+    assert loaded.probabilities(2) is None
+    assert loaded.probabilities(1) == pytest.approx({"happy": 1 / 25, "sad": 24 / 25})
+
+
+def test_save_load_empty(tmp_path):
+    loaded = Timeline.load(Timeline(LABELS, 5).save(str(tmp_path / "empty.emtl")))
+    assert len(loaded) == 0
+    assert loaded.values.shape == (0, 2)
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.emtl"
+    path.write_bytes(b"not a timeline")
+    with pytest.raises(ValueError):
+        Timeline.load(str(path))
+
+
+def test_slice():
+    timeline = make_timeline()
+
+    part = timeline.slice(0.5, 1.2)
+    np.testing.assert_allclose(part.times, np.arange(5, 12) / 10)
+    np.testing.assert_array_equal(part.values, timeline.values[5:12])
+
+    assert len(timeline.slice(None, None)) == len(timeline)
+    assert len(timeline.slice(2.0, None)) == 5
+    assert len(timeline.slice(2.0, 1.0)) == 0
+
+
+def test_per_second():
+    timeline = make_timeline()
+    seconds, values = timeline.per_second()
+
+    np.testing.assert_array_equal(seconds, [0, 1, 2])
+    for second in seconds:
+        frames = (np.floor(timeline.times) == second) & timeline.valid
+        np.testing.assert_allclose(values[second], timeline.values[frames].mean(axis=0), rtol=1e-6)
+
+    # Секунда без лица - NaN, а не ошибка
+    no_face = Timeline(LABELS, 1)
+    no_face.append(None)
+    assert np.isnan(no_face.per_second()[1]).all()
+
+    seconds, values = Timeline(LABELS, 10).per_second()
+    assert seconds.shape == (0,) and values.shape == (0, 2)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend import video
+from backend.tracking import FaceTracker
+
+SIZE, FACE, STEP = 160, 32, 3
+
+
+def make_frames(count: int, lost: tuple = ()) -> tuple:
+    """
+    Текстурированное "лицо" FACE x FACE, сдвигающееся на STEP пикселей за кадр.
+    На кадрах из lost лица нет
+
+    :return: Кадры (PIL.Image) и истинные рамки
+    """
+    rng = np.random.default_rng(0)
+    face = rng.integers(0, 256, size=(FACE, FACE), dtype=np.uint8)
+    frames, boxes = [], []
+    for i in range(count):
+        frame = np.full((SIZE, SIZE), 128, dtype=np.uint8)
+        x, y = 20 + STEP * i, 30 + STEP * i // 2
+        if i not in lost:
+            frame[y:y + FACE, x:x + FACE] = face
+        frames.append(Image.fromarray(frame).convert("RGB"))
+        boxes.append(np.array([x, y, x + FACE, y + FACE], dtype=np.float32))
+    return frames, boxes
+
+
+def test_tracker_follows_moving_patch():
+    frames, boxes = make_frames(12)
+    tracker = FaceTracker()
+    tracker.reset(frames[0], boxes[0])
+
+    for frame, expected in zip(frames[1:], boxes[1:]):
+        box, confidence = tracker.track(frame)
+        np.testing.assert_allclose(box, expected, atol=1)
+        assert confidence > 0.9
+
+
+def test_tracker_without_face():
+    tracker = FaceTracker()
+    tracker.reset(make_frames(1)[0][0], None)
+    assert tracker.track(make_frames(1)[0][0]) == (None, 0.0)
+
+
+@pytest.fixture
+def detections(monkeypatch):
+    """Заменяет MTCNN истинными рамками и записывает, на каких кадрах он запускался"""
+    calls = []
+
+    def detect_boxes(images):
+        calls.append([frame_index[id(image)] for image in images])
+        return [None if frame_index[id(image)] in lost else boxes[frame_index[id(image)]] for image in images]
+
+    lost = (6,)
+    frames, boxes = make_frames(12, lost)
+    frame_index = {id(frame): i for i, frame in enumerate(frames)}
+    monkeypatch.setattr(video, "detect_boxes", detect_boxes)
+    return frames, boxes, calls
+
+
+def test_track_boxes_detects_on_keyframes_and_when_lost(detections):
+    frames, boxes, calls = detections
+    tracker = FaceTracker(min_confidence=0.6)
+
+    # Две группы по 6 кадров: общий трекер сохраняет состояние между ними
+    tracked = video.track_boxes(frames[:6], tracker, 0, 4) + video.track_boxes(frames[6:], tracker, 6, 4)
+
+    # MTCNN запускается на ключевых кадрах 0, 4, 8 (по группам) и на кадре 6, где трекер потерял лицо
+    assert calls == [[0, 4], [8], [6]]
+    # Лица нет и после повторной детекции: до следующего ключевого кадра рамок нет
+    assert tracked[6] is None and tracked[7] is None
+    for i, box in enumerate(tracked):
+        if i not in (6, 7):
+            np.testing.assert_allclose(box, boxes[i], atol=1)
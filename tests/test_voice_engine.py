@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from backend.models import VOICE_MODEL_PATH
+from backend.voice_engine import NumpyVoiceModel
+
+WINDOW_SHAPE = (225, 40)
+
+
+def random_windows(count: int) -> np.ndarray:
+    # Порядок величин как у MFCC реальных записей
+    return (np.random.default_rng(0).normal(size=(count, *WINDOW_SHAPE)) * 30).astype(np.float32)
+
+
+def test_empty_input():
+    model = NumpyVoiceModel(VOICE_MODEL_PATH)
+    out = model.predict(np.zeros((0, *WINDOW_SHAPE), dtype=np.float32))
+    assert out.shape == (0, model.output_size)
+
+
+def test_parity_with_keras_model3():
+    tf = pytest.importorskip("tensorflow")
+
+    windows = random_windows(64)
+    expected = tf.keras.models.load_model(VOICE_MODEL_PATH).predict(windows, batch_size=16, verbose=0)
+    actual = NumpyVoiceModel(VOICE_MODEL_PATH).predict(windows, batch_size=16)
+
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+    np.testing.assert_array_equal(actual.argmax(axis=1), expected.argmax(axis=1))
+
+
+def test_parity_with_keras_layers(tmp_path):
+    # Вероятности model3.h5 почти всегда насыщены, поэтому слои сверяются
+    # еще и на модели со случайными весами, где выход не упирается в 0 и 1
+    tf = pytest.importorskip("tensorflow")
+
+    tf.keras.utils.set_random_seed(0)
+    keras_model = tf.keras.Sequential([
+        tf.keras.Input(WINDOW_SHAPE),
+        tf.keras.layers.Conv1D(16, 5, padding="same", activation="relu"),
+        tf.keras.layers.MaxPooling1D(5),
+        tf.keras.layers.Dropout(0.1),
+        tf.keras.layers.Conv1D(32, 3, padding="valid"),
+        tf.keras.layers.Activation("relu"),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(6, activation="softmax"),
+    ])
+    path = str(tmp_path / "model.h5")
+    keras_model.save(path)
+
+    windows = random_windows(32) / 30
+    np.testing.assert_allclose(
+        NumpyVoiceModel(path).predict(windows, batch_size=8),
+        keras_model.predict(windows, batch_size=8, verbose=0),
+        atol=1e-5,
+    )
@@ -0,0 +1,287 @@
+"""
+Хранилище MFCC для обучения голосовой модели
+
+MFCC всех записей корпуса считаются один раз в пуле процессов и пишутся
+в один файл на диске (float32, записи x WINDOW_FRAMES x N_MFCC), который при
+обучении открывается через np.memmap. Рядом лежит индекс (index.csv: путь,
+метка, длина записи, строка в файле) и meta.json с параметрами признаков.
+При добавлении новых датасетов считаются только новые и изменившиеся файлы,
+а смена набора меток (например, emotion2 -> emotion3) обновляет только индекс
+
+Запуск:
+    python -m training.features combined_all4.csv --store features --label emotion3
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backend.audio import (
+    HOP_LENGTH,
+    LENGTH_CHOSEN,
+    N_FFT,
+    N_MFCC,
+    SAMPLE_RATE,
+    WINDOW_FRAMES,
+    compute_mfcc,
+    fit_length,
+)
+from backend.decoder import decode_audio
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = "mfcc.f32"
+INDEX_FILE = "index.csv"
+META_FILE = "meta.json"
+INDEX_COLUMNS = ["path", "label", "length", "mtime", "size", "row"]
+
+# Записи длиннее порога не попадают в обучение (как в model.ipynb)
+MAX_LENGTH = 300000
+
+# Параметры, при изменении которых сохраненные признаки становятся непригодны
+FEATURE_PARAMS = {
+    "sample_rate": SAMPLE_RATE,
+    "length": LENGTH_CHOSEN,
+    "n_mfcc": N_MFCC,
+    "n_fft": N_FFT,
+    "hop_length": HOP_LENGTH,
+    "frames": WINDOW_FRAMES,
+}
+
+
+def extract(path: str, max_length: int = MAX_LENGTH) -> tuple:
+    """
+    Считает MFCC одной записи так же, как при инференсе: запись приводится
+    к LENGTH_CHOSEN отсчетов и превращается в одно окно WINDOW_FRAMES x N_MFCC
+
+    :param path: Путь к аудио-файлу
+    :param max_length: Записи длиннее (в отсчетах) пропускаются
+    :return: Путь, длина записи в отсчетах и MFCC (None, если запись пропущена)
+    """
+    x = decode_audio(path, SAMPLE_RATE)
+    if x.shape[0] >= max_length:
+        return path, x.shape[0], None
+
+    return path, x.shape[0], compute_mfcc(fit_length(x), SAMPLE_RATE).astype(np.float32)
+
+
+def _extract_safe(path: str, max_length: int) -> tuple:
+    try:
+        return extract(path, max_length)
+    except Exception as e:
+        logger.error(f"Failed to extract features from {path}: {e}")
+        return path, -1, None
+
+
+def load_index(store: str) -> pd.DataFrame:
+    """
+    Индекс хранилища
+
+    :param store: Каталог хранилища
+    :return: DataFrame с колонками INDEX_COLUMNS (пустой, если хранилища нет)
+    """
+    index_path = os.path.join(store, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    return pd.read_csv(index_path, keep_default_na=False)
+
+
+def _load_meta(store: str) -> dict:
+    meta_path = os.path.join(store, META_FILE)
+    if not os.path.exists(meta_path):
+        return {"params": FEATURE_PARAMS, "rows": 0}
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def _save(store: str, index: pd.DataFrame, meta: dict) -> None:
+    # Индекс и meta.json пишутся через временные файлы, чтобы прерванное
+    # обновление не оставило хранилище в несогласованном состоянии.
+    # meta.json пишется первым: строки файла без индекса безвредны,
+    # а индекс не должен ссылаться на строки, которых нет в meta.json
+    tmp_path = os.path.join(store, f"{META_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(store, META_FILE))
+
+    tmp_path = os.path.join(store, f"{INDEX_FILE}.tmp")
+    index[INDEX_COLUMNS].to_csv(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(store, INDEX_FILE))
+
+
+def update_store(
+    manifest: pd.DataFrame,
+    store: str,
+    label: str,
+    workers: int | None = None,
+    max_length: int = MAX_LENGTH,
+) -> pd.DataFrame:
+    """
+    Добавляет в хранилище MFCC новых и изменившихся записей манифеста
+    и обновляет метки уже посчитанных
+
+    :param manifest: Манифест корпуса с колонкой path и колонкой метки
+    :param store: Каталог хранилища
+    :param label: Колонка манифеста с меткой
+    :param workers: Количество процессов (по умолчанию - число ядер)
+    :param max_length: Записи длиннее (в отсчетах) пропускаются
+    :raises ValueError: Если хранилище создано с другими параметрами признаков
+    :return: Индекс хранилища после обновления
+    """
+    os.makedirs(store, exist_ok=True)
+    meta = _load_meta(store)
+    if meta["params"] != FEATURE_PARAMS:
+        raise ValueError(f"Store {store} was built with {meta['params']}, current params are {FEATURE_PARAMS}")
+
+    index = load_index(store).set_index("path", drop=False)
+    manifest = manifest.drop_duplicates("path")
+
+    stats = {path: os.stat(path) for path in manifest["path"]}
+    pending = [
+        path
+        for path in manifest["path"]
+        if path not in index.index
+        or index.at[path, "mtime"] != stats[path].st_mtime_ns
+        or index.at[path, "size"] != stats[path].st_size
+        # Файлы, которые не удалось декодировать, пробуем снова
+        or index.at[path, "length"] < 0
+    ]
+    logger.info(f"{store}: {len(manifest) - len(pending)} records up to date, {len(pending)} to extract")
+
+    data_path = os.path.join(store, DATA_FILE)
+    row_bytes = WINDOW_FRAMES * N_MFCC * np.dtype(np.float32).itemsize
+    rows = meta["rows"]
+
+    # Строки, записанные прерванным обновлением без индекса, отбрасываем
+    with open(data_path, "ab") as data:
+        data.truncate(rows * row_bytes)
+
+    records = []
+    with open(data_path, "ab") as data, ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_extract_safe, pending, [max_length] * len(pending), chunksize=16)
+        for path, length, mfcc in results:
+            row = -1
+            if mfcc is not None:
+                data.write(mfcc.tobytes())
+                row, rows = rows, rows + 1
+            records.append({"path": path, "length": length, "row": row})
+
+    if records:
+        update = pd.DataFrame(records).set_index("path", drop=False)
+        index = pd.concat([index.drop(update.index, errors="ignore"), update.reindex(columns=INDEX_COLUMNS)])
+
+    # Записи, которых больше нет в манифесте, остаются в файле, но пропадают из индекса
+    index = index.loc[manifest["path"]]
+    index["label"] = manifest.set_index("path")[label]
+    index["mtime"] = [stats[path].st_mtime_ns for path in index.index]
+    index["size"] = [stats[path].st_size for path in index.index]
+    index = index.reset_index(drop=True)
+
+    meta["rows"] = rows
+    _save(store, index, meta)
+
+    skipped = (index["row"] < 0).sum()
+    logger.info(f"{store}: {len(index) - skipped} records indexed, {skipped} skipped, {rows} rows in data file")
+    return index
+
+
+def open_store(store: str) -> tuple:
+    """
+    Открывает хранилище для чтения без загрузки признаков в память
+
+    :param store: Каталог хранилища
+    :return: Индекс (только записи с признаками) и np.memmap (строки x WINDOW_FRAMES x N_MFCC)
+    """
+    meta = _load_meta(store)
+    index = load_index(store)
+    index = index[index["row"] >= 0].reset_index(drop=True)
+
+    if meta["rows"] == 0:
+        return index, np.empty((0, WINDOW_FRAMES, N_MFCC), dtype=np.float32)
+
+    data = np.memmap(
+        os.path.join(store, DATA_FILE),
+        dtype=np.float32,
+        mode="r",
+        shape=(meta["rows"], WINDOW_FRAMES, N_MFCC),
+    )
+    return index, data
+
+
+def split_rows(index: pd.DataFrame, test_size: float, seed: int = 0) -> tuple:
+    """
+    Делит записи индекса на две части случайным образом
+
+    :param index: Индекс (см. open_store)
+    :param test_size: Доля второй части
+    :param seed: Начальное значение генератора
+    :return: Два массива позиций записей в индексе
+    """
+    order = np.random.default_rng(seed).permutation(len(index))
+    n_test = int(round(len(index) * test_size))
+    return order[n_test:], order[:n_test]
+
+
+def iter_batches(
+    store: str,
+    encoding: dict,
+    batch_size: int = 16,
+    positions: np.ndarray | None = None,
+    shuffle: bool = True,
+    repeat: bool = False,
+    seed: int = 0,
+):
+    """
+    Генератор батчей для обучения: в памяти находится только текущий батч
+
+    :param store: Каталог хранилища
+    :param encoding: Метка -> номер класса (записи с другими метками пропускаются)
+    :param batch_size: Размер батча
+    :param positions: Позиции записей в индексе (см. split_rows), по умолчанию - все
+    :param shuffle: Перемешивать записи каждую эпоху
+    :param repeat: Повторять эпохи бесконечно (для model.fit со steps_per_epoch)
+    :param seed: Начальное значение генератора
+    :return: Генератор пар (MFCC батча, номера классов)
+    """
+    index, data = open_store(store)
+    if positions is not None:
+        index = index.iloc[positions]
+    index = index[index["label"].isin(encoding)]
+
+    rows = index["row"].to_numpy()
+    labels = index["label"].map(encoding).to_numpy()
+    rng = np.random.default_rng(seed)
+
+    while True:
+        order = rng.permutation(len(rows)) if shuffle else np.arange(len(rows))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            # Чтение строк по возрастанию номера - последовательный доступ к файлу
+            sort = np.argsort(rows[batch])
+            yield np.asarray(data[rows[batch][sort]]), labels[batch][sort]
+        if not repeat:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("manifest", help="Манифест корпуса (CSV с колонкой path)")
+    parser.add_argument("--store", default="features", help="Каталог хранилища")
+    parser.add_argument("--label", default="emotion3", help="Колонка манифеста с меткой")
+    parser.add_argument("--workers", type=int, default=None, help="Количество процессов")
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH, help="Максимальная длина записи в отсчетах")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    manifest = pd.read_csv(args.manifest)
+    index = update_store(manifest, args.store, args.label, args.workers, args.max_length)
+    print(index["label"][index["row"] >= 0].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
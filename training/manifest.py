@@ -0,0 +1,318 @@
+"""
+Манифест корпуса для обучения голосовой модели (замена voice_model/combine_datasets.ipynb)
+
+Обходит каталоги датасетов (RAVDESS, SAVEE, TESS, CREMA-D), размечает записи
+парсером своего датасета и читает длительность и частоту дискретизации
+из заголовков файлов в пуле потоков, не декодируя аудио. Результат - CSV
+с колонками combined_all4.csv и параметрами записей. При повторном запуске
+заголовки читаются только у новых и изменившихся файлов
+
+Запуск:
+    python -m training.manifest data --output combined_all4.csv
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import soundfile
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_COLUMNS = [
+    "emotion_label",
+    "source",
+    "actors",
+    "path",
+    "emotion2",
+    "emotion3",
+    "id",
+    "duration",
+    "sample_rate",
+    "mtime",
+    "size",
+]
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg")
+
+# Разметка эмоций на 2 уровнях детализации (как в combine_datasets.ipynb)
+EMOTION2 = {
+    "angry": "negative",
+    "calm": "neutral",
+    "disgust": "negative",
+    "fearful": "negative",
+    "fear": "negative",
+    "happy": "positive",
+    "neutral": "neutral",
+    "sad": "negative",
+    "surprised": "positive",
+    "surprise": "positive",
+}
+EMOTION3 = {
+    "angry": "negative",
+    "calm": "neutral",
+    "disgust": "negative",
+    "fearful": "fear",
+    "fear": "fear",
+    "happy": "positive",
+    "neutral": "neutral",
+    "sad": "sad",
+    "surprised": "surprise",
+    "surprise": "surprise",
+}
+
+# Парсеры разметки: {имя датасета: (каталог по умолчанию, source, функция)}
+_parsers = {}
+
+
+def register_parser(name: str, directory: str, source: str):
+    """
+    Декоратор, регистрирующий парсер разметки датасета. Парсер получает путь
+    к файлу относительно каталога датасета и возвращает эмоцию и пол диктора
+    или None, если запись не входит в корпус
+
+    :param name: Имя датасета
+    :param directory: Каталог датасета относительно корня корпуса
+    :param source: Значение колонки source
+    """
+
+    def decorator(parse):
+        _parsers[name] = (directory, source, parse)
+        return parse
+
+    return decorator
+
+
+RAVDESS_EMOTIONS = ["neutral", "calm", "happy", "sad", "angry", "fearful", "disgust", "surprised"]
+
+
+@register_parser("RAVDESS", "RAVDESS", "RAV")
+def parse_ravdess(relpath: str) -> tuple | None:
+    # 03-01-05-01-02-01-12.wav: модальность, канал, эмоция, интенсивность, фраза, повтор, актер
+    fields = os.path.splitext(os.path.basename(relpath))[0].split("-")
+    if len(fields) != 7 or not all(field.isdigit() for field in fields):
+        return None
+    # Только речь, без пения
+    if int(fields[1]) != 1:
+        return None
+
+    emotion = int(fields[2])
+    if not 1 <= emotion <= len(RAVDESS_EMOTIONS):
+        return None
+    return RAVDESS_EMOTIONS[emotion - 1], "female" if int(fields[6]) % 2 == 0 else "male"
+
+
+SAVEE_EMOTIONS = {
+    "_a": "angry",
+    "_d": "disgust",
+    "_f": "fear",
+    "_h": "happy",
+    "_n": "neutral",
+    "sa": "sad",
+    "su": "surprise",
+}
+
+
+@register_parser("SAVEE", "SAVEE", "SAVEE")
+def parse_savee(relpath: str) -> tuple | None:
+    # DC_sa01.wav: диктор и код эмоции перед номером фразы
+    emotion = SAVEE_EMOTIONS.get(os.path.basename(relpath)[-8:-6])
+    return (emotion, "male") if emotion else None
+
+
+TESS_EMOTIONS = {
+    "angry": "angry",
+    "disgust": "disgust",
+    "fear": "fear",
+    "happy": "happy",
+    "neutral": "neutral",
+    "pleasant_surprise": "surprise",
+    "pleasant_surprised": "surprise",
+    "sad": "sad",
+}
+
+
+@register_parser("TESS", "TESS", "TESS")
+def parse_tess(relpath: str) -> tuple | None:
+    # OAF_Pleasant_surprise/OAF_back_ps.wav: эмоция - в имени каталога
+    folder = os.path.basename(os.path.dirname(relpath))
+    emotion = TESS_EMOTIONS.get(folder.split("_", 1)[-1].lower()) if "_" in folder else None
+    return (emotion, "female") if emotion else None
+
+
+CREMA_EMOTIONS = {"SAD": "sad", "ANG": "angry", "DIS": "disgust", "FEA": "fear", "HAP": "happy", "NEU": "neutral"}
+CREMA_FEMALE_IDS = {
+    1002, 1003, 1004, 1006, 1007, 1008, 1009, 1010, 1012, 1013, 1018, 1020, 1021,
+    1024, 1025, 1028, 1029, 1030, 1037, 1043, 1046, 1047, 1049, 1052, 1053, 1054,
+    1055, 1056, 1058, 1060, 1061, 1063, 1072, 1073, 1074, 1075, 1076, 1078, 1079,
+    1082, 1084, 1089, 1091,
+}
+
+
+@register_parser("CREMA-D", "CREMA-D", "CREMA")
+def parse_crema(relpath: str) -> tuple | None:
+    # 1001_DFA_ANG_XX.wav: актер, фраза, эмоция, интенсивность
+    fields = os.path.basename(relpath).split("_")
+    if len(fields) < 3 or not fields[0].isdigit() or fields[2] not in CREMA_EMOTIONS:
+        return None
+    return CREMA_EMOTIONS[fields[2]], "female" if int(fields[0]) in CREMA_FEMALE_IDS else "male"
+
+
+def parsers() -> list:
+    """
+    :return: Имена датасетов с зарегистрированными парсерами
+    """
+    return list(_parsers)
+
+
+def scan(root: str, datasets: list | None = None) -> pd.DataFrame:
+    """
+    Обходит каталоги датасетов и размечает записи
+
+    :param root: Корень корпуса, в котором лежат каталоги датасетов
+    :param datasets: Датасеты для обхода (по умолчанию - все с найденным каталогом)
+    :raises ValueError: Если для датасета нет парсера
+    :return: DataFrame с колонками emotion_label, source, actors, path
+    """
+    unknown = set(datasets or []) - set(_parsers)
+    if unknown:
+        raise ValueError(f"No label parser for {sorted(unknown)}, available: {parsers()}")
+
+    rows = []
+    for name in datasets or parsers():
+        directory, source, parse = _parsers[name]
+        top = os.path.join(root, directory)
+        if not os.path.isdir(top):
+            if datasets:
+                logger.warning(f"Dataset directory {top} not found")
+            continue
+
+        found, skipped = 0, 0
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, filename)
+                label = parse(os.path.relpath(path, top))
+                if label is None:
+                    skipped += 1
+                    continue
+                emotion, actors = label
+                rows.append({"emotion_label": f"{emotion}_{actors}", "source": source, "actors": actors, "path": path})
+                found += 1
+
+        logger.info(f"{name}: {found} records, {skipped} files skipped")
+
+    return pd.DataFrame(rows, columns=["emotion_label", "source", "actors", "path"])
+
+
+def probe(path: str) -> tuple:
+    """
+    Длительность и частота дискретизации записи по заголовку файла
+
+    :param path: Путь к аудио-файлу
+    :return: Длительность в секундах и частота (-1, -1, если заголовок не читается)
+    """
+    try:
+        info = soundfile.info(path)
+    except Exception as e:
+        logger.error(f"Failed to read header of {path}: {e}")
+        return -1.0, -1
+    return info.frames / info.samplerate, info.samplerate
+
+
+def build_manifest(
+    root: str,
+    datasets: list | None = None,
+    previous: pd.DataFrame | None = None,
+    workers: int | None = None,
+) -> pd.DataFrame:
+    """
+    Строит манифест корпуса
+
+    :param root: Корень корпуса
+    :param datasets: Датасеты для обхода (по умолчанию - все с найденным каталогом)
+    :param previous: Предыдущий манифест: параметры неизменившихся файлов берутся из него
+    :param workers: Количество потоков для чтения заголовков
+    :return: DataFrame с колонками MANIFEST_COLUMNS
+    """
+    manifest = scan(root, datasets)
+
+    # Пол уже входит в emotion_label, колонки emotion2/emotion3 сохраняют его так же
+    emotion = manifest["emotion_label"].str.rsplit("_", n=1).str[0]
+    manifest["emotion2"] = emotion.map(EMOTION2) + "_" + manifest["actors"]
+    manifest["emotion3"] = emotion.map(EMOTION3) + "_" + manifest["actors"]
+    manifest["id"] = range(len(manifest))
+
+    stats = [os.stat(path) for path in manifest["path"]]
+    manifest["mtime"] = [stat.st_mtime_ns for stat in stats]
+    manifest["size"] = [stat.st_size for stat in stats]
+
+    # Параметры записи из прошлого манифеста годятся, если файл не менялся
+    # (файлы с нечитаемым заголовком пробуем снова)
+    known = {}
+    if previous is not None:
+        known = {
+            (path, mtime, size): (duration, sample_rate)
+            for path, mtime, size, duration, sample_rate in previous[
+                ["path", "mtime", "size", "duration", "sample_rate"]
+            ].itertuples(index=False)
+            if duration >= 0
+        }
+    known = {
+        path: known[(path, mtime, size)]
+        for path, mtime, size in zip(manifest["path"], manifest["mtime"], manifest["size"])
+        if (path, mtime, size) in known
+    }
+
+    pending = [path for path in manifest["path"] if path not in known]
+    logger.info(f"{len(manifest) - len(pending)} headers up to date, {len(pending)} to probe")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        known.update(zip(pending, executor.map(probe, pending)))
+
+    manifest["duration"] = [known[path][0] for path in manifest["path"]]
+    manifest["sample_rate"] = [known[path][1] for path in manifest["path"]]
+
+    return manifest[MANIFEST_COLUMNS]
+
+
+def load_manifest(path: str) -> pd.DataFrame | None:
+    """
+    :param path: Путь к CSV манифеста
+    :return: Манифест или None, если файла нет или в нем нет параметров записей
+    """
+    if not os.path.exists(path):
+        return None
+    manifest = pd.read_csv(path)
+    if not {"duration", "sample_rate", "mtime", "size"} <= set(manifest.columns):
+        return None
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", help="Корень корпуса с каталогами датасетов")
+    parser.add_argument("--output", default="combined_all4.csv", help="Путь к CSV манифеста")
+    parser.add_argument("--datasets", nargs="+", default=None, help=f"Датасеты: {', '.join(parsers())}")
+    parser.add_argument("--workers", type=int, default=16, help="Количество потоков для чтения заголовков")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    try:
+        manifest = build_manifest(args.root, args.datasets, load_manifest(args.output), args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    tmp_path = f"{args.output}.tmp"
+    manifest.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, args.output)
+
+    print(manifest.groupby(["source", "emotion3"]).size().unstack(fill_value=0).to_string())
+
+
+if __name__ == "__main__":
+    main()
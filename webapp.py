@@ -1,13 +1,10 @@
 import os
-from pathlib import Path
 
 import streamlit as st
 
-from backend import system
-from backend.audio import predict_voice
-from backend.report import create_report, generate_report_text
+from backend import storage
+from backend.report import generate_report_text
 from backend.system import ALLOWED_EXTENSIONS
-from backend.video import video_pipeline
 
 # Используем прямую связь с api как с библиотекой потому что API Gateway и MVP Streamlit Webapp будут располагаться на одном сервере
 from callback import api
@@ -30,6 +27,7 @@ session = {
     # "transcribe": None,  # Добавить в ответ расшифровку разговора
     # "transcribe_focus": None,  # Показать эмоции в словах, к которым они принадлежат (работает только при "transcribe": True)
     "double_check": None,  # Добавить проверку эмоции в видео с помощью анализа аудио-дорожки (работате толкьо при "file_type": "video")
+    "voice_timeline": False,  # Оценить всю аудио-дорожку по окнам и вернуть эмоции по сегментам
 }
 
 if file:
@@ -46,38 +44,29 @@ session["report"] = st.toggle("Созать отчет")
 
 start = st.button("Начать")
 if start:
-    FOLDERS = ["report", "uploaded_files"]
-    for folder in FOLDERS:
-        if not os.path.exists(folder):
-            os.mkdir(folder)
-    save_path = Path(FOLDERS[1], session["filename"])
+    session["workdir"] = storage.create_workdir()
+    save_path = os.path.join(session["workdir"], session["filename"])
     with open(save_path, mode="wb") as w:
         w.write(file.getvalue())
 
+    entry = api.analyze_file_cached(save_path, session)
+    audio_answer = entry["result"]["response"].get("audio_answer")
+    gif_path = entry["artifacts"]["video"]
+    fig_path = entry["artifacts"]["graph"]
+
     if session["file_type"] == "video":
-        gif_path, fig_path = video_pipeline(
-            os.path.join(FOLDERS[1], session["filename"]), session["make_graph"]
-        )
-        st.write("Видео зафиксированных лиц и эмоций:")
-        video_file = open(gif_path, "rb")
-        video_bytes = video_file.read()
-        st.video(video_bytes)
+        if gif_path is not None:
+            st.write("Видео зафиксированных лиц и эмоций:")
+            video_file = open(gif_path, "rb")
+            video_bytes = video_file.read()
+            st.video(video_bytes)
+        else:
+            st.write("На видео не найдено ни одного лица")
         if fig_path is not None:
             st.write("График распределения эмоций по таймлайну")
             st.image(fig_path)
 
-        if session["double_check"]:
-            # Вызываем метод анализа для видео с предварительной конвертацией видео в .wav формат
-            filename = system.convert_mp4_to_wav(
-                os.path.join(FOLDERS[1], session["filename"])
-            )
-            audio_answer = predict_voice(filename)
-            st.write(
-                f"Оценка аудио-дорожки файла показала результат средней эмоции: {audio_answer}"
-            )
-
-    else:
-        audio_answer = predict_voice(os.path.join(FOLDERS[1], session["filename"]))
+    if audio_answer is not None:
         st.write(
             f"Оценка аудио-дорожки файла показала результат средней эмоции: {audio_answer}"
         )
@@ -85,3 +74,5 @@ if start:
     if session["report"]:
         report_text = generate_report_text(session["filename"], audio_answer)
         st.write(report_text)
+
+    storage.release(session["workdir"])